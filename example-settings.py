@@ -35,7 +35,8 @@ ZEROING_HOURS = {
 }
 
 # If specific accounts need to have individualized ways of calculating
-# balances then provide the callback here.
+# balances then provide the callback here, or the name of a strategy
+# registered in timetracker.tracker.strategies such as "hr".
 OVERRIDE_CALCULATION = {
     "BF": some_other_calculation,
 }
@@ -97,6 +98,10 @@ DOCUMENTATION_BASE_URL = DOMAIN_NAME + '/docs/'
 # directory where the files should go.
 PLUGIN_DIRECTORY = "/home/xeno/dev/timetracker/vcs/plugins/"
 
+# Uploaded reports are kept here until the run_upload_jobs management
+# command has processed them.
+VCS_UPLOAD_DIRECTORY = "/home/xeno/dev/timetracker/uploads/"
+
 # There's a management command provided for easy crontab usage which
 # e-mails those in the below map about the numbers of approvals
 # pending their notice.
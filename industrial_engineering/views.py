@@ -9,7 +9,8 @@ from timetracker.utils.datemaps import (MARKET_CHOICES, MARKET_CHOICES_MAP,
                                         MARKET_CHOICES_LIST, group_for_team,
                                         generate_month_box)
 
-from timetracker.vcs.models import ActivityEntry, Activity
+from timetracker.vcs.models import ActivityEntry, Activity, COSTBUCKETS
+from timetracker.vcs.costbuckets import costbucket_totals
 
 def getmonthyear(request):
     try:
@@ -28,9 +29,9 @@ def costbuckets(request):
     kwargs = {"year": year,
               "month": month}
     if request.GET.get("team"):
-        cbb = ActivityEntry.costbucket_count(group_for_team(request.GET["team"]), **kwargs)
+        cbb = costbucket_totals(group_for_team(request.GET["team"]), **kwargs)
     else:
-        cbb = ActivityEntry.costbucket_count(MARKET_CHOICES_LIST, **kwargs)
+        cbb = costbucket_totals(MARKET_CHOICES_LIST, **kwargs)
     team = MARKET_CHOICES_MAP.get(request.GET["team"]) \
            if request.GET.get("team") else "All teams"
     if not team:
@@ -44,7 +45,10 @@ def costbuckets(request):
             "months": generate_month_box(id="month"),
             "selected_month": month,
             "selected_team": request.GET["team"] if request.GET.get("team") else "AD",
-            "costbuckets": cbb,
+            "costbuckets": dict((bucket, float(totals["adjusted"]))
+                                for bucket, totals in cbb.items()),
+            "bucket_totals": [(name, cbb[bucket])
+                              for bucket, name in COSTBUCKETS],
             "current": " %s/%s" % (year, month)
         },
         RequestContext(request)
@@ -6,13 +6,19 @@ with the overtime approval queues in the timetracker application.
 import datetime
 
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import EmailMessage
 from django.template import Context
 from django.template.loader import get_template
 from django.core.urlresolvers import reverse
 
 from timetracker.tracker.models import TrackingEntry, Tbluser
+from timetracker.tracker.outbox import enqueue
+from timetracker.tracker.cachekeys import make_key
+from timetracker.loggers import cache_log
 
  
 class PendingApproval(models.Model):
@@ -50,6 +56,12 @@ class PendingApproval(models.Model):
     )
     tl_approved = models.BooleanField()
 
+    def __init__(self, *args, **kwargs):
+        super(PendingApproval, self).__init__(*args, **kwargs)
+        # the approver as loaded, so that moving a request to another
+        # approver refreshes both of their queues.
+        self._loaded_approver_id = self.approver_id
+
     def close(self, status):
         '''Close, as the name implies, closes this PendingApproval request.
 
@@ -106,7 +118,7 @@ class PendingApproval(models.Model):
         email.body = tmpl.render(ctx)
         email.to = [self.entry.user.user_id]
         email.subject = "Request for Overtime: Denied."
-        email.send()
+        enqueue(email)
         if self.entry.is_linked(): # pragma: no cover
             self.entry.link.unlink()
         self.entry.delete()
@@ -153,8 +165,90 @@ class PendingApproval(models.Model):
         email.body = tmpl.render(ctx)
         email.to = recipients
         email.subject = "Request for Overtime: %s" % self.entry.user.name()
-        email.send()
+        enqueue(email)
 
     def is_holiday_request(self):
         '''checks whether this entry is a holiday entry or not.'''
         return self.entry.daytype == "PENDI"
+
+
+def badge_key(approver_id):
+    '''The key the navigation bar fragment of an approver is cached
+    under.'''
+    return make_key("approval_badge", approver_id)
+
+def render_badge(pending):
+    '''The navigation bar fragment showing the number of open
+    requests.'''
+    return "<span class=\"notifications\">%d</span>" % pending
+
+
+class ApprovalQueue(models.Model):
+
+    '''Holds the number of open approval requests of a single approver.
+
+    The count is refreshed whenever one of the approver's requests is
+    saved, closed or deleted, so that the navigation bar can show it
+    without counting the queue on every page, see
+    :meth:`Tbluser.approval_notifications`.
+    '''
+
+    approver = models.OneToOneField(Tbluser, related_name="approval_queue")
+    pending = models.IntegerField(default=0)
+
+    def __unicode__(self): # pragma: no cover
+        return u'%s - %d' % (self.approver.name(), self.pending)
+
+    @staticmethod
+    def refresh(*approver_ids):
+        '''Counts the open requests of the approvers again, and caches
+        their navigation bar fragments.'''
+        for approver_id in set(approver_ids):
+            if approver_id is None:
+                continue
+            pending = PendingApproval.objects.filter(
+                closed=False, approver_id=approver_id
+            ).count()
+            row, created = ApprovalQueue.objects.get_or_create(
+                approver_id=approver_id, defaults={"pending": pending}
+            )
+            if not created and row.pending != pending:
+                ApprovalQueue.objects.filter(id=row.id).update(
+                    pending=pending
+                )
+            cache.set(badge_key(approver_id), render_badge(pending))
+
+    @staticmethod
+    def pending_for(approver_id):
+        '''The number of open requests of an approver, with a single
+        query once their queue has been counted.'''
+        pending = ApprovalQueue.objects.filter(
+            approver_id=approver_id
+        ).values_list("pending", flat=True)
+        if pending:
+            return pending[0]
+        ApprovalQueue.refresh(approver_id)
+        return ApprovalQueue.objects.get(approver_id=approver_id).pending
+
+
+def approval_badge(approver_id):
+    '''The navigation bar fragment of an approver, from the cache or
+    with a single query.
+
+    :rtype: :class:`str`
+    '''
+    key = badge_key(approver_id)
+    badge = cache.get(key)
+    if badge is not None:
+        cache_log.debug("Returning cache for: %s" % key)
+        return badge
+    badge = render_badge(ApprovalQueue.pending_for(approver_id))
+    cache.set(key, badge)
+    return badge
+
+@receiver(post_save, sender=PendingApproval)
+@receiver(post_delete, sender=PendingApproval)
+def approval_changed(sender, instance, **kwargs):
+    '''Refreshes the queues a request is, or was, in.'''
+    ApprovalQueue.refresh(instance.approver_id, instance._loaded_approver_id)
+    instance._loaded_approver_id = instance.approver_id
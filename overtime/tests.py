@@ -4,9 +4,13 @@ from django.test import TestCase
 from django.core import mail
 from django.conf import settings
 from django.test.utils import override_settings
+from django.core.cache import cache
 
-from timetracker.overtime.models import PendingApproval
+from timetracker.overtime.models import (PendingApproval, ApprovalQueue,
+                                         badge_key)
 from timetracker.tracker.models import TrackingEntry
+from timetracker.tracker.outbox import send_outbox
+from timetracker.utils.calendar_utils import apply_holiday_grid
 from timetracker.tests.basetests import create_users, delete_users
 from timetracker.utils.datemaps import MARKET_CHOICES
 
@@ -75,6 +79,7 @@ class ApprovalTest(TestCase):
         )
         approval.save()
         approval.close(status)
+        send_outbox()
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].subject, message)
         self.assertEqual(len(mail.outbox[0].attachments), attachments)
@@ -97,6 +102,7 @@ class ApprovalTest(TestCase):
             approver=self.linked_manager
         )
         approval.inform_manager()
+        send_outbox()
         self.assertEqual(len(mail.outbox), 0)
 
     def testApprovalRequired(self): # pragma: no cover
@@ -107,6 +113,7 @@ class ApprovalTest(TestCase):
             approver=self.linked_manager
         )
         approval.inform_manager()
+        send_outbox()
         self.assertEqual(len(mail.outbox), 1)
 
     def testSoftClose(self):
@@ -174,6 +181,7 @@ class ApprovalTest(TestCase):
             entry=entry
         )
         pending.tl_close(False)
+        send_outbox()
         self.assertEqual(len(mail.outbox), 1)
 
     def testIsHolidayRequest(self):
@@ -209,4 +217,85 @@ class ApprovalTest(TestCase):
             entry=entry
         )
         pending.tl_close(False)
+        send_outbox()
         self.assertEqual(len(mail.outbox), 1)
+
+class ApprovalQueueTest(TestCase):
+    '''Checks the counted approval queues behind the navigation bar.'''
+
+    @classmethod
+    def setUpClass(self):
+        create_users(self)
+
+    @classmethod
+    def tearDownClass(self):
+        delete_users(self)
+
+    def setUp(self):
+        cache.clear()
+        self.approver_id = self.linked_user.administrator_id()
+
+    def tearDown(self):
+        cache.clear()
+
+    def request(self, day, daytype="WKDAY"):
+        entry = TrackingEntry(
+            user=self.linked_user,
+            entry_date=datetime.date(2013, 4, day),
+            start_time=datetime.time(9, 0, 0),
+            end_time=datetime.time(20, 45, 0),
+            breaks=datetime.time(0, 15, 0),
+            daytype=daytype,
+        )
+        entry.save()
+        entry.create_approval_request()
+        return PendingApproval.objects.get(entry=entry)
+
+    def pending(self):
+        return ApprovalQueue.objects.get(approver_id=self.approver_id).pending
+
+    def test_counted(self):
+        first = self.request(1)
+        second = self.request(2)
+        third = self.request(3, "PENDI")
+        self.assertEqual(self.pending(), 3)
+        first.close(True)
+        self.assertEqual(self.pending(), 2)
+        second.close(False)
+        self.assertEqual(self.pending(), 1)
+        # requests go along with their entries.
+        third.entry.delete()
+        self.assertEqual(self.pending(), 0)
+        self.assertFalse(self.linked_manager.has_pending_approvals())
+
+    def test_badge(self):
+        self.request(1)
+        self.assertEqual(self.linked_manager.approval_notifications(),
+                         "<span class=\"notifications\">1</span>")
+        with self.assertNumQueries(0):
+            self.linked_manager.approval_notifications()
+        self.request(2)
+        self.assertEqual(self.linked_manager.approval_notifications(),
+                         "<span class=\"notifications\">2</span>")
+        cache.delete(badge_key(self.approver_id))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.linked_manager.approval_notifications(),
+                             "<span class=\"notifications\">2</span>")
+        self.assertTrue(self.linked_manager.has_pending_approvals())
+        self.assertEqual(self.linked_user.approval_notifications(), "")
+
+    def test_counted_when_missing(self):
+        self.request(1)
+        ApprovalQueue.objects.all().delete()
+        cache.clear()
+        self.assertEqual(ApprovalQueue.pending_for(self.approver_id), 1)
+        self.assertEqual(self.pending(), 1)
+
+    def test_bulk(self):
+        apply_holiday_grid({self.linked_user.id: {
+            datetime.date(2013, 4, 1): "PENDI",
+            datetime.date(2013, 4, 2): "PENDI",
+        }}, 2013, 4)
+        self.assertEqual(self.pending(), 2)
+        self.assertEqual(self.linked_manager.approval_notifications(),
+                         "<span class=\"notifications\">2</span>")
@@ -76,7 +76,7 @@ def accepted(request): # pragma: no cover
 @admin_check
 def approval_list(request): # pragma: no cover
     auth_user = Tbluser.objects.get(id=request.session.get("user_id"))
-    approvals = PendingApproval.objects.filter(closed=False, approver=auth_user.get_administrator())
+    approvals = PendingApproval.objects.filter(closed=False, approver_id=auth_user.approver_id())
     return render_to_response(
         "approval_list.html",
         {
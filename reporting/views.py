@@ -2,22 +2,16 @@
 Views for the reporting functions. These will be used as endpoints when
 creating the CSV reports.
 
-Refactor this module to use a base view for CSV endpoints, which will
-do the basic set up of creating a buffer object, inserting the BOM and
-pushing it back to the user.
+Each report is a generator of rows which is streamed to the user with
+:func:`timetracker.utils.writers.csv_response`, so the first rows are
+sent while the rest of the report is still being built.
 '''
 
-try:
-    from cStringIO import StringIO
-except ImportError: # pragma: no cover
-    from StringIO import StringIO
-
 import datetime
-import csv
 
 from django.shortcuts import render_to_response
 from django.template import RequestContext
-from django.http import HttpResponse, Http404
+from django.http import Http404
 
 from timetracker.utils.decorators import admin_check, loggedin, permissions
 from timetracker.tracker.models import Tbluser, TrackingEntry
@@ -26,7 +20,7 @@ from timetracker.utils.datemaps import (generate_select,
                                         generate_employee_box,
                                         generate_month_box,
                                         MONTH_MAP, MARKET_CHOICES)
-from timetracker.utils.writers import UnicodeWriter
+from timetracker.utils.writers import csv_response
 from timetracker.tracker.management.commands import mec_ot_report
 
 @admin_check
@@ -65,18 +59,28 @@ def download_all_holiday_data(request, who=None): # pragma: no cover
     except Tbluser.DoesNotExist:
         raise Http404
 
-    buf = StringIO()
-    buf.write("\xef\xbb\xbf")
-    csvfile = UnicodeWriter(buf)
-    csvfile.writerow(TrackingEntry.headings())
+    def rows():
+        '''Generates the rows of the report.'''
+        yield TrackingEntry.headings()
+        for entry in TrackingEntry.objects.filter(
+                user_id=who).select_related("user").iterator():
+            yield entry.display_as_csv()
 
-    for entry in TrackingEntry.objects.filter(user_id=who):
-        csvfile.writerow(entry.display_as_csv())
+    return csv_response(rows(),
+                        'AllHolidayData_%s.csv' % target_user.id)
 
-    response = HttpResponse(buf.getvalue(), mimetype="text/csv")
-    response['Content-Disposition'] = \
-        'attachment;filename=AllHolidayData_%s.csv' % target_user.id
-    return response
+def entries_for_team(users, year, month):
+    '''Generates the CSV rows of all the entries of a team in a month,
+    fetched with a single query.'''
+    yield TrackingEntry.headings()
+    for entry in TrackingEntry.objects.filter(
+            entry_date__year=year,
+            entry_date__month=month,
+            user__in=users
+        ).select_related("user").order_by(
+            "user__lastname", "user", "entry_date"
+        ).iterator():
+        yield entry.display_as_csv()
 
 @admin_check
 def yearmonthhol(request, year=None, month=None): # pragma: no cover
@@ -88,20 +92,10 @@ def yearmonthhol(request, year=None, month=None): # pragma: no cover
 
     :note: Both year and mont are required.'''
     auth_user = Tbluser.objects.get(id=request.session.get("user_id"))
-    buf = StringIO()
-    buf.write("\xef\xbb\xbf")
-    csvfile = UnicodeWriter(buf)
-    csvfile.writerow(TrackingEntry.headings())
-    for user in auth_user.get_subordinates():
-        for entry in TrackingEntry.objects.filter(
-            entry_date__year=year,
-            entry_date__month=month,
-            user_id=user.id):
-            csvfile.writerow(entry.display_as_csv())
-    response = HttpResponse(buf.getvalue(), mimetype="text/csv")
-    response['Content-Disposition'] = \
-        'attachment;filename=HolidayData_%s_%s.csv' % (year, month)
-    return response
+    return csv_response(
+        entries_for_team(auth_user.get_subordinates(), year, month),
+        'HolidayData_%s_%s.csv' % (year, month)
+    )
 
 @admin_check
 def ot_by_month(request, year=None, month=None): # pragma: no cover
@@ -112,52 +106,47 @@ def ot_by_month(request, year=None, month=None): # pragma: no cover
 
     :note: Both year and mont are required.'''
     auth_user = Tbluser.objects.get(id=request.session.get("user_id"))
-    buf = StringIO()
-    buf.write("\xef\xbb\xbf")
-    csvfile = UnicodeWriter(buf)
-    csvfile.writerow(
-        ["Name", "Team", MONTH_MAP[int(month)-1][1]]
-        )
-    total_balance = 0
-    for user in auth_user.get_subordinates():
-        balance = user.get_total_balance(ret='flo', year=year, month=month)
-        total_balance += balance
-        csvfile.writerow([user.name(), user.process, '="%.2f"' % balance])
-    csvfile.writerow(["Total", "Total", '="%.2f"' % total_balance])
-    response = HttpResponse(buf.getvalue(), mimetype="text/csv")
-    response['Content-Disposition'] = \
-        'attachment;filename=OT_By_Month_%s_%s.csv' % (year, month)
-    return response
+
+    def rows():
+        '''Generates the rows of the report.'''
+        yield ["Name", "Team", MONTH_MAP[int(month)-1][1]]
+        total_balance = 0
+        users = list(auth_user.get_subordinates())
+        balances = Tbluser.objects.balances_for(users, year, by='year',
+                                                month=month)
+        for user in users:
+            balance = balances[user.id]
+            total_balance += balance
+            yield [user.name(), user.process, '="%.2f"' % balance]
+        yield ["Total", "Total", '="%.2f"' % total_balance]
+
+    return csv_response(rows(), 'OT_By_Month_%s_%s.csv' % (year, month))
 
 @admin_check
 def ot_by_year(request, year=None): # pragma: no cover
     '''Endpoint which creates a CSV file for all OT in a year.
     :param year: The year for the report.'''
     auth_user = Tbluser.objects.get(id=request.session.get("user_id"))
-    buf = StringIO()
-    buf.write("\xef\xbb\xbf")
-    csvfile = UnicodeWriter(buf)
-    csvfile.writerow(
-        ["Name", "Team"] + [MONTH_MAP[n][1] for n in range(0,12)]
-        )
-    total_balance = 0
-    balances = {
-        n: 0 for n in range(1, 13)
-        }
-    for user in auth_user.get_subordinates():
-        row = [user.name(), user.process]
-        for month in range(1, 13):
-            balance = user.get_total_balance(ret='flo', year=year, month=month)
-            balances[month] += balance
-            row.append('="%.2f"' % balance if balance != 0.0 else "-")
-        csvfile.writerow(row)
-    totalrow = ["Total", "Total"]
-    [totalrow.append('="%.2f"' % balances[n]) for n in range(1,13)]
-    csvfile.writerow(totalrow)
-    response = HttpResponse(buf.getvalue(), mimetype="text/csv")
-    response['Content-Disposition'] = \
-        'attachment;filename=OT_By_Year_%s_%s.csv' % (year, month)
-    return response
+
+    def rows():
+        '''Generates the rows of the report.'''
+        yield ["Name", "Team"] + [MONTH_MAP[n][1] for n in range(0,12)]
+        balances = {
+            n: 0 for n in range(1, 13)
+            }
+        users = list(auth_user.get_subordinates())
+        user_balances = Tbluser.objects.balances_for(users, year, by='month')
+        for user in users:
+            row = [user.name(), user.process]
+            for month in range(1, 13):
+                balance = user_balances[user.id][month]
+                balances[month] += balance
+                row.append('="%.2f"' % balance if balance != 0.0 else "-")
+            yield row
+        yield ["Total", "Total"] + ['="%.2f"' % balances[n]
+                                    for n in range(1,13)]
+
+    return csv_response(rows(), 'OT_By_Year_%s.csv' % year)
 
 @admin_check
 def holidays_for_yearmonth(request, year=None): # pragma: no cover
@@ -168,28 +157,31 @@ def holidays_for_yearmonth(request, year=None): # pragma: no cover
     if not year:
         raise Http404
     auth_user = Tbluser.objects.get(id=request.session.get("user_id"))
-    buf = StringIO()
-    buf.write("\xef\xbb\xbf")
-    csvfile = UnicodeWriter(buf)
-    csvfile.writerow(
-        ["Name"] + [MONTH_MAP[n][1] for n in range(0,12)] + ["Used", "Remaining"]
-        )
-    for user in auth_user.get_subordinates():
-        row = [user.name()]
-        total = 0
-        for month in range(1,13):
-            e = TrackingEntry.objects.filter(user_id=user.id,
-                                             entry_date__year=year,
-                                             entry_date__month=month,
-                                             daytype="HOLIS").count()
-            total += e
-            row.append(e)
-        row.append(["%d" % total, "%d" % user.holiday_balance])
-        csvfile.writerow(row)
-    response = HttpResponse(buf.getvalue(), mimetype="text/csv")
-    response['Content-Disposition'] = \
-        'attachment;filename=Holidays_for_year%s.csv' % year
-    return response
+
+    def rows():
+        '''Generates the rows of the report.'''
+        yield ["Name"] + [MONTH_MAP[n][1] for n in range(0,12)] + \
+            ["Used", "Remaining"]
+        users = list(auth_user.get_subordinates())
+        holidays = {}
+        for row in TrackingEntry.objects.filter(
+                user__in=users,
+                entry_date__year=year,
+                daytype="HOLIS"
+            ).values_list("user_id", "entry_date").order_by().iterator():
+            key = (row[0], row[1].month)
+            holidays[key] = holidays.get(key, 0) + 1
+        for user in users:
+            row = [user.name()]
+            total = 0
+            for month in range(1,13):
+                e = holidays.get((user.id, month), 0)
+                total += e
+                row.append(e)
+            row.extend(["%d" % total, "%d" % user.holiday_balance])
+            yield row
+
+    return csv_response(rows(), 'Holidays_for_year%s.csv' % year)
 
 @admin_check
 def ot_for_hr(request, year=None, month=None): # pragma: no cover
@@ -203,18 +195,7 @@ def ot_for_hr(request, year=None, month=None): # pragma: no cover
 def all_team(request, year=None, month=None, team=None): # pragma: no cover
     if not year or not month or not team:
         raise Http404
-
-    buf = StringIO()
-    buf.write("\xef\xbb\xbf")
-    csvfile = UnicodeWriter(buf)
-    csvfile.writerow(TrackingEntry.headings())
-    for user in Tbluser.objects.filter(market=team):
-        for entry in TrackingEntry.objects.filter(
-            entry_date__year=year,
-            entry_date__month=month,
-            user_id=user.id):
-            csvfile.writerow(entry.display_as_csv())
-    response = HttpResponse(buf.getvalue(), mimetype="text/csv")
-    response['Content-Disposition'] = \
-        'attachment;filename=AllHolidayData_%s_%s_%s.csv' % (year, month, team)
-    return response
+    return csv_response(
+        entries_for_team(Tbluser.objects.filter(market=team), year, month),
+        'AllHolidayData_%s_%s_%s.csv' % (year, month, team)
+    )
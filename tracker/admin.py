@@ -103,7 +103,17 @@ class TrackerAdmin(admin.ModelAdmin):
     search_fields = ["user__firstname", "user__lastname", "user__user_id"]
 
 
+class QueuedEmailAdmin(admin.ModelAdmin):
+    """Gives access to the outbox, mostly to look at the e-mails which have
+    been given up on. Clearing the error and setting send_after on one of
+    them queues it again.
+    """
+    list_display = ('subject', 'to', 'created_on', 'attempts', 'send_after')
+    search_fields = ["to", "subject"]
+
+
 admin.site.register(models.Tbluser, UserAdmin)
 admin.site.register(models.TrackingEntry, TrackerAdmin)
 admin.site.register(models.Tblauthorization, AuthAdmin)
 admin.site.register(models.RelatedUsers, RelatedAdmin)
+admin.site.register(models.QueuedEmail, QueuedEmailAdmin)
@@ -0,0 +1,296 @@
+'''Aggregated balance calculations for :class:`Tbluser`.
+
+Walking every :class:`TrackingEntry` of an agent in Python to find
+their balance gets slower the longer they have been with us. Instead we
+ask the database for a single grouped result set: each distinct
+(daytype, normalized working time) *shape* together with how many days
+were tracked with it. Agents work the same handful of shifts, so
+that result set is a few rows long no matter how big their history is,
+and the arithmetic is done once per shape rather than once per day.
+
+Linked entries are removed in the WHERE clause, so no entry (or the
+entry it links to) is ever loaded into memory.
+
+Whole months are answered from the
+:class:`timetracker.tracker.ledger.MonthlyBalance` ledger which holds
+the same totals, kept up to date as entries are saved.
+'''
+
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+
+from timetracker.tracker.trackingentry import TrackingEntry, MINUTES_IN_DAY
+from timetracker.utils.datemaps import WORKING_CHOICES
+
+# the daytypes which count towards the balance, SATUR is paid
+# separately and LINKD days are never worked.
+BALANCE_DAYTYPES = [element[0]
+                    for element in WORKING_CHOICES
+                    if element[0] not in ["SATUR", "LINKD"]]
+
+# the daytypes which the weekly reminders count as worked.
+WEEKLY_DAYTYPES = ["SATUR", "WKDAY"]
+
+# the figures which the balance calculations are built from.
+BALANCE_TOTALS = ("worked_minutes", "rounded_minutes",
+                  "working_days", "return_days")
+
+
+def balance_filters(year=None, month=None, from_=None, to_=None):
+    '''Builds the date filters for a balance in the same way that
+    :meth:`Tbluser.get_total_balance` always has. A date range, when
+    given in full, takes precedence over the year and month.
+
+    :rtype: :class:`dict` suitable for passing to QuerySet.filter
+    '''
+    if from_ and to_:
+        return {"entry_date__range": [from_, to_]}
+    if not year and not month:
+        return {}
+    if year and not month:
+        return {"entry_date__year": year}
+    return {"entry_date__year": year, "entry_date__month": month}
+
+def tracking_days(user_id, **filters):
+    '''The working days which count towards a balance.'''
+    return TrackingEntry.objects.filter(user_id=user_id,
+                                        daytype__in=BALANCE_DAYTYPES,
+                                        **filters)
+
+def return_days(user_id, **filters):
+    '''The return for overtime days which count against a balance.'''
+    return TrackingEntry.objects.filter(user_id=user_id,
+                                        daytype="ROVER",
+                                        **filters)
+
+def entry_shapes(user_id, **filters):
+    '''Returns the distinct shapes of the entries which make up a balance
+    along with the number of days tracked with that shape.
+
+    A shape is the daytype and the normalized working time, the minutes
+    actually worked are summed up by the database. This is a single
+    query, linked working days are excluded in SQL the same way that
+    :meth:`TrackingEntry.is_linked` would exclude them.
+
+    :param user_id: The id of the :class:`Tbluser`.
+    :param filters: Additional filters, see :func:`balance_filters`.
+    :rtype: :class:`list` of :class:`dict` with the keys daytype,
+            normalized_worked_minutes, worked_minutes and days.
+    '''
+    return list(TrackingEntry.objects.filter(
+        Q(daytype="ROVER") | Q(daytype__in=BALANCE_DAYTYPES,
+                               link__isnull=True),
+        user_id=user_id,
+        **filters
+    ).values(
+        "daytype", "normalized_worked_minutes"
+    ).annotate(
+        days=Count("id"), worked_minutes=Sum("worked_minutes")
+    ).order_by())
+
+def shape_totals(user, shapes):
+    '''Reduces the shapes from :func:`entry_shapes` to the handful of
+    totals which every balance calculation is built from.
+
+    worked_minutes is the raw time worked, rounded_minutes is the
+    normalized working time of each entry rounded down to the half hour
+    as :func:`timetracker.utils.datemaps.hr_calculation` does.
+
+    :rtype: :class:`dict`
+    '''
+    totals = dict.fromkeys(BALANCE_TOTALS, 0)
+    for shape in shapes:
+        days = shape["days"]
+        if shape["daytype"] == "ROVER":
+            totals["return_days"] += days
+            continue
+        totals["working_days"] += days
+        totals["worked_minutes"] += shape["worked_minutes"]
+        totals["rounded_minutes"] += days * (
+            shape["normalized_worked_minutes"] // 30 * 30
+            )
+    return totals
+
+def shift_minutes(user):
+    '''The user's shiftlength, without breaks, in minutes.'''
+    return user.shiftlength.hour * 60 + user.shiftlength.minute
+
+def break_minutes(user):
+    '''The user's regular breaklength in minutes.'''
+    return user.breaklength.hour * 60 + user.breaklength.minute
+
+def regular_balance(user, totals):
+    '''The aggregated counterpart of :meth:`Tbluser._regular_calculation`.
+
+    No rounding is done so it is exactly what the agents entered.
+    '''
+    return (totals["worked_minutes"]
+            - totals["working_days"] * shift_minutes(user)
+            - totals["return_days"] * (shift_minutes(user)
+                                       + break_minutes(user))) / 60.0
+
+def hr_balance(user, totals):
+    '''The aggregated counterpart of
+    :func:`timetracker.utils.datemaps.hr_calculation`.
+
+    Rounding happens per entry, which is why it is already part of the
+    rounded_minutes total.
+    '''
+    return (totals["rounded_minutes"]
+            - (totals["working_days"] + totals["return_days"])
+            * (shift_minutes(user) + break_minutes(user))) / 60.0
+
+def ledger_filters(filters):
+    '''Translates balance filters into filters on the
+    :class:`timetracker.tracker.ledger.MonthlyBalance` ledger.
+
+    :return: :class:`dict` or None if the ledger cannot answer them.
+    '''
+    if "entry_date__range" in filters:
+        return None
+    return dict(
+        (key.replace("entry_date__", ""), int(value))
+        for key, value in filters.items()
+        )
+
+def balance_totals(user, **filters):
+    '''Returns the totals for a user's balance, from the monthly ledger
+    whenever the filters fall on month boundaries and from a single
+    aggregate over the entries when they don't.
+
+    :rtype: :class:`dict`, see :func:`shape_totals`
+    '''
+    # to avoid circular import dependencies
+    from timetracker.tracker.ledger import MonthlyBalance
+    ledger = ledger_filters(filters)
+    if ledger is None:
+        return shape_totals(user, entry_shapes(user.id, **filters))
+    return MonthlyBalance.totals_for(user_id=user.id, **ledger)
+
+def calculate_balance(user, **filters):
+    '''Calculates the balance for a user using the strategy which has
+    been set for their market, see :mod:`timetracker.tracker.strategies`.
+
+    Registered strategies are answered from the balance totals. If the
+    market uses an override calculation which has not been registered
+    as a strategy we hand it the querysets as it expects.
+
+    :param user: :class:`Tbluser` instance.
+    :param filters: Additional filters, see :func:`balance_filters`.
+    :rtype: :class:`float`
+    '''
+    # to avoid circular import dependencies
+    from timetracker.tracker.strategies import strategy_for
+    strategy = strategy_for(user.market)
+    if strategy:
+        return strategy.totals(user, balance_totals(user, **filters))
+    return settings.OVERRIDE_CALCULATION[user.market](
+        user,
+        tracking_days(user.id, **filters),
+        return_days(user.id, **filters)
+        )
+
+def team_balances(users, year, by="month", month=None):
+    '''Calculates the balances of a whole team, however big it is.
+
+    Users whose market uses a registered strategy are answered with a
+    single grouped query over the monthly ledger. Markets with an
+    override calculation which has not been registered as a strategy
+    still fall back to calculating each user on their own.
+
+    :param users: An iterable of :class:`Tbluser` instances.
+    :param year: The year to calculate the balances for.
+    :param by: "month" for a balance per month or "year" for a single
+               balance over the whole year.
+    :param month: Restricts the balances to a single month.
+    :rtype: :class:`dict` of user ids to their balance when by is "year",
+            or to a :class:`dict` of month numbers to balances when by is
+            "month".
+    '''
+    # to avoid circular import dependencies
+    from timetracker.tracker.ledger import MonthlyBalance
+    from timetracker.tracker.strategies import strategy_for
+    if by not in ("month", "year"):
+        raise ValueError("Balances can only be grouped by month or year.")
+    users = list(users)
+    year = int(year)
+    month = int(month) if month else None
+
+    strategies = dict((user.id, strategy_for(user.market)) for user in users)
+    ledger_users = dict(
+        (user.id, user) for user in users if strategies[user.id]
+        )
+
+    balances = {}
+    if ledger_users:
+        ledger = {"user__in": ledger_users.keys(), "year": year}
+        if month:
+            ledger["month"] = month
+        grouping = ["user", "month"] if by == "month" else ["user"]
+        for row in MonthlyBalance.objects.filter(**ledger).values(
+                *grouping
+            ).annotate(
+                **dict((total, Sum(total)) for total in BALANCE_TOTALS)
+            ).order_by():
+            user = ledger_users[row["user"]]
+            balances[user.id, row.get("month")] = \
+                strategies[user.id].totals(user, row)
+
+    empty = dict.fromkeys(BALANCE_TOTALS, 0)
+    def balance(user, period=None):
+        '''Looks up one balance, calculating it if it wasn't grouped.'''
+        if (user.id, period) in balances:
+            return balances[user.id, period]
+        if user.id in ledger_users:
+            return strategies[user.id].totals(user, empty)
+        period_filters = balance_filters(year=year, month=period or month)
+        return settings.OVERRIDE_CALCULATION[user.market](
+            user,
+            tracking_days(user.id, **period_filters),
+            return_days(user.id, **period_filters)
+            )
+
+    if by == "year":
+        return dict((user.id, balance(user)) for user in users)
+    months = [month] if month else range(1, 13)
+    return dict(
+        (user.id, dict((period, balance(user, period)) for period in months))
+        for user in users
+        )
+
+def previous_week(today=None):
+    '''The dates which the weekly reminders cover, the seven days up to
+    and including today.'''
+    today = today or datetime.date.today()
+    return today - datetime.timedelta(days=7), today
+
+def weekly_totals(users, from_, to_):
+    '''The hours, as :meth:`TrackingEntry.totalhours` counts them, and
+    the number of days which several users tracked between two dates.
+
+    This is one query grouped by user and by the worked and break
+    minutes, so the hours are counted per entry just as
+    :meth:`Tbluser.previous_week_balance` always has.
+
+    :param users: A list of user ids or a :class:`QuerySet` of users,
+                  which is then a subquery.
+    :rtype: :class:`dict` of user id to a (hours, days) tuple
+    '''
+    totals = {}
+    for shape in TrackingEntry.objects.filter(
+            user__in=users,
+            entry_date__range=(from_, to_),
+            daytype__in=WEEKLY_DAYTYPES
+        ).values(
+            "user_id", "worked_minutes", "break_minutes"
+        ).annotate(days=Count("id")).order_by():
+        hours, days = totals.get(shape["user_id"], (0, 0))
+        totals[shape["user_id"]] = (
+            hours + shape["days"] * ((shape["worked_minutes"]
+                                      + 2 * shape["break_minutes"])
+                                     % MINUTES_IN_DAY) / 60.0,
+            days + shape["days"]
+        )
+    return totals
@@ -0,0 +1,133 @@
+'''Cache keys.
+
+Every key the timetracker caches under is built here. The parts of a key
+are separated, so that user 1 in 2013 and user 12 in 013 cannot end up
+with the same key as they could when the parts were simply concatenated.
+
+Most of what is cached is derived from a user's tracking entries in a
+given year: the calendars, the holiday planning rows, the year and
+overtime views and the balances. Rather than deleting each of those
+keys, and having to remember every one of them, keys which are derived
+from a user's year carry the generation of the user and of the year::
+
+    holidaybalance:12:2013:g1381219212000001.1381219213000004
+
+Bumping either generation moves every key of that user, or of that
+year, to a key which has never been set. The entries under the old keys
+are never read again and are left for the cache to expire.
+
+What is derived from the activity of whole markets, such as the
+activity volume charts, carries the generation of each of the markets
+in the same way.
+
+A generation which has been evicted starts again from the current time
+in microseconds, which is later than any generation it had before, so a
+stale entry cannot become current again.
+'''
+
+import time
+
+from django.core.cache import cache
+
+SEPARATOR = ":"
+
+
+def make_key(name, *parts):
+    '''Builds the key for name with the parts separated.
+
+    :rtype: :class:`str`
+    '''
+    return SEPARATOR.join([name] + [str(part) for part in parts])
+
+def new_generation():
+    '''A generation which is later than any handed out before.'''
+    return int(time.time() * 1000000)
+
+def user_generation_key(user_id):
+    '''The key the generation of a user is held under.'''
+    return make_key("generation", user_id)
+
+def year_generation_key(user_id, year):
+    '''The key the generation of a user's year is held under.'''
+    return make_key("generation", user_id, year)
+
+def market_generation_key(market):
+    '''The key the generation of a market's activity is held under.'''
+    return make_key("generation", "market", market)
+
+def generations(keys):
+    '''Returns the generations held under keys, starting any which are
+    not in the cache.
+
+    :rtype: :class:`dict` of key to generation
+    '''
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            generation = new_generation()
+            # another process may have started it in the meantime.
+            if not cache.add(key, generation):
+                generation = cache.get(key, generation)
+            found[key] = generation
+    return found
+
+def user_year_keys(name, user_ids, year, *parts):
+    '''Builds the keys of several users' years at once, with one round
+    trip to the cache for the generations.
+
+    :rtype: :class:`dict` of user id to key
+    '''
+    user_ids = list(user_ids)
+    found = generations(
+        [user_generation_key(user_id) for user_id in user_ids] +
+        [year_generation_key(user_id, year) for user_id in user_ids]
+    )
+    return dict(
+        (user_id, make_key(
+            name, user_id, year,
+            "g%s.%s" % (found[user_generation_key(user_id)],
+                        found[year_generation_key(user_id, year)]),
+            *parts))
+        for user_id in user_ids
+    )
+
+def user_year_key(name, user_id, year, *parts):
+    '''Builds the key of something derived from a user's year, see
+    :func:`user_year_keys`.
+
+    :rtype: :class:`str`
+    '''
+    return user_year_keys(name, [user_id], year, *parts)[user_id]
+
+def market_key(name, markets, *parts):
+    '''Builds the key of something derived from the activity of several
+    markets, with one round trip to the cache for the generations.
+
+    :rtype: :class:`str`
+    '''
+    markets = sorted(markets)
+    keys = [market_generation_key(market) for market in markets]
+    found = generations(keys)
+    return make_key(
+        name, ",".join(markets),
+        "g%s" % ".".join(str(found[key]) for key in keys),
+        *parts)
+
+def bump(key):
+    '''Moves a generation on.'''
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_generation())
+
+def invalidate_user_year(user_id, year):
+    '''Invalidates everything cached from a user's year.'''
+    bump(year_generation_key(user_id, year))
+
+def invalidate_user(user_id):
+    '''Invalidates everything cached from any of a user's years.'''
+    bump(user_generation_key(user_id))
+
+def invalidate_market(market):
+    '''Invalidates everything cached from the activity of a market.'''
+    bump(market_generation_key(market))
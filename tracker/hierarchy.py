@@ -0,0 +1,102 @@
+'''The organisation hierarchy index.
+
+Who a user's administrator is used to be worked out by walking their
+:class:`Tblauthorization` links each time it was needed, which is on
+every approval and most notifications. The index resolves the whole
+organisation with a single query instead: each user's administrator and
+the administrators' names and e-mails. Lookups are then dictionary
+reads.
+
+The index is kept in the cache, so that every process shares it, and is
+removed by the signal receivers in :mod:`timetracker.tracker.models`
+whenever a link or a user changes.
+'''
+
+from django.core.cache import cache
+
+from timetracker.tracker.cachekeys import make_key
+
+HIERARCHY_CACHE_KEY = make_key("hierarchy")
+
+# marks users whose links do not resolve to a single administrator, the
+# original lookup is left to raise the appropriate error for them.
+AMBIGUOUS = -1
+
+
+class Hierarchy(object):
+
+    '''The resolved organisation.
+
+    :param links: Iterable of (user id, admin id, admin user_type,
+                  admin user_id, admin firstname, admin lastname)
+                  tuples, one per authorization link.
+    '''
+
+    def __init__(self, links):
+        self.administrators = {}
+        self.admins = {}
+        linked = {}
+        for user, admin, admin_type, email, firstname, lastname in links:
+            linked.setdefault(user, []).append((admin, admin_type))
+            self.admins[admin] = (email, firstname + ' ' + lastname)
+        for user, admins in linked.items():
+            self.administrators[user] = self.resolve(admins)
+
+    @staticmethod
+    def resolve(admins):
+        '''Picks the administrator from a user's links in the same way
+        that :meth:`Tbluser.get_administrator` always has.'''
+        if len(admins) == 1:
+            return admins[0][0]
+        if len(admins) == 2:
+            for admin, admin_type in admins:
+                if admin_type != "SUPER":
+                    return admin
+        return AMBIGUOUS
+
+    @staticmethod
+    def build():
+        '''Builds the index from the authorization links.'''
+        # to avoid circular import dependencies
+        from timetracker.tracker.models import Tblauthorization
+        return Hierarchy(
+            Tblauthorization.users.through.objects.values_list(
+                "tbluser_id",
+                "tblauthorization__admin_id",
+                "tblauthorization__admin__user_type",
+                "tblauthorization__admin__user_id",
+                "tblauthorization__admin__firstname",
+                "tblauthorization__admin__lastname",
+            ).order_by("id")
+        )
+
+    def administrator(self, user_id):
+        '''The id of the user's administrator, None when they are not in
+        a team or :data:`AMBIGUOUS`.'''
+        return self.administrators.get(user_id)
+
+    def admin_email(self, admin_id):
+        '''The e-mail address of an administrator.'''
+        return self.admins[admin_id][0]
+
+    def admin_name(self, admin_id):
+        '''The full name of an administrator.'''
+        return self.admins[admin_id][1]
+
+
+def org_hierarchy():
+    '''Returns the organisation hierarchy, building it if it isn't
+    cached.
+
+    :rtype: :class:`Hierarchy`
+    '''
+    cached_result = cache.get(HIERARCHY_CACHE_KEY)
+    if cached_result is not None:
+        return cached_result
+    hierarchy = Hierarchy.build()
+    cache.set(HIERARCHY_CACHE_KEY, hierarchy)
+    return hierarchy
+
+def invalidate_hierarchy():
+    '''Removes the cached hierarchy so that it is rebuilt on next use.'''
+    cache.delete(HIERARCHY_CACHE_KEY)
@@ -0,0 +1,194 @@
+'''The monthly balance ledger.
+
+Every page which shows a balance used to recompute it from the raw
+:class:`TrackingEntry` rows. The ledger keeps one row per user per
+month holding the totals which the balance calculations in
+:mod:`timetracker.tracker.balances` are built from, along with how many
+of each daytype were tracked that month. The row is refreshed whenever
+an entry in that month is saved or deleted, so yearly and all-time
+balances become a sum over at most a few hundred rows.
+
+The user's shiftlength is deliberately not baked into the ledger, the
+expected hours are worked out from the day counts when they are read so
+changing an agent's shiftlength never leaves the ledger out of date.
+'''
+
+from django.db import models
+from django.db.models import Count, Sum
+
+from timetracker.tracker.trackingentry import TrackingEntry
+from timetracker.tracker.balances import (BALANCE_TOTALS, entry_shapes,
+                                          shape_totals, shift_minutes,
+                                          break_minutes)
+from timetracker.utils.datemaps import DAYTYPE_CHOICES
+
+
+def count_field(daytype):
+    '''The name of the ledger column holding the count of a daytype.'''
+    return "%s_count" % daytype.lower()
+
+
+class MonthlyBalance(models.Model):
+
+    '''Holds the balance totals of a single user for a single month.
+
+    The rows are maintained by :meth:`TrackingEntry.save` and
+    :meth:`TrackingEntry.delete`, they can be rebuilt and verified with
+    the rebuild_ledger management command.
+    '''
+
+    user = models.ForeignKey("Tbluser", related_name="monthly_balances")
+    year = models.IntegerField()
+    month = models.IntegerField()
+
+    worked_minutes = models.IntegerField(default=0)
+    rounded_minutes = models.IntegerField(default=0)
+    working_days = models.IntegerField(default=0)
+    return_days = models.IntegerField(default=0)
+
+    linkd_count = models.IntegerField(default=0)
+    wkday_count = models.IntegerField(default=0)
+    pendi_count = models.IntegerField(default=0)
+    holis_count = models.IntegerField(default=0)
+    sickd_count = models.IntegerField(default=0)
+    puabs_count = models.IntegerField(default=0)
+    puwrk_count = models.IntegerField(default=0)
+    retrn_count = models.IntegerField(default=0)
+    speci_count = models.IntegerField(default=0)
+    train_count = models.IntegerField(default=0)
+    dayod_count = models.IntegerField(default=0)
+    satur_count = models.IntegerField(default=0)
+    wkhom_count = models.IntegerField(default=0)
+    rover_count = models.IntegerField(default=0)
+    other_count = models.IntegerField(default=0)
+
+    class Meta:
+        '''
+        Metaclass gives access to additional options
+        '''
+        verbose_name = 'Monthly Balance'
+        verbose_name_plural = 'Monthly Balances'
+        unique_together = ('user', 'year', 'month')
+        ordering = ['user', 'year', 'month']
+
+    def __unicode__(self): # pragma: no cover
+        return u'%s - %s/%s' % (self.user, self.year, self.month)
+
+    def worked_hours(self):
+        '''The hours worked this month, without any rounding.'''
+        return self.worked_minutes / 60.0
+
+    def expected_hours(self):
+        '''The hours the user was expected to work this month.'''
+        return self.working_days * shift_minutes(self.user) / 60.0
+
+    def rover_hours(self):
+        '''The hours taken back as return for overtime this month.'''
+        return self.return_days * (shift_minutes(self.user)
+                                   + break_minutes(self.user)) / 60.0
+
+    def daytype_count(self, daytype):
+        '''Returns how many entries of a daytype were tracked this
+        month.'''
+        return getattr(self, count_field(daytype))
+
+    def totals(self):
+        '''The balance totals held in this row.
+
+        :rtype: :class:`dict`, see
+                :func:`timetracker.tracker.balances.shape_totals`
+        '''
+        return dict((total, getattr(self, total)) for total in BALANCE_TOTALS)
+
+    @staticmethod
+    def calculate(user, year, month):
+        '''Calculates what the ledger row for a month should contain
+        from the user's entries.
+
+        :rtype: :class:`dict` of field names to values.
+        '''
+        values = shape_totals(user, entry_shapes(user.id,
+                                                 entry_date__year=year,
+                                                 entry_date__month=month))
+        values.update(
+            (count_field(daytype[0]), 0) for daytype in DAYTYPE_CHOICES
+        )
+        for row in TrackingEntry.objects.filter(
+                user_id=user.id,
+                entry_date__year=year,
+                entry_date__month=month
+            ).values("daytype").annotate(days=Count("id")).order_by():
+            values[count_field(row["daytype"])] = row["days"]
+        return values
+
+    @staticmethod
+    def refresh(user, year, month):
+        '''Brings the ledger row of a month up to date with the entries.
+
+        Months without any entries do not keep a row.
+        '''
+        values = MonthlyBalance.calculate(user, year, month)
+        if not any(values.values()):
+            MonthlyBalance.objects.filter(user_id=user.id,
+                                          year=year,
+                                          month=month).delete()
+            return None
+        row, _ = MonthlyBalance.objects.get_or_create(user_id=user.id,
+                                                      year=year,
+                                                      month=month)
+        for key, value in values.items():
+            setattr(row, key, value)
+        row.save()
+        return row
+
+    @staticmethod
+    def rebuild(user):
+        '''Rebuilds every ledger row of a user.
+
+        :return: The amount of rows in the ledger for the user.
+        '''
+        months = set(
+            (date.year, date.month) for date in
+            TrackingEntry.objects.filter(user_id=user.id).dates(
+                "entry_date", "month")
+            )
+        MonthlyBalance.objects.filter(user_id=user.id).exclude(
+            id__in=[row.id for row in MonthlyBalance.objects.filter(
+                user_id=user.id) if (row.year, row.month) in months]
+        ).delete()
+        for year, month in sorted(months):
+            MonthlyBalance.refresh(user, year, month)
+        return len(months)
+
+    @staticmethod
+    def totals_for(**filters):
+        '''Sums the balance totals over the ledger rows matching the
+        filters.
+
+        :rtype: :class:`dict`, see
+                :func:`timetracker.tracker.balances.shape_totals`
+        '''
+        result = MonthlyBalance.objects.filter(**filters).aggregate(
+            **dict((total, Sum(total)) for total in BALANCE_TOTALS)
+            )
+        return dict((key, value or 0) for key, value in result.items())
+
+    @staticmethod
+    def daytype_totals(user_ids, year, daytypes):
+        '''Counts how many of each daytype every user tracked in a year
+        with a single grouped query.
+
+        :rtype: :class:`dict` of user ids to a :class:`dict` of daytype
+                codes to their count, users without entries are left out.
+        '''
+        result = {}
+        for row in MonthlyBalance.objects.filter(
+                user_id__in=user_ids, year=year
+            ).values("user").annotate(
+                **dict((daytype, Sum(count_field(daytype)))
+                       for daytype in daytypes)
+            ).order_by():
+            result[row["user"]] = dict(
+                (daytype, row[daytype] or 0) for daytype in daytypes
+                )
+        return result
@@ -0,0 +1,183 @@
+'''Compares the time taken to calculate the utilization of the last 12
+months a month and an activity entry at a time, as the utilization
+report used to, with :func:`timetracker.vcs.utilization.monthly_utilization`.
+
+The run creates a test database, in the same way as the test runner
+does, and destroys it at the end, so the live database is never written
+to. A synthetic year of agents, activity entries and absences is created
+in it for a market of its own, which must not have any users.'''
+
+import datetime
+import time
+from decimal import Decimal
+from optparse import make_option
+
+from django.db import connection
+from django.core.management.base import BaseCommand, CommandError
+
+from timetracker.tracker.models import Tbluser, TrackingEntry
+from timetracker.utils.calendar_utils import last12months, working_days
+from timetracker.vcs.models import Activity, ActivityEntry
+from timetracker.vcs.utilization import (monthly_utilization, empty_result,
+                                         calculate, FTE_MINUTES,
+                                         LOSS_DAYTYPES, ABSENT_DAYTYPES)
+
+USER_ID = "benchmark.utilization%d@benchmark.invalid"
+# a market code which isn't one of MARKET_CHOICES.
+BENCHMARK_MARKET = "ZZ"
+
+
+def create_year(market, year, users, activities):
+    '''Creates the agents of a market with an activity entry for each of
+    the activities on every weekday of the year, and a few days off and
+    holidays.'''
+    agents = Tbluser.objects.bulk_create([
+        Tbluser(user_id=USER_ID % num, firstname="bench", lastname="mark",
+                password="password", salt="nothing", user_type="RUSER",
+                market=market, process="AP",
+                start_date=datetime.date(year, 1, 1),
+                breaklength="00:15:00", shiftlength="07:45:00",
+                job_code="00F20G", holiday_balance=20)
+        for num in range(users)
+    ])
+    agents = list(Tbluser.objects.filter(
+        user_id__in=[agent.user_id for agent in agents]
+    ))
+    tasks = Activity.objects.bulk_create([
+        Activity(group="ALL" if num == 0 else "BNCH", grouptype="benchmark",
+                 groupdetail="benchmark %d" % num, details="benchmark",
+                 disabled=False, time=Decimal("1.25") * (num + 1),
+                 costbucket="PVA")
+        for num in range(activities)
+    ])
+    tasks = list(Activity.objects.filter(grouptype="benchmark"))
+
+    days = [datetime.date(year, 1, 1) + datetime.timedelta(days=num)
+            for num in range(365)]
+    weekdays = [day for day in days if day.weekday() < 5]
+    ActivityEntry.objects.bulk_create([
+        ActivityEntry(user=agent, activity=task, amount=num % 20 + 1,
+                      creation_date=day)
+        for num, day in enumerate(weekdays)
+        for agent in agents
+        for task in tasks
+    ], batch_size=500)
+    TrackingEntry.objects.bulk_create([
+        TrackingEntry(user=agent, entry_date=day, start_time="00:00:00",
+                      end_time="00:00:00", breaks="00:00:00",
+                      daytype=LOSS_DAYTYPES[num % len(LOSS_DAYTYPES)])
+        for agent in agents
+        for num, day in enumerate(weekdays[agent.id % 10::10])
+    ], batch_size=500)
+
+def per_entry_utilization(teams, month):
+    '''The utilization of a month, calculated the way it used to be, by
+    walking every activity entry of the month.'''
+    entries = ActivityEntry.objects.filter(
+        user__market__in=teams,
+        creation_date__year=month.year,
+        creation_date__month=month.month
+    ).select_related("activity", "user")
+    if len(entries) == 0:
+        return empty_result()
+    absent = set(TrackingEntry.objects.filter(
+        user__market__in=teams,
+        daytype__in=ABSENT_DAYTYPES,
+        entry_date__year=month.year,
+        entry_date__month=month.month
+    ).values_list("user_id", "entry_date"))
+    losses = TrackingEntry.objects.filter(
+        user__market__in=teams,
+        daytype__in=LOSS_DAYTYPES,
+        entry_date__year=month.year,
+        entry_date__month=month.month
+    ).count() * FTE_MINUTES
+    util = 0
+    users = set()
+    for entry in entries:
+        if (entry.user.id, entry.creation_date) in absent:
+            continue
+        time = entry.amount * entry.activity.time
+        if entry.activity.group != "ALL":
+            util += time
+        else:
+            losses += time
+        users.add(entry.user)
+    if not users:
+        return empty_result()
+    available_time = (Tbluser.available_minutes(teams) *
+                      len(working_days(month.year, month.month)))
+    return calculate(util, losses, available_time, len(users))
+
+
+class Command(BaseCommand):
+    '''Implementation of a Django command.'''
+    help = 'Benchmarks the utilization calculation on a synthetic year ' \
+           'of activity.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--market',
+                    dest='market',
+                    default=BENCHMARK_MARKET,
+                    help='The market the synthetic agents are put in, '
+                         'it must not have any users.'),
+        make_option('--users',
+                    type='int',
+                    dest='users',
+                    default=30,
+                    help='How many synthetic agents to create.'),
+        make_option('--activities',
+                    type='int',
+                    dest='activities',
+                    default=4,
+                    help='How many activities each agent tracks a day.'),
+        make_option('--noinput',
+                    action='store_false',
+                    dest='interactive',
+                    default=True,
+                    help='Destroy an old test database without asking.'),
+        )
+
+    def handle(self, *args, **options):
+        '''Main entry point'''
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=not options['interactive']
+        )
+        try:
+            before, after, per_entry, grouped = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        if before != after:
+            raise CommandError("The calculations gave different results.")
+        self.stdout.write("%-20s %8.3f seconds\n" % ("per entry", per_entry))
+        self.stdout.write("%-20s %8.3f seconds %6.2fx\n" % (
+            "grouped", grouped, per_entry / grouped
+        ))
+
+    def run(self, options):
+        '''Times both calculations over a synthetic year.
+
+        :return: The results of each calculation and their times.
+        '''
+        market = options['market']
+        if Tbluser.objects.filter(market=market).exists():
+            raise CommandError("The %s market already has users." % market)
+        year = datetime.date.today().year - 1
+        teams = [market]
+        months = last12months(year, 12)
+
+        started = time.time()
+        create_year(market, year, options['users'], options['activities'])
+        self.stdout.write("Created a synthetic year in %.2f seconds\n"
+                          % (time.time() - started))
+
+        started = time.time()
+        before = dict(((month.year, month.month),
+                       per_entry_utilization(teams, month))
+                      for month in months)
+        per_entry = max(time.time() - started, 1e-6)
+
+        started = time.time()
+        after = monthly_utilization(teams, months)
+        grouped = max(time.time() - started, 1e-6)
+        return before, after, per_entry, grouped
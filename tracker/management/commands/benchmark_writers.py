@@ -0,0 +1,90 @@
+'''Compares the rows per second of the CSV writers in
+:mod:`timetracker.utils.writers` on rows shaped like those of the
+reports.'''
+
+try:
+    from cStringIO import StringIO
+except ImportError: # pragma: no cover
+    from StringIO import StringIO
+
+import datetime
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from timetracker.utils.writers import UnicodeWriter, BatchUnicodeWriter
+
+
+def sample_rows(count):
+    '''Generates rows like the ones of the holiday data reports.'''
+    start = datetime.date(2013, 1, 1)
+    for num in xrange(count):
+        yield [
+            num,
+            u"Fran\xe7ois",
+            u"M\xfcller",
+            start + datetime.timedelta(days=num % 365),
+            "09:00",
+            "17:30",
+            "00:15",
+            "WKDAY",
+            '="%.2f"' % (num % 97 / 4.0),
+        ]
+
+def time_writer(writer_class, rows, repeat, **kwds):
+    '''Writes the rows with a writer, repeat times.
+
+    :return: The output and the best time in seconds.
+    '''
+    best = None
+    for _ in range(repeat):
+        buff = StringIO()
+        started = time.time()
+        writer = writer_class(buff, delimiter=';', **kwds)
+        writer.writerows(rows)
+        if hasattr(writer, "flush"):
+            writer.flush()
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return buff.getvalue(), best
+
+
+class Command(BaseCommand):
+    '''Implementation of a Django command.'''
+    help = 'Benchmarks the CSV writers used by the reports.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--rows',
+                    type='int',
+                    dest='rows',
+                    default=50000,
+                    help='How many rows to write.'),
+        make_option('--repeat',
+                    type='int',
+                    dest='repeat',
+                    default=3,
+                    help='How many times to write them, the best time '
+                         'is reported.'),
+        )
+
+    def handle(self, *args, **options):
+        '''Main entry point'''
+        rows = list(sample_rows(options['rows']))
+        results = [
+            (name, time_writer(writer_class, rows, options['repeat'], **kwds))
+            for name, writer_class, kwds in (
+                ("UnicodeWriter", UnicodeWriter, {}),
+                ("BatchUnicodeWriter", BatchUnicodeWriter, {}),
+            )
+        ]
+        outputs = set(output for _, (output, _) in results)
+        if len(outputs) != 1:
+            raise CommandError("The writers produced different output.")
+        baseline = results[0][1][1]
+        for name, (_, elapsed) in results:
+            self.stdout.write(
+                "%-20s %10.0f rows/sec %6.2fx\n" % (
+                    name, len(rows) / elapsed, baseline / elapsed
+                )
+            )
@@ -3,38 +3,33 @@ On the month end close we total up all overtime values and send out a report
 to managers of an account.
 '''
 
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from StringIO import StringIO
-
-import csv
-import codecs
 import datetime
 import calendar
 
 from django.core.management.base import BaseCommand, CommandError
 from django.core import mail
-from django.http import HttpResponse
 
 from timetracker.tracker.models import Tbluser, TrackingEntry
-from timetracker.utils.writers import UnicodeWriter
+from timetracker.utils.writers import stream_csv, csv_response
 from timetracker.utils.datemaps import round_down, WORKING_CHOICES
 
 
 connection = mail.get_connection()
 
 
-def report_for_account(account, now, send=True):
-    '''Sends all overtime reports to the managers of an account for a given
-    date.'''
+def report_rows(account, now):
+    '''Generates the rows of the overtime report of an account for the
+    month of a given date.
+
+    The entries of the whole month are fetched with one query rather
+    than one query per user per day.'''
     DAYS_SHORT = [element[0]
                   for element in WORKING_CHOICES
                   if element[0] != "SATUR"] + ["ROVER"]
-    buff = StringIO()
-    buff.write("\xef\xbb\xbf")
-    csvout = UnicodeWriter(buff, delimiter=';')
-    users = Tbluser.objects.filter(market=account, disabled=False).order_by("lastname")
+    users = list(Tbluser.objects.filter(market=account,
+                                        disabled=False).order_by("lastname"))
+    balances = Tbluser.objects.balances_for(users, now.year, by='year',
+                                            month=now.month)
 
     # generate the dates for this month
     c = calendar.Calendar()
@@ -43,41 +38,39 @@ def report_for_account(account, now, send=True):
     c.itermonthdates(now.year, now.month)
     )
 
-    csvout.writerow(
-        # write out the top heading
-        ["Date"] + [user.rev_name() for user in users]
-        )
-    csvout.writerow(
-        # write out the settlement period row.
-        ["Settlement Period"] + [user.job_code[-1]
-                                 if user.job_code else ""
-                                 for user in users]
-        )
-    csvout.writerow(
-        # write out the e-mail row.
-        ["EmployeeID"] + [user.user_id for user in users]
-        )
-    csvout.writerow(
-        # write out the total balances.
-        ["Balance"] + ['="'+str(user.get_total_balance(ret='flo',
-                                                       year=now.year,month=now.month))+'"'
-                       for user in users]
-        )
+    # write out the top heading
+    yield ["Date"] + [user.rev_name() for user in users]
+    # write out the settlement period row.
+    yield ["Settlement Period"] + [user.job_code[-1]
+                                   if user.job_code else ""
+                                   for user in users]
+    # write out the e-mail row.
+    yield ["EmployeeID"] + [user.user_id for user in users]
+    # write out the total balances.
+    yield ["Balance"] + ['="'+str(balances[user.id])+'"'
+                         for user in users]
+
+    entries = dict(
+        ((entry.user_id, entry.entry_date), entry)
+        for entry in TrackingEntry.objects.filter(
+            user__in=users,
+            entry_date__year=now.year,
+            entry_date__month=now.month
+        ).select_related("user").iterator()
+    )
     for date in dates:
         current_line = [str(date)]
         for user in users:
-            try:
-                entry = TrackingEntry.objects.get(
-                    user_id=user.id,
-                    entry_date=date
-                )
-            except TrackingEntry.DoesNotExist:
+            entry = entries.get((user.id, date))
+            if entry is None:
                 current_line.append("")
                 continue
             if entry.daytype not in DAYS_SHORT:
                 current_line.append("")
                 continue
-            if entry.is_linked():
+            # link_id rather than is_linked() so that the linked entry
+            # isn't fetched just to find out that it exists.
+            if entry.daytype == "LINKD" or entry.link_id is not None:
                 current_line.append("")
                 continue
             # if the entry is a return for overtime entry, we display
@@ -85,9 +78,12 @@ def report_for_account(account, now, send=True):
             # what the value should be.
             value = round_down(entry.time_difference() if entry.daytype != "ROVER" else -entry.total_working_time())
             current_line.append('="'+str(value)+'"' if value != 0 else "")
-        csvout.writerow(current_line)
+        yield current_line
 
-    csvfile = buff.getvalue()
+def report_for_account(account, now, send=True):
+    '''Sends all overtime reports to the managers of an account for a given
+    date.'''
+    rows = report_rows(account, now)
     if send:
         message = mail.EmailMessage(from_email="timetracker@unmonitored.com")
         message.body = \
@@ -101,7 +97,7 @@ def report_for_account(account, now, send=True):
 
         message.attach(
             "overtimereport.csv",
-            csvfile,
+            "".join(stream_csv(rows, delimiter=';')),
             "application/octet-stream"
         )
         message.to = ["aaron.france@hp.com"] + \
@@ -109,10 +105,8 @@ def report_for_account(account, now, send=True):
         message.subject = "End of month Overtime Totals."
         message.send()
     else:
-        response = HttpResponse(csvfile, mimetype="text/csv")
-        response['Content-Disposition'] = \
-            'attachment;filename=MEC_OT_Report_%s.csv' % now
-        return response
+        return csv_response(rows, 'MEC_OT_Report_%s.csv' % now,
+                            delimiter=';')
 
 def get_previous_month(d):
     '''From one date we return the first day of the previous month.
@@ -0,0 +1,48 @@
+'''Informs the managers of the agents who have newly gone over the sick
+leave threshold, see :mod:`timetracker.tracker.sickness`. This should be
+run nightly, with --rebuild once after the counters have been
+introduced.'''
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from timetracker.tracker.models import Tbluser, TrackingEntry, SickLeave
+
+
+class Command(BaseCommand):
+    '''Implementation of a Django command.'''
+    help = 'Informs the managers of the agents over the sick leave ' \
+           'threshold, in the markets given or in every market when none ' \
+           'are.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--rebuild',
+                    action='store_true',
+                    dest='rebuild',
+                    default=False,
+                    help='Rebuild the sick leave counters first.'),
+        )
+
+    def handle(self, *args, **options):
+        '''Main entry point'''
+        users = Tbluser.objects.filter(disabled=False)
+        if args:
+            users = users.filter(market__in=args)
+        if options['rebuild']:
+            self.rebuild()
+        for row in SickLeave.notify(users):
+            self.stdout.write("%s: %d sick days up to %s\n" % (
+                row.user.user_id, row.sick_days, row.last_sick_day
+            ))
+
+    def rebuild(self):
+        '''Refreshes the counter of everyone who has ever been sick, and
+        of everyone who has a counter.'''
+        user_ids = set(TrackingEntry.objects.filter(
+            daytype="SICKD"
+        ).values_list("user_id", flat=True).distinct())
+        user_ids.update(SickLeave.objects.values_list("user_id", flat=True))
+        for user_id in sorted(user_ids):
+            SickLeave.refresh(user_id)
+        self.stdout.write("Rebuilt %d sick leave counters\n" % len(user_ids))
@@ -0,0 +1,57 @@
+'''Rebuilds, or verifies, the monthly balance ledger from the tracking
+entries. The ledger of the existing entries is filled in by migration
+0008_fill_monthlybalance, this can be run at any time to check it has
+not drifted and to rebuild it when it has.'''
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from timetracker.tracker.models import Tbluser, MonthlyBalance
+
+
+class Command(BaseCommand):
+    '''Implementation of a Django command.'''
+    help = 'Rebuilds the monthly balance ledger for the user ids given, ' \
+           'or for everyone when none are.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--verify',
+                    action='store_true',
+                    dest='verify',
+                    default=False,
+                    help='Only report the months which are out of date.'),
+        )
+
+    def handle(self, *args, **options):
+        '''Main entry point'''
+        users = Tbluser.objects.all()
+        if args:
+            users = users.filter(user_id__in=args)
+        for user in users:
+            if options['verify']:
+                self.verify(user)
+            else:
+                months = MonthlyBalance.rebuild(user)
+                self.stdout.write("%s: %d months\n" % (user.user_id, months))
+
+    def verify(self, user):
+        '''Writes out each month for the user where the ledger does not
+        match the entries.'''
+        ledger = dict(
+            ((row.year, row.month), row)
+            for row in MonthlyBalance.objects.filter(user_id=user.id)
+            )
+        months = set(ledger.keys()) | set(
+            (date.year, date.month) for date in
+            user.user_tracking.dates("entry_date", "month")
+            )
+        for year, month in sorted(months):
+            expected = MonthlyBalance.calculate(user, year, month)
+            row = ledger.get((year, month))
+            actual = dict(
+                (key, getattr(row, key) if row else 0) for key in expected
+                )
+            if actual != expected:
+                self.stdout.write("%s: %d/%02d is out of date\n" %
+                                  (user.user_id, year, month))
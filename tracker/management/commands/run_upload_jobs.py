@@ -0,0 +1,53 @@
+'''Runs the report upload jobs which are waiting, see
+:mod:`timetracker.vcs.uploads`.
+
+Run it once from cron, or leave it running with --interval so that
+uploads are processed shortly after they are queued.'''
+
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from timetracker.vcs.uploads import run_upload_jobs
+
+
+class Command(BaseCommand):
+    '''Implementation of a Django command.'''
+    help = 'Runs the report upload jobs which are waiting.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--threads',
+                    type='int',
+                    dest='threads',
+                    default=4,
+                    help='How many jobs to run at once.'),
+        make_option('--limit',
+                    type='int',
+                    dest='limit',
+                    default=10,
+                    help='The most jobs to run in one pass.'),
+        make_option('--interval',
+                    type='int',
+                    dest='interval',
+                    default=0,
+                    help='Keep running, looking for jobs every so many '
+                         'seconds.'),
+        )
+
+    def handle(self, *args, **options):
+        '''Main entry point'''
+        while True:
+            jobs = run_upload_jobs(limit=options['limit'],
+                                   threads=options['threads'])
+            for job in jobs:
+                self.stdout.write("Job %d %s: %s\n" % (
+                    job.id, job.status, job.message
+                ))
+            if not options['interval']:
+                return
+            # a full pass means there may be more waiting already.
+            if len(jobs) < options['limit']:
+                connection.close()
+                time.sleep(options['interval'])
@@ -0,0 +1,59 @@
+'''Sends the e-mails waiting in the outbox, see
+:mod:`timetracker.tracker.outbox`.
+
+Run it once from cron, or leave it running with --interval so that
+notifications go out shortly after they are queued. Runs which overlap,
+on one host or several, each send different e-mails.'''
+
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from timetracker.tracker.outbox import send_outbox
+
+
+class Command(BaseCommand):
+    '''Implementation of a Django command.'''
+    help = 'Sends the e-mails waiting in the outbox.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--threads',
+                    type='int',
+                    dest='threads',
+                    default=4,
+                    help='How many connections to send over at once.'),
+        make_option('--batch',
+                    type='int',
+                    dest='batch',
+                    default=100,
+                    help='How many e-mails to send over one connection.'),
+        make_option('--limit',
+                    type='int',
+                    dest='limit',
+                    default=1000,
+                    help='The most e-mails to send in one pass.'),
+        make_option('--interval',
+                    type='int',
+                    dest='interval',
+                    default=0,
+                    help='Keep running, looking at the outbox every so '
+                         'many seconds.'),
+        )
+
+    def handle(self, *args, **options):
+        '''Main entry point'''
+        while True:
+            sent, failed = send_outbox(limit=options['limit'],
+                                       batch_size=options['batch'],
+                                       threads=options['threads'])
+            if sent or failed or not options['interval']:
+                self.stdout.write("Sent %d e-mails, %d failed.\n"
+                                  % (sent, failed))
+            if not options['interval']:
+                return
+            # a full pass means there may be more waiting already.
+            if sent + failed < options['limit']:
+                connection.close()
+                time.sleep(options['interval'])
@@ -1,11 +1,76 @@
-from django.core.management.base import BaseCommand, CommandError
+'''Sends every agent in the given markets the weekly reminder of their
+balance.
+
+The previous week of every agent is totalled with one grouped query, the
+template is loaded once and the reminders are sent in chunks over a
+single connection. The throughput is reported at the end of the run.'''
+
+import time
+from optparse import make_option
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+
 from timetracker.tracker.models import Tbluser
+from timetracker.tracker.balances import weekly_totals, previous_week
+
+
+def reminders(users, template):
+    '''Generates the reminder of each of the users.
+
+    :param users: A :class:`QuerySet` of :class:`Tbluser` instances.
+    :rtype: generator of :class:`EmailMessage`
+    '''
+    totals = weekly_totals(users, *previous_week())
+    for user in users:
+        yield user.weekly_reminder(totals.get(user.id, (0, 0)), template)
+
+def chunks(items, size):
+    '''Splits an iterable into lists of at most size items.'''
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 
 class Command(BaseCommand):
+    '''Implementation of a Django command.'''
     help = \
         'Sends a reminder of the current balance levels to all accounts ' \
         'in the argument list'
 
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk',
+                    type='int',
+                    dest='chunk',
+                    default=100,
+                    help='How many reminders to hand to the connection '
+                         'at once.'),
+        )
+
     def handle(self, *args, **options):
-        for user in Tbluser.objects.filter(market__in=args, disabled=False):
-            user.send_weekly_reminder()
+        '''Main entry point'''
+        started = time.time()
+        users = Tbluser.objects.filter(market__in=args, disabled=False)
+        template = get_template("emails/weekly_reminder.dhtml")
+        reminded = sent = 0
+        connection = get_connection()
+        connection.open()
+        try:
+            for chunk in chunks(reminders(users, template), options['chunk']):
+                reminded += len(chunk)
+                sent += connection.send_messages(chunk) or 0
+        finally:
+            connection.close()
+        elapsed = max(time.time() - started, 1e-6)
+        self.stdout.write(
+            "Reminded %d users, sent %d messages in %.2f seconds "
+            "(%.1f users/sec, %.1f messages/sec)\n" % (
+                reminded, sent, elapsed, reminded / elapsed, sent / elapsed
+            )
+        )
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'MonthlyBalance'
+        db.create_table(u'tracker_monthlybalance', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('user', self.gf('django.db.models.fields.related.ForeignKey')(related_name='monthly_balances', to=orm['tracker.Tbluser'])),
+            ('year', self.gf('django.db.models.fields.IntegerField')()),
+            ('month', self.gf('django.db.models.fields.IntegerField')()),
+            ('worked_minutes', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('rounded_minutes', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('working_days', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('return_days', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('linkd_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('wkday_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('pendi_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('holis_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('sickd_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('puabs_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('puwrk_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('retrn_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('speci_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('train_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('dayod_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('satur_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('wkhom_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('rover_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('other_count', self.gf('django.db.models.fields.IntegerField')(default=0)),
+        ))
+        db.send_create_signal(u'tracker', ['MonthlyBalance'])
+
+        # Adding unique constraint on 'MonthlyBalance', fields ['user', 'year', 'month']
+        db.create_unique(u'tracker_monthlybalance', ['user_id', 'year', 'month'])
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'MonthlyBalance', fields ['user', 'year', 'month']
+        db.delete_unique(u'tracker_monthlybalance', ['user_id', 'year', 'month'])
+
+        # Deleting model 'MonthlyBalance'
+        db.delete_table(u'tracker_monthlybalance')
+
+
+    models = {
+        u'tracker.monthlybalance': {
+            'Meta': {'ordering': "['user', 'year', 'month']", 'unique_together': "(('user', 'year', 'month'),)", 'object_name': 'MonthlyBalance'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'month': ('django.db.models.fields.IntegerField', [], {}),
+            'dayod_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'holis_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'linkd_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'other_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'pendi_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'puabs_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'puwrk_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'retrn_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'return_days': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'rounded_minutes': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'rover_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'satur_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'sickd_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'speci_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'train_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'wkday_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'wkhom_count': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'worked_minutes': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'working_days': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'monthly_balances'", 'to': u"orm['tracker.Tbluser']"}),
+            'year': ('django.db.models.fields.IntegerField', [], {})
+        },
+        u'tracker.relatedusers': {
+            'Meta': {'object_name': 'RelatedUsers', 'db_table': "u'tblrelatedusers'"},
+            'admin': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'related_foreign'", 'to': u"orm['tracker.Tbluser']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'users': ('django.db.models.fields.related.ManyToManyField', [], {'related_name': "'related_view'", 'symmetrical': 'False', 'to': u"orm['tracker.Tbluser']"})
+        },
+        u'tracker.tblauthorization': {
+            'Meta': {'object_name': 'Tblauthorization', 'db_table': "u'tblauthorization'"},
+            'admin': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'admin_foreign'", 'to': u"orm['tracker.Tbluser']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'users': ('django.db.models.fields.related.ManyToManyField', [], {'related_name': "'subordinates'", 'symmetrical': 'False', 'to': u"orm['tracker.Tbluser']"})
+        },
+        u'tracker.tbluser': {
+            'Meta': {'ordering': "['user_id']", 'object_name': 'Tbluser', 'db_table': "u'tbluser'"},
+            'breaklength': ('django.db.models.fields.TimeField', [], {'db_column': "'breakLength'"}),
+            'disabled': ('django.db.models.fields.BooleanField', [], {'default': 'False', 'db_column': "'disabled'"}),
+            'firstname': ('django.db.models.fields.CharField', [], {'max_length': '60', 'db_column': "'uFirstName'"}),
+            'holiday_balance': ('django.db.models.fields.IntegerField', [], {'db_column': "'Holiday_Balance'"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'job_code': ('django.db.models.fields.CharField', [], {'max_length': '6', 'db_column': "'Job_Code'"}),
+            'lastname': ('django.db.models.fields.CharField', [], {'max_length': '60', 'db_column': "'uLastName'"}),
+            'market': ('django.db.models.fields.CharField', [], {'max_length': '2', 'db_column': "'uMarket'"}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '60', 'db_column': "'uPassword'"}),
+            'process': ('django.db.models.fields.CharField', [], {'max_length': '2', 'db_column': "'uProcess'"}),
+            'shiftlength': ('django.db.models.fields.TimeField', [], {'db_column': "'shiftLength'"}),
+            'start_date': ('django.db.models.fields.DateField', [], {'db_column': "'Start_Date'"}),
+            'user_id': ('django.db.models.fields.EmailField', [], {'unique': 'True', 'max_length': '105'}),
+            'user_type': ('django.db.models.fields.CharField', [], {'max_length': '5'})
+        },
+        u'tracker.trackingentry': {
+            'Meta': {'ordering': "['user']", 'unique_together': "(('user', 'entry_date'),)", 'object_name': 'TrackingEntry'},
+            'breaks': ('django.db.models.fields.TimeField', [], {}),
+            'comments': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'daytype': ('django.db.models.fields.CharField', [], {'max_length': '5'}),
+            'end_time': ('django.db.models.fields.TimeField', [], {}),
+            'entry_date': ('django.db.models.fields.DateField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'link': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'linked_entry'", 'null': 'True', 'to': u"orm['tracker.TrackingEntry']"}),
+            'start_time': ('django.db.models.fields.TimeField', [], {}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'user_tracking'", 'to': u"orm['tracker.Tbluser']"})
+        }
+    }
+
+    complete_apps = ['tracker']
\ No newline at end of file
@@ -14,9 +14,12 @@ import datetime as dt
 from operator import add
 
 from django.db import models
+from django.db.models.signals import (post_save, post_delete, pre_delete,
+                                      m2m_changed)
+from django.dispatch import receiver
 from django.forms import ModelForm
 from django.conf import settings
-from django.core.mail import EmailMessage, send_mail
+from django.core.mail import EmailMessage
 from django.template import Context
 from django.template.loader import get_template
 from django.core.cache import cache
@@ -31,10 +34,22 @@ except AttributeError: # pragma: no cover
     NUM_WORKING_DAYS = 5
 
 from timetracker.tracker.trackingentry import TrackingEntry
+from timetracker.tracker.balances import (calculate_balance, balance_filters,
+                                          team_balances, weekly_totals,
+                                          previous_week)
+from timetracker.tracker.ledger import MonthlyBalance, count_field
+from timetracker.tracker.outbox import QueuedEmail, enqueue
+from timetracker.tracker.sickness import SickLeave
+from timetracker.tracker.hierarchy import (org_hierarchy, invalidate_hierarchy,
+                                           AMBIGUOUS)
+from timetracker.tracker.cachekeys import (make_key, user_year_key,
+                                           invalidate_user, invalidate_market)
+from timetracker.tracker.yeartable import (year_skeleton, year_vectors,
+                                           render_year)
 
 from timetracker.utils.datemaps import (
-    WORKING_CHOICES, DAYTYPE_CHOICES, MARKET_CHOICES, PROCESS_CHOICES,
-    float_to_time, datetime_to_timestring, MONTH_MAP,
+    DAYTYPE_CHOICES, MARKET_CHOICES, PROCESS_CHOICES,
+    float_to_time, datetime_to_timestring,
     generate_year_box, nearest_half, round_down
     )
 
@@ -75,6 +90,58 @@ except ImportError: # pragma: no cover
 from timetracker.loggers import debug_log
 
 
+# how each daytype changes the holiday balance, see
+# Tbluser.get_holiday_balance
+HOLIDAY_VALUE_MAP = {
+    'HOLIS': -1,
+    'PUWRK': 2,
+    'RETRN': -1,
+    'DAYOD': -1,
+    'SATUR': 1
+    }
+
+
+class TbluserManager(models.Manager):
+
+    '''Adds team wide queries to :class:`Tbluser`.'''
+
+    def balances_for(self, users, year, by="month", month=None):
+        '''Returns the balances for every user in users, see
+        :func:`timetracker.tracker.balances.team_balances`.
+
+        The number of queries does not grow with the size of the team.
+        '''
+        return team_balances(users, year, by=by, month=month)
+
+    def holiday_balances_for(self, users, year):
+        '''Returns the holiday balance and the number of days on demand
+        taken in a year for every user in users, see
+        :meth:`Tbluser.get_holiday_balance`.
+
+        This is a single query however many users there are.
+
+        :rtype: :class:`dict` of user ids to a (holiday balance, DOD)
+                :class:`tuple`
+        '''
+        users = list(users)
+        counts = MonthlyBalance.daytype_totals(
+            [user.id for user in users], int(year),
+            HOLIDAY_VALUE_MAP.keys()
+            )
+        empty = dict.fromkeys(HOLIDAY_VALUE_MAP, 0)
+        result = {}
+        for user in users:
+            days = counts.get(user.id, empty)
+            result[user.id] = (
+                user.holiday_balance + sum(
+                    value * days[daytype]
+                    for daytype, value in HOLIDAY_VALUE_MAP.items()
+                    ),
+                days["DAYOD"]
+                )
+        return result
+
+
 class Tbluser(models.Model):
 
     '''Models the user table and provides the admin interface with the
@@ -187,6 +254,8 @@ class Tbluser(models.Model):
     disabled = models.BooleanField(db_column='disabled',
                                    verbose_name=('Disabled'))
 
+    objects = TbluserManager()
+
     class Meta:
 
         '''
@@ -211,6 +280,25 @@ class Tbluser(models.Model):
                                 self.firstname,
                                 self.lastname)
 
+    def __init__(self, *args, **kwargs):
+        super(Tbluser, self).__init__(*args, **kwargs)
+        self._loaded_breaklength = self.breaklength
+        self._loaded_disabled = self.disabled
+
+    def save(self, *args, **kwargs):
+        super(Tbluser, self).save(*args, **kwargs)
+        # the normalized working time of entries, and so the rounded
+        # totals in the ledger, depend on the breaklength.
+        if self._loaded_breaklength != self.breaklength:
+            for entry in self.user_tracking.all():
+                entry.user = self
+                entry.update_minutes()
+                TrackingEntry.objects.filter(id=entry.id).update(
+                    normalized_worked_minutes=entry.normalized_worked_minutes
+                )
+            MonthlyBalance.rebuild(self)
+            self._loaded_breaklength = self.breaklength
+
     def validate_password(self, string):
         '''We return whether our password matches the one we're supplied.
 
@@ -246,11 +334,14 @@ class Tbluser(models.Model):
                 'password': password
                 })
 
-        send_mail('You recently requested a password reminder',
-                  email_message,
-                  'timetracker@unmonitored.com',
-                  [self.user_id], fail_silently=False
-        )
+        # sent straight away rather than queued, so that the password is
+        # never stored in the outbox.
+        EmailMessage(
+            subject='You recently requested a password reminder',
+            body=email_message,
+            from_email='timetracker@unmonitored.com',
+            to=[self.user_id]
+        ).send()
 
     def isdisabled(self):
         '''Returns whether this user is disabled or not'''
@@ -304,59 +395,83 @@ class Tbluser(models.Model):
                     admin = self.get_administrator()
                 else:
                     admin = self
-                # find the subordinates and the related users
-                if get_all:
-                    result = Tblauthorization.objects.get(
-                        admin=admin
-                        ).users.all()
-                else:
-                    result = Tblauthorization.objects.get(
-                        admin=admin
-                        ).users.filter(disabled=False)
-                try:
-                    extra = RelatedUsers.objects.get(
-                        admin=admin
-                        ).users.filter(disabled=False)
-                except RelatedUsers.DoesNotExist:
-                    extra = []
-
-                ids = [user.id for user in result] + [user.id for user in extra]
+                ids = admin.team_ids(get_all)
                 # find whether we need to append this user to it.
                 if self != admin or self.super_or_admin():
-                    ids.append(admin.id)
+                    ids = ids + [admin.id]
                 return Tbluser.objects.filter(id__in=ids).order_by("lastname")
         except Tblauthorization.DoesNotExist:
             return Tbluser.objects.none()
 
+    def team_ids(self, get_all=False):
+        '''Returns the ids of the users linked to this administrator,
+        both through their :class:`Tblauthorization` link and their
+        :class:`RelatedUsers`.
+
+        The ids are cached until the links, or whether one of the users
+        is disabled, change.
+
+        :param get_all: Include the disabled users in the team.
+        :raises: :class:`Tblauthorization.DoesNotExist` if the user is not
+                 an administrator of a team.
+        :rtype: :class:`list`
+        '''
+        cachestr = make_key("subordinates", self.id, get_all)
+        cached_result = cache.get(cachestr)
+        if cached_result is not None:
+            return cached_result
+        result = Tblauthorization.objects.get(admin=self).users.all()
+        if not get_all:
+            result = result.filter(disabled=False)
+        ids = list(result.values_list("id", flat=True))
+        try:
+            ids.extend(RelatedUsers.objects.get(
+                admin=self
+                ).users.filter(disabled=False).values_list("id", flat=True))
+        except RelatedUsers.DoesNotExist:
+            pass
+        cache.set(cachestr, ids)
+        return ids
+
     def get_administrator(self):
 
         '''Returns the :class:`Tbluser` who is this instances Authorization
         link
 
+        The link is resolved with the organisation hierarchy index, see
+        :mod:`timetracker.tracker.hierarchy`.
+
         :returns: A :class:`Tbluser` instance
         :rtype: :class:`Tbluser`
 
         '''
 
-        if self.super_or_admin():
+        admin_id = self.administrator_id()
+        if admin_id == self.id:
             return self
-
-        try:
-            auth_links = Tblauthorization.objects.all().filter(users=self)
-            if len(auth_links) == 1:
-                return auth_links[0].admin
-            if len(auth_links) == 2:
-                for link in auth_links:
-                    if link.admin.user_type == "SUPER":
-                        continue
-                    else:
-                        return link.admin
+        if admin_id == AMBIGUOUS:
             # if we're here we're in a bad state.
             # we use objects.get() due to it throwing
             # the correct Exception.
             Tblauthorization.objects.get(users=self)
-        except Tblauthorization.DoesNotExist:
-            return self
+        return Tbluser.objects.get(id=admin_id)
+
+    def administrator_id(self):
+        '''Returns the id of the user's administrator without loading
+        them, see :meth:`get_administrator`.'''
+        if self.super_or_admin():
+            return self.id
+        admin_id = org_hierarchy().administrator(self.id)
+        return self.id if admin_id is None else admin_id
+
+    def approver_id(self):
+        '''Returns the id of the administrator who the user's approvals
+        go to. Users whose links are ambiguous raise the same error as
+        :meth:`get_administrator`.'''
+        admin_id = self.administrator_id()
+        if admin_id == AMBIGUOUS:
+            return self.get_administrator().id
+        return admin_id
 
     def get_teammates(self):
         '''
@@ -444,26 +559,12 @@ class Tbluser(models.Model):
         well as giving an area to fill in additional html tags and css
         classes.  This is useful for generating a year view on the
         data in some way.
-        '''
 
-        final = []
-        out = []
-        for x in range(1, 13):
-            out.append("<tr id=\"%d_row\" onclick=%s><th>%s</th>"
-                       % (x, '"highlight_row(%d)"' % x, MONTH_MAP[x-1][1]))
-            for z in range(1, 32):
-                try:
-                    if dt.date(int(year), x, z).isoweekday() in [6, 7]:
-                        out.append('<td class="WKEND">%d</td>' % z)
-                    else:
-                        out.append('<td {function} class={c}>%d</td>' % z)
-                except ValueError:
-                    out.append('<td {function} class={c}>%d</td>' % z)
-
-            out.append("</tr>")
-            final.append(out)
-            out = []
-        return final
+        The layout is copied from the year's skeleton, see
+        :func:`timetracker.tracker.yeartable.year_skeleton`.
+        '''
+        return [[heading] + [cell[0] for cell in cells] + ["</tr>"]
+                for heading, cells in year_skeleton(year)]
 
     def yearview(self, year): # pragma: no cover
         '''Generates the HTML table for the yearview page. It iterates
@@ -473,19 +574,13 @@ class Tbluser(models.Model):
         :type year: :class:`int`
         :rtype :class:`str`
         '''
-        cachestr = "yearview:%s%s" % (self.id, year)
+        cachestr = user_year_key("yearview", self.id, year)
         cached_result = cache.get(cachestr)
         if cached_result:
             cache_log.debug("Returning cache for: %s" % cachestr)
             return cached_result
-        entries = TrackingEntry.objects.filter(user_id=self.id,
-                                               entry_date__year=year)
-        basehtml = self.year_as_whole(year)
-        for entry in entries:
-            basehtml[entry.entry_date.month-1][entry.entry_date.day] = \
-                basehtml[entry.entry_date.month-1][entry.entry_date.day].format(
-                c=entry.daytype, function="")
-        table_string = ''.join([''.join(subrow) for subrow in basehtml])
+        table_string = render_year(year,
+                                   year_vectors([self], year)[self.id])
         tmpl = get_template("fragments/yearview.html")
         ctx = Context({
             "yearbox": generate_year_box(int(year), id="cmb_yearbox"),
@@ -509,20 +604,15 @@ class Tbluser(models.Model):
         :rtype :class:`str`
 
         '''
-        cachestr = "overtime_view:%s%s" % (self.id, year)
+        cachestr = user_year_key("overtime_view", self.id, year)
         cached_result = cache.get(cachestr)
         if cached_result:
             cache_log.debug("Returning cache for: %s" % cachestr)
             return cached_result
-        entries = TrackingEntry.objects.filter(user_id=self.id,
-                                               entry_date__year=year)
-        basehtml = self.year_as_whole(year)
-        for entry in entries: # pragma: no cover
-            basehtml[entry.entry_date.month-1][entry.entry_date.day] = \
-                basehtml[entry.entry_date.month-1][entry.entry_date.day].format(
-                c=entry.overtime_class(),
-                function="entry_date='%s'" % entry.entry_date)
-        table_string = ''.join([''.join(subrow) for subrow in basehtml])
+        table_string = render_year(
+            year, year_vectors([self], year, overtime=True)[self.id],
+            overtime=True
+        )
         # TODO: Template this.
         table_string += '''
 <tr>
@@ -600,24 +690,16 @@ class Tbluser(models.Model):
         :rtype: :class:`Integer`
 
         '''
-        cachestr = "holidaybalance:%s%s" % (self.id, year)
+        cachestr = user_year_key("holidaybalance", self.id, year)
         cache_result = cache.get(cachestr)
         if cache_result: # pragma: no cover
             return int(cache_result)
         tracking_days = TrackingEntry.objects.filter(user_id=self.id,
                                                      entry_date__year=year)
 
-        holiday_value_map = {
-            'HOLIS': -1,
-            'PUWRK': 2,
-            'RETRN': -1,
-            'DAYOD': -1,
-            'SATUR': 1
-            }
-
         holiday_balance = self.holiday_balance
         for entry in tracking_days:
-            holiday_balance += holiday_value_map.get(entry.daytype, 0)
+            holiday_balance += HOLIDAY_VALUE_MAP.get(entry.daytype, 0)
         cache_log.debug(
             "Setting cache for %s: %s" % (
                 cachestr, cache.set(cachestr, str(holiday_balance))
@@ -630,9 +712,7 @@ class Tbluser(models.Model):
         Base method for retrieving the number of instances of a specific
         daytype in a given year.
         '''
-        cachestr = "numdaytype:%s%s%s" % (self.id,
-                                          year,
-                                          daytype)
+        cachestr = user_year_key("numdaytype", self.id, year, daytype)
         cached_result = cache.get(cachestr)
         if cached_result: # pragma: no cover
             return int(cached_result)
@@ -653,8 +733,14 @@ class Tbluser(models.Model):
         Get balances will return a dictionary of long daytype names
         against their balances.
         '''
+        counts = MonthlyBalance.objects.filter(
+            user_id=self.id, year=year
+            ).aggregate(**dict(
+                (daytype[0], models.Sum(count_field(daytype[0])))
+                for daytype in DAYTYPE_CHOICES
+            ))
         daytype_dict = {
-            daytype[1]: self.get_num_daytype_in_year(year, daytype[0]) \
+            daytype[1]: counts[daytype[0]] or 0 \
                 for daytype in DAYTYPE_CHOICES
             }
         daytype_dict.update({
@@ -707,11 +793,11 @@ class Tbluser(models.Model):
                           from_=None, to_=None): # pragma: no cover
         '''Calculates the total balance for the user.
 
-        This method iterates through every :class:`TrackingEntry`
-        attached to this user instance which is a working day,
-        multiplies the user's shiftlength by the number of days and
-        finds the difference between the projected working hours and
-        the actual working hours.
+        This method aggregates every :class:`TrackingEntry` attached
+        to this user instance which is a working day, multiplies the
+        user's shiftlength by the number of days and finds the
+        difference between the projected working hours and the actual
+        working hours. See :mod:`timetracker.tracker.balances`.
 
         The return type of this function is different depending on the
         argument supplied.
@@ -733,51 +819,10 @@ class Tbluser(models.Model):
         if ret not in ['html', 'int', 'num', 'flo']:
             raise Exception("Unsupported Argument. Must be html, int or dbg")
 
-        day_types = [element[0]
-                     for element in WORKING_CHOICES
-                     if element[0] not in ["SATUR","LINKD"]]
-
-        if not year and not month:
-            tracking_days = TrackingEntry.objects.filter(user_id=self.id,
-                                                         daytype__in=day_types)
-            return_days = TrackingEntry.objects.filter(user_id=self.id,
-                                                       daytype="ROVER")
-        elif year and not month:
-            tracking_days = TrackingEntry.objects.filter(user_id=self.id,
-                                                         daytype__in=day_types,
-                                                         entry_date__year=year)
-            return_days = TrackingEntry.objects.filter(user_id=self.id,
-                                                       daytype="ROVER",
-                                                       entry_date__year=year
-                                                       )
-        else:
-            tracking_days = TrackingEntry.objects.filter(
-                user_id=self.id,
-                daytype__in=day_types,
-                entry_date__year=year,
-                entry_date__month=month
-                )
-            return_days = TrackingEntry.objects.filter(user_id=self.id,
-                                                       daytype="ROVER",
-                                                       entry_date__year=year,
-                                                       entry_date__month=month)
-        if from_ and to_:
-            tracking_days = TrackingEntry.objects.filter(user_id=self.id,
-                                                         daytype__in=day_types,
-                                                         entry_date__range=[from_,to_])
-            return_days = TrackingEntry.objects.filter(user_id=self.id,
-                                                       daytype="ROVER",
-                                                       entry_date__range=[from_,to_]
-                                                       )
-
-        if settings.OVERRIDE_CALCULATION.get(self.market):
-            trackingnumber = \
-                settings.OVERRIDE_CALCULATION[self.market](self,
-                                                           tracking_days,
-                                                           return_days)
-        else:
-            trackingnumber = \
-                self._regular_calculation(tracking_days, return_days)
+        trackingnumber = calculate_balance(
+            self, **balance_filters(year=year, month=month,
+                                    from_=from_, to_=to_)
+            )
 
         if ret == 'html':
             tracker_class_map = {
@@ -813,6 +858,10 @@ class Tbluser(models.Model):
         It does not do any rounding and thus will be the exact figures that
         agent's enter.
 
+        Balances are calculated with
+        :func:`timetracker.tracker.balances.regular_balance`, this
+        per-entry version is kept as the reference implementation.
+
         '''
 
         # we'll use augmented assignment
@@ -874,13 +923,18 @@ class Tbluser(models.Model):
         if self.get_total_balance(ret='num') > 0:
             return send_pending_overtime_notification(self, send)
 
-    def send_weekly_reminder(self):
+    def weekly_reminder(self, totals=None, template=None):
         '''
-        Sends the weekly reminder for an agent about their holiday balances
+        Builds the weekly reminder for an agent about their holiday balances
+
+        :param totals: See :meth:`previous_week_balance`.
+        :param template: The reminder's template, when it has already been
+                         loaded to remind many agents.
+        :rtype: :class:`EmailMessage`
         '''
-        templ = get_template("emails/weekly_reminder.dhtml")
+        templ = template or get_template("emails/weekly_reminder.dhtml")
 
-        prev = self.previous_week_balance()
+        prev = self.previous_week_balance(totals)
         expect = self.expected_weekly_balance()
         ctx = Context({
             "previous_week_balance": prev,
@@ -891,17 +945,27 @@ class Tbluser(models.Model):
         email.body = templ.render(ctx)
         email.to = [self.user_id]
         email.subject = "Weekly timetracking reminder"
-        email.send()
-
-    def previous_week_balance(self):
-        '''Gets the user's previous weekly balance'''
-        entries =  TrackingEntry.objects.filter(entry_date__range=(
-                dt.datetime.now()+dt.timedelta(days=-7), dt.datetime.now()
-                ), user_id=self.id, daytype__in=["SATUR", "WKDAY"])
-        total = self.shiftlength_as_float() * (NUM_WORKING_DAYS - len(entries))
-        for entry in entries:
-            total += entry.totalhours()
-        return total
+        return email
+
+    def send_weekly_reminder(self):
+        '''
+        Sends the weekly reminder for an agent about their holiday balances
+        '''
+        self.weekly_reminder().send()
+
+    def previous_week_balance(self, totals=None):
+        '''Gets the user's previous weekly balance
+
+        :param totals: The (hours, days) of the user from
+                       :func:`weekly_totals`, when they have already been
+                       loaded along with other users'.
+        '''
+        if totals is None:
+            totals = weekly_totals([self.id], *previous_week()).get(
+                self.id, (0, 0)
+            )
+        hours, days = totals
+        return self.shiftlength_as_float() * (NUM_WORKING_DAYS - days) + hours
 
     def expected_weekly_balance(self):
         '''Returns the users normal working balance.'''
@@ -914,7 +978,10 @@ class Tbluser(models.Model):
             return overridden
         # list because the SMTP module takes lists of emails when
         # sending e-mails.
-        return [self.get_administrator().user_id]
+        admin_id = self.administrator_id()
+        if admin_id in [self.id, AMBIGUOUS]:
+            return [self.get_administrator().user_id]
+        return [org_hierarchy().admin_email(admin_id)]
 
     def get_tl_email(self):
         '''Returns a list of Team Leader's e-mails for this particular user.'''
@@ -928,25 +995,10 @@ class Tbluser(models.Model):
         overridden = settings.MANAGER_NAMES_OVERRIDE.get(self.market)
         if overridden: # pragma: no cover
             return ',\n'.join(overridden)
-        return self.get_administrator().name()
-
-    def shouldnotifysick(self, entry):
-        '''shouldnotifysick determintes whether the entry and the 30 days
-        previous to it require us to send out a notification to the
-        manager extolling that the user has gone over the allowed
-        amount of sickdays and thus may require to be taken off the
-        Action Reports.
-
-        :param entry: The entry to do the search from.
-        :return: Boolean.
-        '''
-        thirtydaysago = entry.entry_date + dt.timedelta(days=-30)
-        previous30days = TrackingEntry.objects.filter(
-            user_id=self.id,
-            daytype="SICKD",
-            entry_date__range=[thirtydaysago, entry.entry_date]
-        )
-        return len(previous30days) >= 30
+        admin_id = self.administrator_id()
+        if admin_id in [self.id, AMBIGUOUS]:
+            return self.get_administrator().name()
+        return org_hierarchy().admin_name(admin_id)
 
     def sendsicknotification(self):
         '''sendsicknotification actually performs the sick notification to the
@@ -963,7 +1015,7 @@ class Tbluser(models.Model):
         message_manager.to = self.get_manager_email()
         message_manager.subject = "Sick leave >= 30 days: %s" % \
                                   self.name()
-        message_manager.send()
+        enqueue(message_manager)
 
     def approval_notifications(self):
         '''approval_notifications will generate the required HTML for
@@ -972,26 +1024,32 @@ class Tbluser(models.Model):
         pending or a span with the relevant information inside it if
         there are any.
 
+        The fragment is cached for each approver and the count it shows
+        is kept in their :class:`ApprovalQueue`, so this is at most one
+        query.
+
         :return: :class:`str`
         '''
         if self.is_user():
             return ""
-        return "<span class=\"notifications\">%d</span>" % len(
-            self.get_approvals()
-        )
+        # to avoid circular import dependencies
+        from timetracker.overtime.models import approval_badge
+        return approval_badge(self.approver_id())
 
     def get_approvals(self):
         '''Returns the approvals associated with this team's user.'''
         # to avoid circular import dependencies
         from timetracker.overtime.models  import PendingApproval
         return PendingApproval.objects.filter(
-            closed=False, approver=self.get_administrator()
+            closed=False, approver_id=self.approver_id()
         )
 
     def has_pending_approvals(self):
         '''Returns whether this user has any pending approvals in their
         queue.'''
-        return bool(len(self.get_approvals()))
+        # to avoid circular import dependencies
+        from timetracker.overtime.models import ApprovalQueue
+        return ApprovalQueue.pending_for(self.approver_id()) > 0
 
     def can_close_approvals(self):
         '''Returns whether this user can fully close pending approvals.'''
@@ -1227,3 +1285,75 @@ class Tblauthorization(models.Model):
 
     display_users.allow_tags = True
     display_users.short_discription = "Subordinate Users"
+
+
+def invalidate_teams(admin_ids):
+    '''Removes the cached teams of the administrators, see
+    :meth:`Tbluser.team_ids`, along with the organisation hierarchy
+    which is built from the same links.'''
+    invalidate_hierarchy()
+    for admin_id in set(admin_ids):
+        for get_all in (True, False):
+            cache.delete(make_key("subordinates", admin_id, get_all))
+            cache.delete(make_key("employee_box", admin_id, get_all))
+
+def linked_admins(user):
+    '''Returns the ids of the administrators whose team the user is in.'''
+    return list(Tblauthorization.objects.filter(
+        users=user).values_list("admin_id", flat=True)) + \
+        list(RelatedUsers.objects.filter(
+            users=user).values_list("admin_id", flat=True))
+
+@receiver(m2m_changed, sender=Tblauthorization.users.through)
+@receiver(m2m_changed, sender=RelatedUsers.users.through)
+def team_changed(sender, instance, action, reverse, model, pk_set,
+                 **kwargs):
+    '''Invalidates the cached teams when users are added to or removed
+    from a team, from either side of the relationship.'''
+    if not reverse:
+        invalidate_teams([instance.admin_id])
+        return
+    # the user has been linked to, or unlinked from, the teams in
+    # pk_set. A clear has no pk_set so we look before it happens.
+    links = Tblauthorization if model is Tblauthorization else RelatedUsers
+    admins = list(links.objects.filter(
+        id__in=pk_set or []).values_list("admin_id", flat=True))
+    if action == "pre_clear":
+        admins += list(links.objects.filter(
+            users=instance).values_list("admin_id", flat=True))
+    invalidate_teams(admins)
+
+@receiver(post_save, sender=Tblauthorization)
+@receiver(post_delete, sender=Tblauthorization)
+@receiver(post_save, sender=RelatedUsers)
+@receiver(post_delete, sender=RelatedUsers)
+def link_changed(sender, instance, **kwargs):
+    '''Invalidates the cached team when a link is created or removed.'''
+    invalidate_teams([instance.admin_id])
+
+@receiver(post_save, sender=Tbluser)
+@receiver(post_delete, sender=Tbluser)
+def user_changed(sender, instance, **kwargs):
+    '''The hierarchy holds the names, e-mails and user types of the
+    users so it is rebuilt when any of them change, as is everything
+    cached from the user's years, which shows their name, holiday
+    allowance and job code. The utilization of their market counts
+    their shift length.'''
+    invalidate_hierarchy()
+    invalidate_user(instance.id)
+    invalidate_market(instance.market)
+
+@receiver(post_save, sender=Tbluser)
+def user_disabled(sender, instance, created, **kwargs):
+    '''Invalidates the cached teams a user is in when they are disabled
+    or enabled.'''
+    if created or instance._loaded_disabled == instance.disabled:
+        return
+    instance._loaded_disabled = instance.disabled
+    invalidate_teams(linked_admins(instance))
+
+@receiver(pre_delete, sender=Tbluser)
+def user_deleted(sender, instance, **kwargs):
+    '''Invalidates the cached teams a user was in before their links
+    are removed along with them.'''
+    invalidate_teams(linked_admins(instance))
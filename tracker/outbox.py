@@ -0,0 +1,225 @@
+'''The e-mail outbox.
+
+The notifications which are sent while a request is being handled, the
+approval requests, the denials, the holiday approvals and the sickness
+notifications, used to be sent there and then, keeping the request
+waiting on the SMTP server. They are now queued in the outbox instead
+and sent by the send_outbox management command, which runs alongside
+the web server. Password reminders are still sent there and then, so
+that a password is never stored in the outbox.
+
+A message which can't be sent is tried again later, waiting twice as
+long after each failed attempt, until it has been tried
+:data:`MAX_ATTEMPTS` times. It is then kept in the outbox, with the
+error it failed with, for someone to look at. Sent messages are removed
+from the outbox.
+
+Each run claims the messages it sends before sending them, so two runs
+which overlap never send the same message twice. A claimed message is
+held for :data:`CLAIM_LEASE`, after which it is due again in case the
+run which claimed it died.
+'''
+
+import datetime
+from multiprocessing.pool import ThreadPool
+
+from django.db import models
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from timetracker.loggers import email_log
+
+# the number of times a message is tried before it is given up on.
+MAX_ATTEMPTS = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 6)
+# the wait after the first failed attempt, which doubles after each one.
+RETRY_DELAY = datetime.timedelta(
+    seconds=getattr(settings, "OUTBOX_RETRY_DELAY", 60)
+)
+# the longest a message waits between attempts.
+MAX_RETRY_DELAY = datetime.timedelta(hours=6)
+# how long a run has to send the messages it claimed.
+CLAIM_LEASE = datetime.timedelta(
+    seconds=getattr(settings, "OUTBOX_CLAIM_LEASE", 15 * 60)
+)
+
+ADDRESS_SEPARATOR = "\n"
+
+
+def split_addresses(addresses):
+    '''The list of addresses stored in one field.'''
+    return [address for address in addresses.split(ADDRESS_SEPARATOR)
+            if address]
+
+def retry_delay(attempts):
+    '''How long a message waits after its attempts'th failed attempt.
+
+    :rtype: :class:`datetime.timedelta`
+    '''
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+class QueuedEmail(models.Model):
+
+    '''An e-mail waiting in the outbox to be sent.'''
+
+    created_on = models.DateTimeField(auto_now_add=True)
+    from_email = models.CharField(max_length=254)
+    to = models.TextField()
+    cc = models.TextField(blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+
+    attempts = models.IntegerField(default=0)
+    # when the message is next due to be sent, null once it has been
+    # given up on.
+    send_after = models.DateTimeField(null=True, db_index=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        '''
+        Metaclass gives access to additional options
+        '''
+        verbose_name = 'Queued E-mail'
+        verbose_name_plural = 'Queued E-mails'
+        ordering = ['send_after', 'id']
+
+    def __unicode__(self): # pragma: no cover
+        return u'%s - %s' % (self.subject, self.to)
+
+    @staticmethod
+    def from_message(message):
+        '''Builds the queued e-mail of an :class:`EmailMessage`.'''
+        return QueuedEmail(
+            from_email=message.from_email,
+            to=ADDRESS_SEPARATOR.join(message.to),
+            cc=ADDRESS_SEPARATOR.join(message.cc),
+            subject=message.subject,
+            body=message.body,
+            send_after=timezone.now()
+        )
+
+    def message(self):
+        '''The :class:`EmailMessage` to send.'''
+        return EmailMessage(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email,
+            to=split_addresses(self.to),
+            cc=split_addresses(self.cc)
+        )
+
+
+def enqueue(*messages):
+    '''Queues :class:`EmailMessage` instances to be sent by the
+    send_outbox command.
+
+    Messages without any recipient are dropped, as sending them would.
+
+    :return: The number of messages queued.
+    '''
+    queued = [QueuedEmail.from_message(message) for message in messages
+              if message.recipients()]
+    QueuedEmail.objects.bulk_create(queued)
+    return len(queued)
+
+def claim_emails(limit, now):
+    '''Claims up to limit due e-mails for this run.
+
+    Each e-mail is moved to the end of its lease with an update which
+    only matches while it is still due, an e-mail which another run
+    claims in the meantime is skipped.
+
+    :rtype: :class:`list` of :class:`QueuedEmail`
+    '''
+    claimed = []
+    for email in QueuedEmail.objects.filter(send_after__lte=now)[:limit]:
+        if QueuedEmail.objects.filter(
+                id=email.id, send_after=email.send_after
+        ).update(send_after=now + CLAIM_LEASE):
+            claimed.append(email)
+    return claimed
+
+def deliver(batch):
+    '''Sends a batch of queued e-mails over one connection.
+
+    The connection is opened once for the whole batch, each message is
+    then handed to it on its own so that a message which is refused only
+    fails itself.
+
+    :param batch: A list of (id, :class:`EmailMessage`) pairs.
+    :return: The ids which were sent and a :class:`dict` of the ids
+             which failed to their error.
+    '''
+    sent, failed = [], {}
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        return sent, dict((email_id, repr(error)) for email_id, _ in batch)
+    try:
+        for email_id, message in batch:
+            try:
+                connection.send_messages([message])
+            except Exception as error:
+                failed[email_id] = repr(error)
+            else:
+                sent.append(email_id)
+    finally:
+        try:
+            connection.close()
+        except Exception: # pragma: no cover
+            pass
+    return sent, failed
+
+def send_outbox(limit=1000, batch_size=100, threads=4, now=None):
+    '''Sends the e-mails in the outbox which are due.
+
+    The due e-mails are claimed, see :func:`claim_emails`, and split
+    into batches which a pool of threads sends, each over its own
+    connection. Only the calling thread touches the database.
+
+    :param limit: The most e-mails to send in one call.
+    :return: The number of e-mails sent and the number which failed.
+    '''
+    now = now or timezone.now()
+    due = claim_emails(limit, now)
+    if not due:
+        return 0, 0
+    queued = dict((email.id, email) for email in due)
+    batches = [
+        [(email.id, email.message())
+         for email in due[start:start + batch_size]]
+        for start in range(0, len(due), batch_size)
+    ]
+    if threads > 1 and len(batches) > 1:
+        pool = ThreadPool(min(threads, len(batches)))
+        try:
+            results = pool.map(deliver, batches)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map(deliver, batches)
+
+    sent, failed = [], {}
+    for batch_sent, batch_failed in results:
+        sent.extend(batch_sent)
+        failed.update(batch_failed)
+
+    # kept below the number of parameters a database allows.
+    for start in range(0, len(sent), 500):
+        QueuedEmail.objects.filter(id__in=sent[start:start + 500]).delete()
+    for email_id, error in failed.items():
+        email = queued[email_id]
+        email.attempts += 1
+        email.last_error = error
+        if email.attempts >= MAX_ATTEMPTS:
+            email_log.error("Giving up on e-mail %d to %s: %s" % (
+                email.id, email.to, error
+            ))
+            email.send_after = None
+        else:
+            email.send_after = now + retry_delay(email.attempts)
+        email.save()
+    return len(sent), len(failed)
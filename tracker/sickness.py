@@ -0,0 +1,131 @@
+'''The sick leave monitor.
+
+An agent's manager is told when the agent has been off sick for
+:data:`SICK_THRESHOLD` days out of the :data:`SICK_WINDOW` up to a sick
+day. As before, that window is counted back from each sick day as it is
+tracked, so a run of sick days which is entered after later ones still
+reaches the threshold. Each agent has a counter holding the fullest of
+those windows and their latest one, see :meth:`SickLeave.refresh`. The
+counter is refreshed whenever one of their sick days is saved or
+deleted, in the same way as the monthly balance ledger, so finding
+everyone over the threshold is a single query over the counters.
+
+The notify_sick_leave management command runs that query nightly and
+informs the managers of the agents who are newly over the threshold.
+'''
+
+import datetime
+
+from django.db import models
+from django.db.models import Max
+
+from timetracker.tracker.trackingentry import TrackingEntry
+
+# the number of days before a sick day which are counted.
+SICK_WINDOW = datetime.timedelta(days=30)
+# the number of sick days in the window which the managers are told of.
+SICK_THRESHOLD = 30
+
+
+class SickLeave(models.Model):
+
+    '''Holds the sick day counter of a single user.
+
+    The rows are maintained by :meth:`TrackingEntry.save` and
+    :meth:`TrackingEntry.delete`, they can be rebuilt with the
+    notify_sick_leave management command.
+    '''
+
+    user = models.OneToOneField("Tbluser", related_name="sick_leave")
+    # the sick day which the counted window ends on.
+    last_sick_day = models.DateField(null=True)
+    # the sick days from SICK_WINDOW before last_sick_day up to it.
+    sick_days = models.IntegerField(default=0, db_index=True)
+    # the last day of the window the manager was last told of, so that
+    # they are only told once for each time the agent goes over the
+    # threshold.
+    notified_for = models.DateField(null=True, blank=True)
+
+    class Meta:
+        '''
+        Metaclass gives access to additional options
+        '''
+        verbose_name = 'Sick Leave'
+        verbose_name_plural = 'Sick Leave'
+
+    def __unicode__(self): # pragma: no cover
+        return u'%s - %d' % (self.user, self.sick_days)
+
+    @staticmethod
+    def refresh(user_id, dates=()):
+        '''Brings the counter of a user up to date with their entries.
+
+        The windows ending at the user's latest sick day and at each of
+        the dates which are still sick days are counted, and the fullest
+        of them is kept, the latest one when they are as full. A window
+        which is over the threshold but hasn't been notified yet is
+        counted again, so that it isn't lost before the managers are
+        told. Users who have never been sick do not keep a row.
+
+        :param dates: The days whose entries have changed.
+        '''
+        to_date = TrackingEntry._meta.get_field("entry_date").to_python
+        sick = TrackingEntry.objects.filter(user_id=user_id, daytype="SICKD")
+        last = sick.aggregate(last=Max("entry_date"))["last"]
+        if last is None:
+            SickLeave.objects.filter(user_id=user_id).delete()
+            return None
+        row, _ = SickLeave.objects.get_or_create(user_id=user_id)
+        ends = set(date for date in map(to_date, dates) if date)
+        ends.add(last)
+        if row.sick_days >= SICK_THRESHOLD and not row.is_notified():
+            ends.add(row.last_sick_day)
+        sick_days = set(sick.filter(
+            entry_date__range=[min(ends) - SICK_WINDOW, max(ends)]
+        ).values_list("entry_date", flat=True))
+        row.sick_days, row.last_sick_day = max(
+            (len([day for day in sick_days
+                  if end - SICK_WINDOW <= day <= end]), end)
+            for end in ends if end in sick_days
+        )
+        row.save()
+        return row
+
+    @staticmethod
+    def over_threshold(users=None):
+        '''Everyone over the threshold, in one query.
+
+        :param users: Only look at these users, a list of user ids or a
+                      :class:`QuerySet` of users, such as a team.
+        :rtype: :class:`QuerySet` of :class:`SickLeave`
+        '''
+        rows = SickLeave.objects.filter(sick_days__gte=SICK_THRESHOLD)
+        if users is not None:
+            rows = rows.filter(user__in=users)
+        return rows.select_related("user")
+
+    def is_notified(self):
+        '''Whether the manager has been told of this time over the
+        threshold already.'''
+        return self.notified_for is not None and \
+            abs(self.last_sick_day - self.notified_for) <= SICK_WINDOW
+
+    @staticmethod
+    def notify(users=None):
+        '''Tells the managers of everyone newly over the threshold.
+
+        :param users: See :meth:`over_threshold`.
+        :return: The :class:`SickLeave` rows which were notified.
+        '''
+        notified = []
+        for row in SickLeave.over_threshold(users):
+            if row.is_notified():
+                continue
+            row.user.sendsicknotification()
+            row.notified_for = row.last_sick_day
+            notified.append(row)
+        if notified:
+            SickLeave.objects.filter(
+                id__in=[row.id for row in notified]
+            ).update(notified_for=models.F("last_sick_day"))
+        return notified
@@ -0,0 +1,84 @@
+'''Balance calculation strategies.
+
+A strategy describes how a market turns the totals held in the monthly
+ledger, see :mod:`timetracker.tracker.ledger`, into a balance. Every
+balance rule is written once, against those totals, so a user's balance
+and the balances of a whole team are answered from the same grouped
+ledger rows.
+
+Markets choose their strategy in settings.OVERRIDE_CALCULATION, either
+by the name it was registered with or, as before, with the per entry
+function the strategy replaces::
+
+    OVERRIDE_CALCULATION = {
+        "BF": "hr",
+    }
+
+A per entry function which has not been registered is still handed the
+querysets of the user's entries, a user at a time.
+'''
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from timetracker.tracker.balances import regular_balance, hr_balance
+from timetracker.utils.datemaps import hr_calculation
+
+
+STRATEGIES = {}
+
+
+class Strategy(object):
+
+    '''A registered calculation strategy.
+
+    :param name: The name a market can use to select the strategy.
+    :param totals: Function taking the user and the totals of a period,
+                   see :func:`timetracker.tracker.balances.shape_totals`,
+                   and returning the balance in hours.
+    :param calculation: Optional per entry function taking the user,
+                        their tracking days and return days, as found
+                        in settings.OVERRIDE_CALCULATION.
+    '''
+
+    def __init__(self, name, totals, calculation=None):
+        self.name = name
+        self.totals = totals
+        self.calculation = calculation
+
+    def __repr__(self): # pragma: no cover
+        return "<Strategy: %s>" % self.name
+
+
+def register(name, totals, calculation=None):
+    '''Registers a totals function as a strategy.
+
+    :rtype: :class:`Strategy`
+    '''
+    STRATEGIES[name] = Strategy(name, totals, calculation)
+    return STRATEGIES[name]
+
+def strategy_for(market):
+    '''Finds the strategy which has been set for a market.
+
+    :return: :class:`Strategy` or None when the market overrides the
+             calculation with a function which has not been registered.
+    '''
+    override = settings.OVERRIDE_CALCULATION.get(market)
+    if not override:
+        return STRATEGIES["regular"]
+    if isinstance(override, basestring):
+        try:
+            return STRATEGIES[override]
+        except KeyError:
+            raise ImproperlyConfigured(
+                "No balance strategy named %s is registered." % override
+            )
+    for strategy in STRATEGIES.values():
+        if strategy.calculation is override:
+            return strategy
+    return None
+
+
+register("regular", regular_balance)
+register("hr", hr_balance, calculation=hr_calculation)
@@ -12,21 +12,43 @@ import simplejson
 import random
 import functools
 import time
+from StringIO import StringIO
 from unittest import skipUnless
 
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
 from django.test import TestCase, LiveServerTestCase
 from django.test.client import Client
 from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.cache import cache
+from django.core.management import call_command
 from django.http import HttpResponse, Http404
 from django.conf import settings
 from django.test.utils import override_settings
+from django.core.exceptions import (ImproperlyConfigured, ValidationError,
+                                    MultipleObjectsReturned)
 from django.core.urlresolvers import reverse
+from django.utils import timezone
 
 from timetracker.views import user_view, forgot_pass, view_with_holiday_list
 from timetracker.tracker.models import (Tbluser,
                                         TrackingEntry,
-                                        Tblauthorization)
+                                        Tblauthorization,
+                                        RelatedUsers)
+
+from timetracker.tracker.hierarchy import org_hierarchy
+from timetracker.tracker.yeartable import (year_skeleton, year_vectors,
+                                           render_year, team_rows,
+                                           team_table_heading, TEAM_DAYTYPES)
+from timetracker.tracker.cachekeys import (make_key, user_year_key,
+                                           user_year_keys,
+                                           invalidate_user_year,
+                                           invalidate_user)
+from timetracker.tracker.sickness import SickLeave, SICK_THRESHOLD
+from timetracker.tracker.outbox import (QueuedEmail, enqueue, send_outbox,
+                                        retry_delay, claim_emails,
+                                        MAX_ATTEMPTS, CLAIM_LEASE)
+from timetracker.tracker.strategies import STRATEGIES, register, strategy_for
 
 from timetracker.middleware.exception_handler import UnreadablePostErrorMiddleware
 from django.http import UnreadablePostError
@@ -36,15 +58,23 @@ from timetracker.utils.calendar_utils import (validate_time, parse_time,
                                               mass_holidays, ajax_delete_entry,
                                               gen_calendar, ajax_change_entry,
                                               ajax_error, ajax_add_entry,
-                                              ajax_add_holiday)
+                                              ajax_add_holiday,
+                                              ajax_add_entries,
+                                              gen_holiday_list,
+                                              apply_holiday_grid)
 
 from timetracker.utils.datemaps import (pad, float_to_time,
                                         generate_select, ABSENT_CHOICES,
-                                        MARKET_CHOICES)
+                                        MARKET_CHOICES, MONTH_MAP,
+                                        round_down)
 from timetracker.utils.error_codes import DUPLICATE_ENTRY
+from timetracker.utils.smtpsink import SMTPSink
+from timetracker.utils.writers import (BOM, stream_csv, csv_response,
+                                      UnicodeWriter, BatchUnicodeWriter)
 from timetracker.tests.basetests import create_users, delete_users
 from timetracker.tests.basetests import login as login_user
 from timetracker.overtime.models import PendingApproval
+from timetracker.tracker.management.commands import mec_ot_report
 
 try:
     from selenium.webdriver.firefox.webdriver import WebDriver
@@ -356,6 +386,31 @@ class TrackingEntryTestCase(BaseUserTest):
             entry.save()
         self.assertAlmostEqual(self.linked_user.previous_week_balance(), 2.2333333333333334)
 
+    def test_minute_columns(self):
+        entry = TrackingEntry(
+            entry_date="2012-02-01",
+            user_id=self.linked_user.id,
+            start_time="09:00",
+            end_time="17:45",
+            breaks="00:45",
+            daytype="WKDAY"
+            )
+        entry.save()
+        entry = TrackingEntry.objects.get(id=entry.id)
+        self.assertEqual(entry.worked_minutes, 8 * 60)
+        self.assertEqual(entry.break_minutes, 45)
+        self.assertEqual(entry.normalized_worked_minutes, 9 * 60)
+        self.assertEqual(entry.total_working_time(), 9.0)
+        self.assertEqual(entry.totalhours(), 9.5)
+        self.assertEqual(entry.breaktime(), 0.75)
+        self.assertEqual(str(entry.worklength), "18:00:00")
+        self.assertEqual(TrackingEntry.objects.filter(
+            user_id=self.linked_user.id,
+            normalized_worked_minutes__gte=9 * 60).count(), 1)
+        # changing the times is seen before the entry is saved
+        entry.end_time = datetime.time(18, 45)
+        self.assertEqual(entry.total_working_time(), 10.0)
+
     def testIsNotOvertime(self):
         '''Tests an entry against several rules to make sure our
         check for whether an entry is or is not overtime is correctly
@@ -653,6 +708,852 @@ class TrackingEntryTestCase(BaseUserTest):
                     "error":"Start time after end time"
                     }), response.content)
 
+class BalanceEngineTestCase(BaseUserTest):
+    '''Checks that the aggregated balance engine gives the same figures
+    as walking the entries one by one.'''
+
+    def setUp(self):
+        rand = random.Random(1337)
+        day = datetime.date(2012, 11, 1)
+        self.entries = []
+        while day < datetime.date(2013, 3, 1):
+            day += datetime.timedelta(days=1)
+            daytype = rand.choice(
+                ["WKDAY", "WKDAY", "WKDAY", "WKHOM", "ROVER", "HOLIS"]
+            )
+            entry = TrackingEntry(
+                user=self.linked_user,
+                entry_date=day,
+                start_time=datetime.time(rand.randint(7, 9),
+                                         rand.choice([0, 7, 15, 30, 45])),
+                end_time=datetime.time(rand.randint(15, 19),
+                                       rand.choice([0, 10, 15, 30, 45])),
+                breaks=datetime.time(0, rand.choice([0, 15, 30, 45])),
+                daytype=daytype
+            )
+            entry.save()
+            self.entries.append(entry)
+        # link a few of the working days
+        for entry in self.entries[5:40:7]:
+            if entry.daytype in ["WKDAY", "WKHOM"]:
+                entry.link = self.entries[-1]
+                entry.save()
+
+    def assertParity(self, **filters):
+        from timetracker.tracker.balances import (balance_totals,
+                                                  regular_balance,
+                                                  hr_balance,
+                                                  tracking_days,
+                                                  return_days)
+        from timetracker.utils.datemaps import hr_calculation
+        user = self.linked_user
+        totals = balance_totals(user, **filters)
+        self.assertAlmostEqual(
+            regular_balance(user, totals),
+            user._regular_calculation(tracking_days(user.id, **filters),
+                                      return_days(user.id, **filters))
+        )
+        self.assertAlmostEqual(
+            hr_balance(user, totals),
+            hr_calculation(user,
+                           tracking_days(user.id, **filters),
+                           return_days(user.id, **filters))
+        )
+
+    def test_parity_all_time(self):
+        self.assertParity()
+
+    def test_parity_year(self):
+        self.assertParity(entry_date__year=2012)
+        self.assertParity(entry_date__year=2013)
+
+    def test_parity_month(self):
+        for year, month in [(2012, 11), (2012, 12), (2013, 1), (2013, 2)]:
+            self.assertParity(entry_date__year=year, entry_date__month=month)
+
+    def test_parity_range(self):
+        self.assertParity(entry_date__range=[datetime.date(2012, 12, 24),
+                                             datetime.date(2013, 1, 7)])
+
+    def test_parity_no_entries(self):
+        self.assertParity(entry_date__year=1999)
+
+    def test_total_balance_single_query(self):
+        with self.assertNumQueries(1):
+            self.linked_user.get_total_balance(ret='flo')
+
+    def test_total_balance_hr_calculation(self):
+        from timetracker.utils.datemaps import hr_calculation
+        from timetracker.tracker.balances import tracking_days, return_days
+        user = self.linked_user
+        expected = hr_calculation(user,
+                                  tracking_days(user.id, entry_date__year=2013),
+                                  return_days(user.id, entry_date__year=2013))
+        with override_settings(OVERRIDE_CALCULATION={
+                user.market: hr_calculation}):
+            self.assertAlmostEqual(
+                user.get_total_balance(ret='flo', year=2013), expected
+            )
+
+    def test_total_balance_unknown_override(self):
+        calculation = lambda user, tracking, returns: \
+            float(tracking.count() - returns.count())
+        with override_settings(OVERRIDE_CALCULATION={
+                self.linked_user.market: calculation}):
+            self.assertEqual(
+                self.linked_user.get_total_balance(ret='flo', year=2012),
+                calculation(self.linked_user,
+                            TrackingEntry.objects.filter(
+                                user=self.linked_user,
+                                entry_date__year=2012,
+                                daytype__in=["WKDAY", "WKHOM"]),
+                            TrackingEntry.objects.filter(
+                                user=self.linked_user,
+                                entry_date__year=2012,
+                                daytype="ROVER"))
+            )
+
+    def test_strategy_parity(self):
+        from timetracker.tracker.balances import (tracking_days, return_days,
+                                                  balance_totals)
+        from timetracker.utils.datemaps import hr_calculation
+        user = self.linked_user
+        for year, month in [(2012, 11), (2012, 12), (2013, 1), (2013, 2)]:
+            filters = {"entry_date__year": year, "entry_date__month": month}
+            totals = balance_totals(user, **filters)
+            self.assertAlmostEqual(
+                STRATEGIES["regular"].totals(user, totals),
+                user._regular_calculation(tracking_days(user.id, **filters),
+                                          return_days(user.id, **filters))
+            )
+            self.assertAlmostEqual(
+                STRATEGIES["hr"].totals(user, totals),
+                hr_calculation(user,
+                               tracking_days(user.id, **filters),
+                               return_days(user.id, **filters))
+            )
+
+    def test_strategy_registered(self):
+        # a registered strategy is applied to the whole team from the
+        # ledger in a single query.
+        register("test", lambda user, totals: totals["working_days"] * 1.0)
+        users = [self.linked_user, self.linked_manager]
+        try:
+            with override_settings(OVERRIDE_CALCULATION={
+                    self.linked_user.market: "test"}):
+                with self.assertNumQueries(1):
+                    balances = Tbluser.objects.balances_for(users, 2013)
+                self.assertEqual(
+                    balances[self.linked_user.id][1],
+                    self.linked_user.get_total_balance(ret='flo',
+                                                       year=2013, month=1)
+                )
+                self.assertEqual(balances[self.linked_manager.id][1], 0)
+        finally:
+            del STRATEGIES["test"]
+
+    def test_strategy_by_name(self):
+        with override_settings(OVERRIDE_CALCULATION={
+                self.linked_user.market: "hr"}):
+            self.assertEqual(strategy_for(self.linked_user.market),
+                             STRATEGIES["hr"])
+        with override_settings(OVERRIDE_CALCULATION={
+                self.linked_user.market: "unknown"}):
+            self.assertRaises(ImproperlyConfigured, strategy_for,
+                              self.linked_user.market)
+
+class MonthlyBalanceTestCase(BaseUserTest):
+    '''Checks that the monthly balance ledger is kept up to date with
+    the tracking entries.'''
+
+    def setUp(self):
+        self.user = self.linked_user
+        self.entry = TrackingEntry(
+            user=self.user,
+            entry_date=datetime.date(2013, 3, 4),
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(18, 0),
+            breaks=datetime.time(0, 15),
+            daytype="WKDAY"
+        )
+        self.entry.save()
+
+    def ledger(self, year=2013, month=3):
+        from timetracker.tracker.ledger import MonthlyBalance
+        return MonthlyBalance.objects.get(user=self.user,
+                                          year=year,
+                                          month=month)
+
+    def assertLedgerMatches(self, year=2013, month=3):
+        from timetracker.tracker.ledger import MonthlyBalance
+        expected = MonthlyBalance.calculate(self.user, year, month)
+        row = self.ledger(year, month)
+        for key, value in expected.items():
+            self.assertEqual(getattr(row, key), value)
+
+    def test_save_creates_row(self):
+        row = self.ledger()
+        self.assertEqual(row.working_days, 1)
+        self.assertEqual(row.worked_minutes, 8 * 60 + 45)
+        self.assertEqual(row.daytype_count("WKDAY"), 1)
+        self.assertAlmostEqual(row.expected_hours(), 7.75)
+
+    def test_edit_updates_row(self):
+        self.entry.end_time = datetime.time(19, 0)
+        self.entry.save()
+        self.assertEqual(self.ledger().worked_minutes, 9 * 60 + 45)
+        self.assertLedgerMatches()
+
+    def test_moving_month_updates_both(self):
+        from timetracker.tracker.ledger import MonthlyBalance
+        self.entry.entry_date = datetime.date(2013, 4, 2)
+        self.entry.save()
+        self.assertFalse(MonthlyBalance.objects.filter(
+            user=self.user, year=2013, month=3).exists())
+        self.assertLedgerMatches(2013, 4)
+
+    def test_delete_removes_row(self):
+        from timetracker.tracker.ledger import MonthlyBalance
+        self.entry.delete()
+        self.assertFalse(MonthlyBalance.objects.filter(
+            user=self.user).exists())
+
+    def test_breaklength_change_rebuilds(self):
+        self.user.breaklength = datetime.time(0, 0)
+        try:
+            self.user.save()
+            self.assertLedgerMatches()
+        finally:
+            self.user.breaklength = datetime.time(0, 15)
+            self.user.save()
+
+    def test_rebuild_command(self):
+        from timetracker.tracker.ledger import MonthlyBalance
+        MonthlyBalance.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_ledger", self.user.user_id, verify=True,
+                     stdout=out)
+        self.assertIn("2013/03 is out of date", out.getvalue())
+        call_command("rebuild_ledger", self.user.user_id, stdout=StringIO())
+        self.assertLedgerMatches()
+        out = StringIO()
+        call_command("rebuild_ledger", self.user.user_id, verify=True,
+                     stdout=out)
+        self.assertEqual(out.getvalue(), "")
+
+
+class SubordinateCacheTestCase(BaseUserTest):
+    '''Checks that the cached teams are used and are invalidated when
+    the team changes.'''
+
+    def setUp(self):
+        cache.clear()
+        details = dict(self.new_user, market="BG")
+        del details["mode"]
+        self.new = Tbluser.objects.create(**details)
+
+    def tearDown(self):
+        cache.clear()
+
+    def team(self, admin, get_all=False):
+        return set(admin.get_subordinates(get_all=get_all))
+
+    def test_cached(self):
+        self.team(self.linked_manager)
+        with self.assertNumQueries(1):
+            self.team(self.linked_manager)
+
+    def test_add_and_remove(self):
+        self.assertNotIn(self.new, self.team(self.linked_manager))
+        self.authorization.users.add(self.new)
+        self.assertIn(self.new, self.team(self.linked_manager))
+        self.authorization.users.remove(self.new)
+        self.assertNotIn(self.new, self.team(self.linked_manager))
+
+    def test_reverse_add(self):
+        self.team(self.linked_manager)
+        self.new.subordinates.add(self.authorization)
+        self.assertIn(self.new, self.team(self.linked_manager))
+        self.new.subordinates.clear()
+        self.assertNotIn(self.new, self.team(self.linked_manager))
+
+    def test_related_users(self):
+        self.team(self.linked_manager)
+        related = RelatedUsers.objects.create(admin=self.linked_manager)
+        related.users.add(self.new)
+        self.assertIn(self.new, self.team(self.linked_manager))
+
+    def test_disabled(self):
+        self.authorization.users.add(self.new)
+        self.assertIn(self.new, self.team(self.linked_manager))
+        self.new.disabled = True
+        self.new.save()
+        self.assertNotIn(self.new, self.team(self.linked_manager))
+        self.assertIn(self.new, self.team(self.linked_manager, True))
+
+    def test_deleted(self):
+        self.authorization.users.add(self.new)
+        self.team(self.linked_manager)
+        self.new.delete()
+        self.assertEqual(
+            len(self.team(self.linked_manager)),
+            len(self.authorization.users.filter(disabled=False)) + 1
+        )
+
+
+class HierarchyTestCase(BaseUserTest):
+    '''Checks the organisation hierarchy index.'''
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_administrator(self):
+        self.assertEqual(self.linked_user.get_administrator(),
+                         self.linked_manager)
+        self.assertEqual(self.linked_teamlead.get_administrator(),
+                         self.linked_manager)
+        self.assertEqual(self.linked_manager.get_administrator(),
+                         self.linked_manager)
+        self.assertEqual(self.unlinked_user.get_administrator(),
+                         self.unlinked_user)
+
+    def test_index(self):
+        hierarchy = org_hierarchy()
+        # the SUPER link is passed over for the team's administrator.
+        self.assertEqual(hierarchy.administrator(self.linked_user.id),
+                         self.linked_manager.id)
+        self.assertEqual(hierarchy.administrator(self.unlinked_user.id),
+                         None)
+        self.assertEqual(hierarchy.admin_email(self.linked_manager.id),
+                         self.linked_manager.user_id)
+
+    def test_lookups_are_cached(self):
+        self.linked_user.get_manager_email()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.linked_user.get_manager_email(),
+                             [self.linked_manager.user_id])
+            self.assertEqual(self.linked_user.get_manager_name(),
+                             self.linked_manager.name())
+
+    def test_rebuilt_on_link_change(self):
+        self.assertEqual(self.unlinked_user.get_administrator(),
+                         self.unlinked_user)
+        self.authorization.users.add(self.unlinked_user)
+        self.assertEqual(self.unlinked_user.get_administrator(),
+                         self.linked_manager)
+        self.authorization.users.remove(self.unlinked_user)
+        self.assertEqual(self.unlinked_user.get_administrator(),
+                         self.unlinked_user)
+
+    def test_ambiguous_approver(self):
+        # a user with more links than can be resolved raises, rather than
+        # having their approvals queued for no one.
+        Tblauthorization.objects.create(
+            admin=self.unlinked_super_user
+        ).users.add(self.linked_user)
+        self.assertRaises(MultipleObjectsReturned,
+                          self.linked_user.approver_id)
+        self.assertRaises(MultipleObjectsReturned,
+                          self.linked_user.has_pending_approvals)
+        entry = TrackingEntry(
+            user=self.linked_user,
+            entry_date=datetime.date(2013, 4, 1),
+            start_time="09:00",
+            end_time="17:00",
+            breaks="00:15",
+            daytype="PENDI"
+        )
+        self.assertRaises(MultipleObjectsReturned,
+                          entry.create_approval_request)
+
+
+class HolidayListTestCase(BaseUserTest):
+    '''Checks that the holiday planning grid is built with the same
+    number of queries however big the team is.'''
+
+    def setUp(self):
+        cache.clear()
+        for day in range(1, 6):
+            TrackingEntry(
+                user=self.linked_user,
+                entry_date=datetime.date(2013, 4, day),
+                start_time=datetime.time(9, 0),
+                end_time=datetime.time(17, 0),
+                breaks=datetime.time(0, 15),
+                daytype="HOLIS",
+                comments="day %d" % day
+            ).save()
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def count_queries(self, function, *args):
+        connection.use_debug_cursor = True
+        start = len(connection.queries)
+        try:
+            function(*args)
+            return len(connection.queries) - start
+        finally:
+            connection.use_debug_cursor = False
+
+    def test_rows(self):
+        table, comments, _ = gen_holiday_list(self.linked_manager, 2013, 4)
+        self.assertEqual(len(comments), 5)
+        self.assertIn("<td>%s</td>" % (self.linked_user.holiday_balance - 5),
+                      table)
+
+    def test_query_count(self):
+        queries = self.count_queries(gen_holiday_list,
+                                     self.linked_manager, 2013, 4)
+        for num in range(3):
+            user = Tbluser.objects.create(**dict(
+                [(key, value) for key, value in self.new_user.items()
+                 if key != "mode"],
+                user_id="holiday.user%d@test.com" % num,
+                market="BG"
+            ))
+            self.authorization.users.add(user)
+            TrackingEntry(
+                user=user,
+                entry_date=datetime.date(2013, 4, 1),
+                start_time=datetime.time(9, 0),
+                end_time=datetime.time(17, 0),
+                breaks=datetime.time(0, 15),
+                daytype="HOLIS"
+            ).save()
+        cache.clear()
+        self.assertEqual(
+            self.count_queries(gen_holiday_list, self.linked_manager, 2013, 4),
+            queries
+        )
+
+
+class CalendarTestCase(BaseUserTest):
+    '''Checks that the calendar is rendered from a single query for the
+    month and cached until one of its entries changes.'''
+
+    def setUp(self):
+        cache.clear()
+        self.entries = []
+        for day in range(1, 6):
+            entry = TrackingEntry(
+                user=self.linked_user,
+                entry_date=datetime.date(2013, 4, day),
+                start_time=datetime.time(9, 0),
+                end_time=datetime.time(17, 0),
+                breaks=datetime.time(0, 15),
+                daytype="WKDAY"
+            )
+            entry.save()
+            self.entries.append(entry)
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_query_count(self):
+        with self.assertNumQueries(2):
+            calendar = gen_calendar(2013, 4, 1, user=self.linked_user.id)
+        for day in range(1, 6):
+            self.assertIn("'2013-04-0%d', 'WKDAY'" % day, calendar)
+        self.assertIn("hideEntries('2013-04-06')", calendar)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                gen_calendar(2013, 4, 2, user=self.linked_user.id), calendar
+            )
+
+    def test_invalidated_on_change(self):
+        gen_calendar(2013, 4, 1, user=self.linked_user.id)
+        self.entries[0].daytype = "HOLIS"
+        self.entries[0].save()
+        self.assertIn("'2013-04-01', 'HOLIS'",
+                      gen_calendar(2013, 4, 1, user=self.linked_user.id))
+        self.entries[1].delete()
+        self.assertIn("hideEntries('2013-04-02')",
+                      gen_calendar(2013, 4, 1, user=self.linked_user.id))
+
+    def test_moved_to_another_month(self):
+        gen_calendar(2013, 4, 1, user=self.linked_user.id)
+        self.entries[0].entry_date = datetime.date(2013, 5, 1)
+        self.entries[0].save()
+        self.assertIn("hideEntries('2013-04-01')",
+                      gen_calendar(2013, 4, 1, user=self.linked_user.id))
+
+    def test_linked_entries(self):
+        link = TrackingEntry(
+            user=self.linked_user,
+            entry_date=datetime.date(2013, 3, 30),
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(17, 0),
+            breaks=datetime.time(0, 15),
+            daytype="LINKD"
+        )
+        link.save()
+        self.entries[0].link = link
+        self.entries[0].save()
+        self.assertIn("'2013-03-30')",
+                      gen_calendar(2013, 4, 1, user=self.linked_user.id))
+        link.entry_date = datetime.date(2013, 3, 31)
+        link.save()
+        self.assertIn("'2013-03-31')",
+                      gen_calendar(2013, 4, 1, user=self.linked_user.id))
+
+
+class CacheKeysTestCase(BaseUserTest):
+    '''Checks the cache keys and their generations.'''
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_parts_are_separated(self):
+        self.assertNotEqual(make_key("holidaybalance", 1, 2013),
+                            make_key("holidaybalance", 12, "013"))
+        self.assertNotEqual(user_year_key("holidaybalance", 1, 2013),
+                            user_year_key("holidaybalance", 12, "013"))
+
+    def test_keys_are_stable(self):
+        key = user_year_key("yearview", self.linked_user.id, 2013)
+        self.assertEqual(user_year_key("yearview", self.linked_user.id, 2013),
+                         key)
+        self.assertEqual(
+            user_year_keys("yearview", [self.linked_user.id], 2013),
+            {self.linked_user.id: key}
+        )
+
+    def test_invalidation(self):
+        user_id = self.linked_user.id
+        key = user_year_key("yearview", user_id, 2013)
+        other_year = user_year_key("yearview", user_id, 2012)
+        invalidate_user_year(user_id, 2013)
+        self.assertNotEqual(user_year_key("yearview", user_id, 2013), key)
+        self.assertEqual(user_year_key("yearview", user_id, 2012),
+                         other_year)
+        invalidate_user(user_id)
+        self.assertNotEqual(user_year_key("yearview", user_id, 2012),
+                            other_year)
+
+    def test_evicted_generation(self):
+        user_id = self.linked_user.id
+        key = user_year_key("yearview", user_id, 2013)
+        cache.delete(make_key("generation", user_id, 2013))
+        self.assertNotEqual(user_year_key("yearview", user_id, 2013), key)
+
+    def test_changed_daytype(self):
+        entry = TrackingEntry(
+            user=self.linked_user,
+            entry_date=datetime.date(2013, 4, 1),
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(17, 0),
+            breaks=datetime.time(0, 15),
+            daytype="DAYOD"
+        )
+        entry.save()
+        self.assertEqual(self.linked_user.get_dod_balance(2013), 1)
+        entry.daytype = "HOLIS"
+        entry.save()
+        self.assertEqual(self.linked_user.get_dod_balance(2013), 0)
+
+    def test_user_changed(self):
+        balance = self.linked_user.get_holiday_balance(2013)
+        self.linked_user.holiday_balance += 1
+        self.linked_user.save()
+        try:
+            self.assertEqual(self.linked_user.get_holiday_balance(2013),
+                             balance + 1)
+        finally:
+            self.linked_user.holiday_balance -= 1
+            self.linked_user.save()
+
+
+class YearTableTestCase(BaseUserTest):
+    '''Checks the year tables against the cell by cell way they used to
+    be built.'''
+
+    def setUp(self):
+        rand = random.Random(13)
+        for user in [self.linked_user, self.linked_manager]:
+            for month in [1, 2, 6, 12]:
+                for day in [1, 2, 3, 15, 28]:
+                    TrackingEntry(
+                        user=user,
+                        entry_date=datetime.date(2013, month, day),
+                        start_time=datetime.time(rand.randint(6, 9), 0),
+                        end_time=datetime.time(rand.randint(15, 20), 30),
+                        breaks=datetime.time(0, rand.choice([0, 15, 45])),
+                        daytype=rand.choice(["WKDAY", "WKDAY", "ROVER",
+                                             "HOLIS", "SICKD"])
+                    ).save()
+
+    def legacy_table(self, user, year, overtime):
+        final = []
+        for x in range(1, 13):
+            out = ["<tr id=\"%d_row\" onclick=%s><th>%s</th>"
+                   % (x, '"highlight_row(%d)"' % x, MONTH_MAP[x-1][1])]
+            for z in range(1, 32):
+                try:
+                    if datetime.date(int(year), x, z).isoweekday() in [6, 7]:
+                        out.append('<td class="WKEND">%d</td>' % z)
+                    else:
+                        out.append('<td {function} class={c}>%d</td>' % z)
+                except ValueError:
+                    out.append('<td {function} class={c}>%d</td>' % z)
+            out.append("</tr>")
+            final.append(out)
+        for entry in TrackingEntry.objects.filter(user_id=user.id,
+                                                  entry_date__year=year):
+            row = final[entry.entry_date.month-1]
+            row[entry.entry_date.day] = row[entry.entry_date.day].format(
+                c=entry.overtime_class() if overtime else entry.daytype,
+                function="entry_date='%s'" % entry.entry_date
+                         if overtime else "")
+        return ''.join(''.join(row) for row in final)
+
+    def test_parity(self):
+        users = [self.linked_user, self.linked_manager]
+        for overtime in [False, True]:
+            vectors = year_vectors(users, 2013, overtime=overtime)
+            for user in users:
+                self.assertEqual(
+                    render_year("2013", vectors[user.id], overtime=overtime),
+                    self.legacy_table(user, 2013, overtime)
+                )
+
+    def test_skeleton_is_memoized(self):
+        self.assertIs(year_skeleton(2013), year_skeleton("2013"))
+
+    def test_one_query_for_a_team(self):
+        with self.assertNumQueries(1):
+            year_vectors([self.linked_user, self.linked_manager,
+                          self.linked_super_user], 2013, overtime=True)
+
+    def test_team_rows(self):
+        users = [self.linked_user, self.linked_manager,
+                 self.linked_super_user]
+        with self.assertNumQueries(2):
+            rows = list(team_rows(users, 2013))
+        self.assertEqual(len(rows), 3)
+        heading = team_table_heading(2013)
+        self.assertEqual(heading.count("<th>"), 365)
+        for user, row in zip(users, rows):
+            self.assertTrue(row.startswith('<tr id="%d_row">' % user.id))
+            # the counts, then a cell for every day of the year
+            self.assertEqual(row.count("<td"), len(TEAM_DAYTYPES) + 365)
+            counts = dict(
+                (daytype, TrackingEntry.objects.filter(
+                    user=user, entry_date__year=2013,
+                    daytype=daytype).count())
+                for daytype in TEAM_DAYTYPES
+            )
+            self.assertIn(''.join('<td>%d</td>' % counts[daytype]
+                                  for daytype in TEAM_DAYTYPES), row)
+        self.assertEqual(rows[2].count("class=EMPTY") +
+                         rows[2].count("class=WKEND"), 365)
+
+
+class MassHolidaysTestCase(BaseUserTest):
+    '''Checks the bulk path which applies the holiday planning grid.'''
+
+    def setUp(self):
+        cache.clear()
+        self.users = [self.linked_user, self.linked_manager]
+
+    def tearDown(self):
+        cache.clear()
+
+    def grid(self, daytypes, month=6):
+        return dict(
+            (user.id, dict(
+                (datetime.date(2013, month, day), daytype)
+                for day, daytype in daytypes.items()
+            ))
+            for user in self.users
+        )
+
+    def test_creates(self):
+        created = apply_holiday_grid(
+            self.grid({1: "WKDAY", 3: "HOLIS", 4: "SICKD", 5: "empty",
+                       6: "LINKD"}),
+            2013, 6
+        )
+        self.assertEqual(len(created), 3 * len(self.users))
+        for user in self.users:
+            entries = dict(
+                (entry.entry_date.day, entry) for entry in
+                TrackingEntry.objects.filter(user=user,
+                                             entry_date__year=2013)
+            )
+            self.assertEqual(sorted(entries), [1, 3, 4])
+            # the 1st of June 2013 is a Saturday.
+            self.assertEqual(entries[1].daytype, "SATUR")
+            self.assertEqual(entries[3].daytype, "HOLIS")
+            shift = user.get_shiftlength_list()
+            self.assertEqual(str(entries[4].start_time), shift[0])
+            self.assertEqual(entries[4].minutes(),
+                             (entries[4].worked_minutes,
+                              entries[4].break_minutes,
+                              entries[4].normalized_worked_minutes))
+            self.assertEqual(
+                PendingApproval.objects.filter(entry=entries[1]).count(), 1
+            )
+            from timetracker.tracker.ledger import MonthlyBalance
+            ledger = MonthlyBalance.objects.get(user=user, year=2013,
+                                                month=6)
+            self.assertEqual(MonthlyBalance.calculate(user, 2013, 6),
+                             dict((key, getattr(ledger, key)) for key in
+                                  MonthlyBalance.calculate(user, 2013, 6)))
+
+    def test_query_count_independent_of_cells(self):
+        connection.use_debug_cursor = True
+        try:
+            start = len(connection.queries)
+            apply_holiday_grid(self.grid({3: "HOLIS"}), 2013, 6)
+            queries = len(connection.queries) - start
+        finally:
+            connection.use_debug_cursor = False
+        with self.assertNumQueries(queries):
+            apply_holiday_grid(
+                self.grid(dict((day, "HOLIS") for day in range(1, 32)),
+                          month=7),
+                2013, 7
+            )
+
+    def test_updates_and_deletes(self):
+        apply_holiday_grid(self.grid({3: "HOLIS", 4: "HOLIS", 5: "HOLIS"}),
+                           2013, 6)
+        calendar = gen_calendar(2013, 6, 1, user=self.linked_user.id)
+        apply_holiday_grid(self.grid({3: "SICKD", 4: "empty", 5: "HOLIS"}),
+                           2013, 6)
+        entries = TrackingEntry.objects.filter(user=self.linked_user,
+                                               entry_date__year=2013)
+        self.assertEqual(
+            sorted((entry.entry_date.day, entry.daytype)
+                   for entry in entries),
+            [(3, "SICKD"), (5, "HOLIS")]
+        )
+        self.assertNotEqual(
+            gen_calendar(2013, 6, 1, user=self.linked_user.id), calendar
+        )
+        self.assertEqual(self.linked_user.get_num_daytype_in_year(2013,
+                                                                  "HOLIS"),
+                         1)
+
+    def test_link_days(self):
+        link = TrackingEntry(user=self.linked_user,
+                             entry_date=datetime.date(2013, 5, 4),
+                             start_time=datetime.time(9, 0),
+                             end_time=datetime.time(17, 0),
+                             breaks=datetime.time(0, 15),
+                             daytype="LINKD")
+        link.save()
+        entry = TrackingEntry(user=self.linked_user,
+                              entry_date=datetime.date(2013, 6, 3),
+                              start_time=datetime.time(9, 0),
+                              end_time=datetime.time(19, 0),
+                              breaks=datetime.time(0, 15),
+                              daytype="WKDAY",
+                              link=link)
+        entry.save()
+        apply_holiday_grid({self.linked_user.id: {
+            datetime.date(2013, 6, 3): "empty"
+        }}, 2013, 6)
+        self.assertFalse(TrackingEntry.objects.filter(
+            user=self.linked_user, entry_date__year=2013).exists())
+
+    def test_unknown_daytype(self):
+        self.assertRaises(ValidationError, apply_holiday_grid,
+                          self.grid({3: "HOLIS", 4: "NOTHING"}), 2013, 6)
+        self.assertFalse(TrackingEntry.objects.filter(
+            user__in=self.users, entry_date__year=2013).exists())
+
+
+class TeamBalancesTestCase(BaseUserTest):
+    '''Checks the team wide balances against the balances of each
+    user.'''
+
+    def setUp(self):
+        self.users = [self.linked_super_user,
+                      self.linked_manager,
+                      self.linked_user]
+        rand = random.Random(42)
+        for user in self.users:
+            for month in [1, 2, 5, 11]:
+                for day in range(1, 6):
+                    TrackingEntry(
+                        user=user,
+                        entry_date=datetime.date(2013, month, day),
+                        start_time=datetime.time(rand.randint(7, 9), 0),
+                        end_time=datetime.time(rand.randint(15, 19), 30),
+                        breaks=datetime.time(0, 15),
+                        daytype=rand.choice(["WKDAY", "ROVER", "HOLIS"])
+                    ).save()
+
+    def test_balances_by_month(self):
+        balances = Tbluser.objects.balances_for(self.users, 2013)
+        for user in self.users:
+            for month in range(1, 13):
+                self.assertAlmostEqual(
+                    balances[user.id][month],
+                    user.get_total_balance(ret='flo', year=2013, month=month)
+                )
+
+    def test_balances_by_year(self):
+        balances = Tbluser.objects.balances_for(self.users, 2013, by='year')
+        for user in self.users:
+            self.assertAlmostEqual(
+                balances[user.id],
+                user.get_total_balance(ret='flo', year=2013)
+            )
+
+    def test_balances_single_month(self):
+        balances = Tbluser.objects.balances_for(self.users, 2013,
+                                                by='year', month=2)
+        for user in self.users:
+            self.assertAlmostEqual(
+                balances[user.id],
+                user.get_total_balance(ret='flo', year=2013, month=2)
+            )
+
+    def test_query_count_independent_of_team_size(self):
+        for team in [self.users[:1], self.users]:
+            with self.assertNumQueries(1):
+                Tbluser.objects.balances_for(team, 2013)
+            with self.assertNumQueries(1):
+                Tbluser.objects.balances_for(team, 2013, by='year')
+
+    def test_invalid_grouping(self):
+        self.assertRaises(ValueError, Tbluser.objects.balances_for,
+                          self.users, 2013, by='week')
+
+    def test_mec_ot_report(self):
+        market = self.linked_user.market
+        rows = list(mec_ot_report.report_rows(market,
+                                              datetime.date(2013, 2, 1)))
+        users = Tbluser.objects.filter(market=market,
+                                       disabled=False).order_by("lastname")
+        self.assertEqual(rows[0][1:], [user.rev_name() for user in users])
+        self.assertEqual(len(rows), 4 + 28)
+        column = list(users).index(self.linked_user) + 1
+        entry = TrackingEntry.objects.get(user=self.linked_user,
+                                          entry_date="2013-02-01")
+        if entry.daytype == "HOLIS":
+            expected = ""
+        else:
+            value = round_down(entry.time_difference()
+                               if entry.daytype != "ROVER"
+                               else -entry.total_working_time())
+            expected = '="%s"' % value if value != 0 else ""
+        self.assertEqual(rows[4][0], "2013-02-01")
+        self.assertEqual(rows[4][column], expected)
+        self.assertEqual(rows[5 + 5][column], "")
+
+
 class DatabaseTestCase(BaseUserTest):
     '''
     Class which tests the database for improper settings
@@ -1004,6 +1905,79 @@ class AjaxTestCase(BaseUserTest):
         ret = simplejson.loads(ajax_add_entry(self.linked_user_request).content)
         self.assertEqual(ret["error"], "Date Error")
 
+    def batch(self, entries):
+        self.linked_user_request.POST = {
+            'entries': simplejson.dumps(entries),
+        }
+        return simplejson.loads(
+            ajax_add_entries(self.linked_user_request).content
+        )
+
+    def testAjaxAddEntries(self):
+        # 2013-06-03 to 2013-06-08, the 8th is a Saturday.
+        days = [{
+            'entry_date': '2013-06-%02d' % day,
+            'start_time': '09:00',
+            'end_time': '17:00',
+            'daytype': 'WKDAY',
+            'breaks': '00:15:00',
+        } for day in range(3, 9)]
+        days[1]['daytype'] = 'HOLIS'
+        days[2]['end_time'] = '21:00'
+        ret = self.batch(days)
+        self.assertTrue(ret['success'])
+        self.assertIn("id=\"calendar\"", ret["calendar"])
+        entries = dict(
+            (entry.entry_date.day, entry) for entry in
+            TrackingEntry.objects.filter(user=self.linked_user,
+                                         entry_date__year=2013)
+        )
+        self.assertEqual(sorted(entries), range(3, 9))
+        self.assertEqual(entries[4].daytype, "PENDI")
+        self.assertEqual(entries[8].daytype, "SATUR")
+        self.assertEqual(entries[3].minutes(),
+                         (entries[3].worked_minutes,
+                          entries[3].break_minutes,
+                          entries[3].normalized_worked_minutes))
+        self.assertEqual(
+            sorted(PendingApproval.objects.filter(
+                entry__user=self.linked_user
+            ).values_list("entry__entry_date", flat=True)),
+            [datetime.date(2013, 6, 4), datetime.date(2013, 6, 5),
+             datetime.date(2013, 6, 8)]
+        )
+        balance = self.linked_user.monthly_balances.get(year=2013, month=6)
+        self.assertEqual(balance.wkday_count, 4)
+
+    def testAjaxAddEntriesAllOrNothing(self):
+        day = {
+            'entry_date': '2013-06-03',
+            'start_time': '09:00',
+            'end_time': '17:00',
+            'daytype': 'WKDAY',
+            'breaks': '00:15:00',
+        }
+        self.assertEqual(
+            self.batch([day, dict(day, entry_date='2013-06-04',
+                                  end_time='08:00')])['error'],
+            "Start time after end time on 2013-06-04"
+        )
+        self.assertEqual(self.batch([day, dict(day, start_time='th:is')])
+                         ['error'], "Date Error")
+        self.assertEqual(self.batch([day, dict(day, daytype='LINKD')])
+                         ['error'], "Invalid daytype: LINKD")
+        self.assertEqual(self.batch([day, day])['error'],
+                         "Duplicate entry: 2013-06-03")
+        self.assertEqual(self.batch([])['error'], "No entries")
+        self.assertFalse(TrackingEntry.objects.filter(
+            user=self.linked_user, entry_date__year=2013).exists())
+
+        self.assertTrue(self.batch([day])['success'])
+        ret = self.batch([dict(day, entry_date='2013-06-04'), day])
+        self.assertEqual(ret['error'], "Duplicate entry: 2013-06-03")
+        self.assertEqual(TrackingEntry.objects.filter(
+            user=self.linked_user, entry_date__year=2013).count(), 1)
+
     def testAjax404(self):
         class Req:
             session = {}
@@ -1076,6 +2050,51 @@ class UtilitiesTest(TestCase):
 </select>'''
         self.assertEquals(output, string)
 
+    def testStreamCsv(self):
+        '''CSV files are generated in chunks of rows, starting with the
+        byte order mark.'''
+        rows = [[u"r\xe9sum\xe9", n] for n in range(5)]
+        chunks = list(stream_csv(rows, chunk_rows=2, delimiter=';'))
+        self.assertEquals(len(chunks), 3)
+        self.assertTrue(chunks[0].startswith(BOM))
+        self.assertEquals(
+            "".join(chunks),
+            BOM + "".join("r\xc3\xa9sum\xc3\xa9;%d\r\n" % n
+                          for n in range(5))
+        )
+        self.assertFalse(
+            "".join(stream_csv(rows, bom=False)).startswith(BOM)
+        )
+
+    def testBatchUnicodeWriter(self):
+        '''The batch writer writes exactly what UnicodeWriter does.'''
+        rows = [[n, u"M\xfcller", "WKDAY", 1.0 / 3, None, True,
+                 datetime.date(2013, 1, n), u'="1.5"', "a;b"]
+                for n in range(1, 8)]
+        expected = StringIO()
+        UnicodeWriter(expected, delimiter=';').writerows(rows)
+        for batch_rows in [1, 3, 100]:
+            for write in ["writerow", "writerows"]:
+                target = StringIO()
+                writer = BatchUnicodeWriter(target, delimiter=';',
+                                            batch_rows=batch_rows)
+                if write == "writerows":
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        writer.writerow(row)
+                writer.flush()
+                self.assertEquals(target.getvalue(), expected.getvalue())
+
+    def testCsvResponse(self):
+        '''CSV responses are streamed as attachments.'''
+        response = csv_response(iter([["a", "b"]]), "report.csv")
+        self.assertTrue(response.streaming)
+        self.assertEquals(response["Content-Disposition"],
+                          "attachment;filename=report.csv")
+        self.assertEquals("".join(response.streaming_content),
+                          BOM + "a,b\r\n")
+
 class FrontEndTest(LiveServerTestCase):
     '''FrontEndTest uses Selenium to navigate the front-end of the
     application to test the Javascript and the interaction between
@@ -1307,6 +2326,16 @@ class FrontEndTestInMemory(BaseUserTest):
         response = self.client.get("/explain/")
         self.assertEquals(response.status_code, 200)
 
+    def test_team_yearview(self):
+        login_user(self, self.linked_manager)
+        response = self.client.get("/team_yearview/2013/")
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = "".join(response.streaming_content)
+        self.assertIn('<table id="team-year-table">', content)
+        for user in self.linked_manager.get_subordinates():
+            self.assertIn('<tr id="%d_row">' % user.id, content)
+
     def test_yearview_no_subs(self):
         login_user(self, self.linked_manager)
         response = self.client.get("/yearview/")
@@ -1795,6 +2824,11 @@ FAKE_MARKETS = {
 }
 @override_settings(SENDING_APPROVAL_MANAGERS=FAKE_MARKETS)
 class EmailTest(BaseUserTest):
+    def sent(self):
+        '''The e-mails sent once the outbox has been sent.'''
+        send_outbox()
+        return mail.outbox
+
     def test_holiday_approval_notification(self):
         holiday_entry = TrackingEntry(
             user=self.linked_user,
@@ -1806,7 +2840,7 @@ class EmailTest(BaseUserTest):
         )
         holiday_entry.save()
         holiday_entry.holiday_approval_notification()
-        self.assertEqual(1, len(mail.outbox))
+        self.assertEqual(1, len(self.sent()))
 
     def test_create_approval_request(self):
         ot_entry = TrackingEntry(
@@ -1819,7 +2853,7 @@ class EmailTest(BaseUserTest):
         )
         ot_entry.save()
         ot_entry.create_approval_request()
-        self.assertEqual(1, len(mail.outbox))
+        self.assertEqual(1, len(self.sent()))
 
     def test_sendnotifications_ot(self):
         # if the modules aren't there we can't really test them.
@@ -1847,14 +2881,42 @@ class EmailTest(BaseUserTest):
         self.linked_user.send_weekly_reminder()
         self.assertEqual(1, len(mail.outbox))
 
+    def test_send_weekly_reminders(self):
+        TrackingEntry(
+            user=self.linked_user,
+            entry_date=datetime.date.today() - datetime.timedelta(days=1),
+            start_time="09:00",
+            end_time="19:00",
+            breaks="00:15:00",
+            daytype="WKDAY"
+        ).save()
+        users = Tbluser.objects.filter(market="BG", disabled=False)
+        out = StringIO()
+        # the totals of every user, then the users themselves.
+        with self.assertNumQueries(2):
+            call_command("send_weekly_reminders", "BG", chunk=3, stdout=out)
+        self.assertEqual(len(mail.outbox), users.count())
+        self.assertIn("Reminded %d users, sent %d messages" % (
+            users.count(), users.count()), out.getvalue())
+        self.assertIn("users/sec", out.getvalue())
+        reminder = [message for message in mail.outbox
+                    if message.to == [self.linked_user.user_id]][0]
+        self.assertEqual(reminder.body,
+                         self.linked_user.weekly_reminder().body)
+        self.assertIn("Balance for previous week: %s" %
+                      self.linked_user.previous_week_balance(),
+                      reminder.body)
+
     def test_send_sick_notification(self):
         self.linked_user.sendsicknotification()
-        self.assertEqual(1, len(mail.outbox))
+        self.assertEqual(1, len(self.sent()))
 
     def test_send_password_reminder(self):
         from timetracker.tracker.admin import send_password_reminder
         users = Tbluser.objects.all()
         send_password_reminder(None, None, users)
+        # the passwords are never kept in the outbox.
+        self.assertFalse(QueuedEmail.objects.exists())
         self.assertEquals(len(users), len(mail.outbox))
 
     def test_send_password_reminder_frontend(self):
@@ -1863,7 +2925,7 @@ class EmailTest(BaseUserTest):
             session = {}
             META = {}
         forgot_pass(C())
-        self.assertEqual(1, len(mail.outbox))
+        self.assertEqual(1, len(self.sent()))
 
     def test_send_password_reminder_frontend_id(self):
         class C:
@@ -1871,7 +2933,7 @@ class EmailTest(BaseUserTest):
             session = {}
             META = {}
         forgot_pass(C())
-        self.assertEqual(1, len(mail.outbox))
+        self.assertEqual(1, len(self.sent()))
 
     def test_send_password_reminder_frontend_no_data(self):
         class C:
@@ -1879,7 +2941,7 @@ class EmailTest(BaseUserTest):
             session = {}
             META = {}
         forgot_pass(C())
-        self.assertEqual(0, len(mail.outbox))
+        self.assertEqual(0, len(self.sent()))
 
     def test_send_password_reminder_frontend_no_user(self):
         class C:
@@ -1887,4 +2949,217 @@ class EmailTest(BaseUserTest):
             session = {}
             META = {}
         forgot_pass(C())
-        self.assertEqual(0, len(mail.outbox))
+        self.assertEqual(0, len(self.sent()))
+
+
+def message(to, subject="Test"):
+    return EmailMessage(subject=subject, body="Body",
+                        from_email="timetracker@unmonitored.com",
+                        to=[to])
+
+class OutboxTestCase(TestCase):
+    '''Checks the outbox, sending through the local SMTP sink.'''
+
+    def setUp(self):
+        self.sink = SMTPSink().start()
+        self.smtp = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST=self.sink.host,
+            EMAIL_PORT=self.sink.port,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+            EMAIL_USE_TLS=False
+        )
+        self.smtp.enable()
+
+    def tearDown(self):
+        self.smtp.disable()
+        self.sink.stop()
+
+    def test_enqueue(self):
+        self.assertEqual(enqueue(message("a@test.com"),
+                                 EmailMessage(subject="Nobody")), 1)
+        self.assertEqual(len(self.sink.messages), 0)
+        queued = QueuedEmail.objects.get()
+        self.assertEqual(queued.message().to, ["a@test.com"])
+        self.assertEqual(send_outbox(), (1, 0))
+        self.assertEqual(self.sink.messages[0][1], ["a@test.com"])
+        self.assertFalse(QueuedEmail.objects.exists())
+
+    def test_batches(self):
+        enqueue(*[message("%d@test.com" % num) for num in range(25)])
+        self.assertEqual(send_outbox(batch_size=4, threads=3), (25, 0))
+        self.assertEqual(
+            sorted(rcpttos[0] for _, rcpttos, _ in self.sink.messages),
+            sorted("%d@test.com" % num for num in range(25))
+        )
+
+    def test_retry(self):
+        self.sink.refuse.add("refused@test.com")
+        enqueue(message("a@test.com"), message("refused@test.com"),
+                message("b@test.com"))
+        now = timezone.now()
+        self.assertEqual(send_outbox(batch_size=2, now=now), (2, 1))
+        self.assertEqual(len(self.sink.messages), 2)
+        failed = QueuedEmail.objects.get()
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn("Refused by the sink", failed.last_error)
+        self.assertEqual(failed.send_after, now + retry_delay(1))
+        # it isn't due again until the delay has passed.
+        self.assertEqual(send_outbox(now=now + retry_delay(1)
+                                     - datetime.timedelta(seconds=1)),
+                         (0, 0))
+        self.assertEqual(retry_delay(2), 2 * retry_delay(1))
+
+        self.sink.refuse.clear()
+        self.assertEqual(send_outbox(now=now + retry_delay(1)), (1, 0))
+        self.assertEqual(len(self.sink.messages), 3)
+
+    def test_give_up(self):
+        self.sink.refuse.add("refused@test.com")
+        enqueue(message("refused@test.com"))
+        now = timezone.now()
+        for attempt in range(MAX_ATTEMPTS):
+            self.assertEqual(send_outbox(now=now), (0, 1))
+            now += retry_delay(attempt + 1)
+        failed = QueuedEmail.objects.get()
+        self.assertEqual(failed.attempts, MAX_ATTEMPTS)
+        self.assertEqual(failed.send_after, None)
+        self.assertEqual(send_outbox(now=now + datetime.timedelta(days=1)),
+                         (0, 0))
+
+    def test_claimed(self):
+        enqueue(message("a@test.com"), message("b@test.com"))
+        now = timezone.now()
+        # another run has claimed the first e-mail and is sending it.
+        self.assertEqual(len(claim_emails(1, now)), 1)
+        self.assertEqual(send_outbox(now=now), (1, 0))
+        self.assertEqual(len(self.sink.messages), 1)
+        self.assertEqual(send_outbox(now=now), (0, 0))
+        # it is due again once the lease has passed, if that run died.
+        self.assertEqual(send_outbox(now=now + CLAIM_LEASE), (1, 0))
+        self.assertEqual(
+            sorted(rcpttos[0] for _, rcpttos, _ in self.sink.messages),
+            ["a@test.com", "b@test.com"]
+        )
+
+    def test_server_down(self):
+        enqueue(message("a@test.com"), message("b@test.com"))
+        self.sink.stop()
+        self.assertEqual(send_outbox(now=timezone.now()),
+                         (0, 2))
+        self.assertEqual(QueuedEmail.objects.filter(attempts=1).count(), 2)
+
+    def test_command(self):
+        enqueue(message("a@test.com"))
+        out = StringIO()
+        call_command("send_outbox", stdout=out)
+        self.assertEqual(out.getvalue(), "Sent 1 e-mails, 0 failed.\n")
+        self.assertEqual(len(self.sink.messages), 1)
+
+
+class SickLeaveTestCase(BaseUserTest):
+    '''Checks the sick leave counters and the nightly notifications.'''
+
+    def sick(self, user, start, days):
+        entries = []
+        for day in range(days):
+            entry = TrackingEntry(
+                user=user,
+                entry_date=start + datetime.timedelta(days=day),
+                start_time="09:00",
+                end_time="17:00",
+                breaks="00:15:00",
+                daytype="SICKD"
+            )
+            entry.save()
+            entries.append(entry)
+        return entries
+
+    def test_counter(self):
+        entries = self.sick(self.linked_user, datetime.date(2013, 3, 1), 5)
+        row = SickLeave.objects.get(user=self.linked_user)
+        self.assertEqual((row.sick_days, row.last_sick_day),
+                         (5, datetime.date(2013, 3, 5)))
+        entries[-1].daytype = "WKDAY"
+        entries[-1].save()
+        row = SickLeave.objects.get(user=self.linked_user)
+        self.assertEqual((row.sick_days, row.last_sick_day),
+                         (4, datetime.date(2013, 3, 4)))
+        # days more than the window before the last one don't count.
+        self.sick(self.linked_user, datetime.date(2013, 5, 1), 1)
+        self.assertEqual(
+            SickLeave.objects.get(user=self.linked_user).sick_days, 1
+        )
+        for entry in TrackingEntry.objects.filter(user=self.linked_user):
+            entry.delete()
+        self.assertFalse(SickLeave.objects.exists())
+
+    def test_over_threshold(self):
+        self.sick(self.linked_user, datetime.date(2013, 3, 1),
+                  SICK_THRESHOLD - 1)
+        self.sick(self.linked_manager, datetime.date(2013, 3, 1),
+                  SICK_THRESHOLD)
+        with self.assertNumQueries(1):
+            over = [row.user for row in SickLeave.over_threshold()]
+        self.assertEqual(over, [self.linked_manager])
+        self.assertEqual(
+            list(SickLeave.over_threshold([self.linked_user.id])), []
+        )
+
+    def test_back_filled(self):
+        # a run of sick days entered after a later one is counted back
+        # from its own days, as it was when each entry was checked.
+        self.sick(self.linked_user, datetime.date(2013, 5, 1), 1)
+        self.sick(self.linked_user, datetime.date(2013, 3, 1), SICK_THRESHOLD)
+        row = SickLeave.objects.get(user=self.linked_user)
+        self.assertEqual((row.sick_days, row.last_sick_day),
+                         (SICK_THRESHOLD, datetime.date(2013, 3, 30)))
+        # the window is kept until the manager has been told of it.
+        self.sick(self.linked_user, datetime.date(2013, 5, 2), 1)
+        self.assertEqual(
+            [row.user for row in SickLeave.notify()], [self.linked_user]
+        )
+        self.sick(self.linked_user, datetime.date(2013, 5, 3), 1)
+        row = SickLeave.objects.get(user=self.linked_user)
+        self.assertEqual((row.sick_days, row.last_sick_day),
+                         (3, datetime.date(2013, 5, 3)))
+        self.assertEqual(list(SickLeave.notify()), [])
+
+    def test_mass_holidays(self):
+        grid = {self.linked_user.id: dict(
+            (datetime.date(2013, 6, day), "SICKD") for day in range(1, 31)
+        )}
+        apply_holiday_grid(grid, 2013, 6)
+        row = SickLeave.objects.get(user=self.linked_user)
+        self.assertEqual((row.sick_days, row.notified_for),
+                         (30, datetime.date(2013, 6, 30)))
+        self.assertEqual(
+            QueuedEmail.objects.filter(subject__startswith="Sick").count(), 1
+        )
+        apply_holiday_grid({self.linked_user.id: {
+            datetime.date(2013, 6, 30): "WKDAY"
+        }}, 2013, 6)
+        self.assertEqual(
+            SickLeave.objects.get(user=self.linked_user).sick_days, 29
+        )
+
+    def test_command(self):
+        self.sick(self.linked_user, datetime.date(2013, 3, 1), SICK_THRESHOLD)
+        out = StringIO()
+        call_command("notify_sick_leave", "BG", stdout=out)
+        self.assertEqual(out.getvalue(),
+                         "%s: 30 sick days up to 2013-03-30\n"
+                         % self.linked_user.user_id)
+        self.assertEqual(QueuedEmail.objects.count(), 1)
+        # the manager is told once.
+        call_command("notify_sick_leave", stdout=StringIO())
+        self.assertEqual(QueuedEmail.objects.count(), 1)
+
+        SickLeave.objects.all().delete()
+        out = StringIO()
+        call_command("notify_sick_leave", "BG", rebuild=True, stdout=out)
+        self.assertIn("Rebuilt 1 sick leave counters", out.getvalue())
+        self.assertEqual(
+            SickLeave.objects.get(user=self.linked_user).sick_days, 30
+        )
@@ -1,6 +1,5 @@
 import datetime as dt
 
-from django.core.cache import cache
 from django.db import models
 from django.conf import settings
 from django.core.mail import EmailMessage
@@ -9,6 +8,33 @@ from django.template.loader import get_template
 
 from timetracker.utils.datemaps import DAYTYPE_CHOICES, round_down, nearest_half
 from timetracker.loggers import debug_log, suspicious_log, cache_log
+from timetracker.tracker.cachekeys import (invalidate_user_year,
+                                           invalidate_market)
+from timetracker.tracker.outbox import enqueue
+
+MINUTES_IN_DAY = 24 * 60
+
+
+def time_minutes(value):
+    '''Converts a :class:`datetime.time` to minutes past midnight.'''
+    return value.hour * 60 + value.minute
+
+def overtime_code(daytype, difference, threshold):
+    '''The CSS class of an entry in the context of over/undertime.
+
+    :param difference: The entry's time difference, see
+                       :meth:`TrackingEntry.time_difference`. It is only
+                       used for working days.
+    :param threshold: The overtime threshold of the entry's user.
+    '''
+    if daytype == "WKDAY":
+        if difference >= threshold:
+            return 'OVERTIME'
+        if difference <= -threshold:
+            return 'UNDERTIME'
+    elif daytype == "ROVER":
+        return "ROVER"
+    return 'OK'
 
 
 try:
@@ -63,6 +89,14 @@ class TrackingEntry(models.Model):
 
     comments = models.TextField(blank=True)
 
+    # denormalized from the times above whenever the entry is saved so
+    # that the database can filter and aggregate on them, see
+    # update_minutes.
+    worked_minutes = models.IntegerField(default=0, editable=False)
+    break_minutes = models.IntegerField(default=0, editable=False)
+    normalized_worked_minutes = models.IntegerField(default=0,
+                                                    editable=False)
+
     class Meta:
         '''
         Metaclass gives access to additional options
@@ -72,7 +106,20 @@ class TrackingEntry(models.Model):
         unique_together = ('user', 'entry_date')
         ordering = ['user']
 
+    def __init__(self, *args, **kwargs):
+        super(TrackingEntry, self).__init__(*args, **kwargs)
+        # the date as it was loaded, so that moving an entry to another
+        # month refreshes the ledger for both months.
+        self._loaded_date = self.entry_date
+        # likewise the daytype, so that an entry which stops being a sick
+        # day refreshes the sick leave counter.
+        self._loaded_daytype = self.daytype
+        # the times which the minute columns were worked out from, new
+        # entries have yet to work them out.
+        self._minutes_from = self.entry_times() if self.pk else None
+
     def save(self, *args, **kwargs):
+        self.update_minutes()
         super(TrackingEntry, self).save(*args, **kwargs)
         self.full_clean()
         self.invalidate_caches()
@@ -80,11 +127,78 @@ class TrackingEntry(models.Model):
                 self.entry_date.isoweekday() in [6, 7]:
             self.daytype = "SATUR"
             super(TrackingEntry, self).save(*args, **kwargs)
+        self.refresh_ledger(self._loaded_date, self.entry_date)
+        if "SICKD" in (self._loaded_daytype, self.daytype):
+            self.refresh_sick_leave(self._loaded_date, self.entry_date)
+        self._loaded_date = self.entry_date
+        self._loaded_daytype = self.daytype
 
     def delete(self, *args, **kwargs):
         self.full_clean()
         self.invalidate_caches()
+        # entries linked to this one are unlinked by the database
+        dates = [self.entry_date] + [
+            entry.entry_date for entry in self.linked_entry.all()
+            ]
         super(TrackingEntry, self).delete(*args, **kwargs)
+        self.refresh_ledger(*dates)
+        if "SICKD" in (self._loaded_daytype, self.daytype):
+            self.refresh_sick_leave(self.entry_date)
+
+    def entry_times(self):
+        '''The times which the minute columns are worked out from.'''
+        return (self.start_time, self.end_time, self.breaks)
+
+    def minutes(self):
+        '''Returns the minute columns, working them out again only when
+        the times have changed since the entry was loaded or saved.
+
+        :rtype: :class:`tuple` of worked_minutes, break_minutes and
+                normalized_worked_minutes
+        '''
+        if self._minutes_from != self.entry_times():
+            self.update_minutes()
+        return (self.worked_minutes, self.break_minutes,
+                self.normalized_worked_minutes)
+
+    def update_minutes(self):
+        '''Fills in the minute columns from the times on this entry.
+
+        worked_minutes is the time between the start and the end less
+        the breaks, break_minutes the breaks themselves and
+        normalized_worked_minutes the working time as
+        :meth:`total_working_time` has always measured it.
+        '''
+        start, end, breaks = [
+            time_minutes(self._meta.get_field(name).to_python(
+                getattr(self, name)))
+            for name in ("start_time", "end_time", "breaks")
+            ]
+        regular_break = time_minutes(self._meta.get_field(
+            "breaks").to_python(self.user.breaklength))
+        self.worked_minutes = end - start - breaks
+        self.break_minutes = breaks
+        self.normalized_worked_minutes = \
+            (end - start + min(breaks, regular_break)) % MINUTES_IN_DAY
+        self._minutes_from = self.entry_times()
+
+    def refresh_ledger(self, *dates):
+        '''Refreshes the monthly balance ledger for the months which the
+        dates fall in.'''
+        # to avoid circular import dependencies
+        from timetracker.tracker.ledger import MonthlyBalance
+        to_date = self._meta.get_field("entry_date").to_python
+        months = set((date.year, date.month)
+                     for date in map(to_date, dates) if date)
+        for year, month in sorted(months):
+            MonthlyBalance.refresh(self.user, year, month)
+
+    def refresh_sick_leave(self, *dates):
+        '''Refreshes the sick leave counter of the user with the windows
+        ending at the dates.'''
+        # to avoid circular import dependencies
+        from timetracker.tracker.sickness import SickLeave
+        SickLeave.refresh(self.user_id, dates)
 
     def __unicode__(self): # pragma: no cover
 
@@ -105,23 +219,28 @@ class TrackingEntry(models.Model):
         return unicode(self.user) + ' - ' + date
 
     def invalidate_caches(self):
-        if self.daytype in ["DAYOD", "HOLIS"]:
-            cache.delete(
-                "holidaytablerow%s%s" %
-                (self.user.id, self.entry_date.year)
-            )
-        cache.delete("holidayfields:%s%s%s" % (
-            self.user.id, self.entry_date.year, self.entry_date.month)
-        )
-        cache.delete("tracking_entries:%s%s%s" % (
-            self.user.id, self.entry_date.year, self.entry_date.month)
-        )
-        cache.delete("numdaytype:%s%s%s" % (
-            self.user.id, self.entry_date.year, self.daytype)
-        )
-        cache.delete("holidaybalance:%s%s" % (self.user.id, self.entry_date.year))
-        cache.delete("yearview:%s%s" % (self.user.id, self.entry_date.year))
-        cache.delete("overtime_view:%s%s" % (self.user.id, self.entry_date.year))
+        '''Invalidates everything cached from the years this entry is
+        shown in and, when it is or was an absence, from the activity of
+        the user's market whose utilization counts the absences, see
+        :mod:`timetracker.tracker.cachekeys`.'''
+        # to avoid circular import dependencies
+        from timetracker.vcs.utilization import changes_utilization
+        for year in set(date.year for date in self.shown_dates()):
+            invalidate_user_year(self.user_id, year)
+        if changes_utilization(self._loaded_daytype, self.daytype):
+            invalidate_market(self.user.market)
+
+    def shown_dates(self):
+        '''The dates whose cached views show this entry: its own, the one
+        it was loaded on and those of the entries it is linked with, which
+        show each other's dates.'''
+        to_date = self._meta.get_field("entry_date").to_python
+        dates = [self.entry_date, self._loaded_date]
+        if self.pk:
+            dates.extend(TrackingEntry.objects.filter(
+                models.Q(link_id=self.pk) | models.Q(id=self.link_id)
+                ).values_list("entry_date", flat=True))
+        return set(to_date(date) for date in dates if date)
 
     @staticmethod
     def headings():
@@ -134,10 +253,8 @@ class TrackingEntry(models.Model):
     @property
     def worklength(self):
         '''Returns the working portion of this tracking entry'''
-        td = dt.timedelta(hours=self.end_time.hour,
-                          minutes=self.end_time.minute)
-        td += self.normalized_break()
-        return td
+        return dt.timedelta(minutes=time_minutes(self.end_time)
+                            + self.normalized_break_minutes())
 
     def user_can_see(self, user):
         '''Method checks to see if the user passed-in is privvy to view
@@ -177,8 +294,7 @@ class TrackingEntry(models.Model):
 
     def breaktime(self):
         '''Returns the breaks entry of this tracking entry.'''
-        return (dt.timedelta(hours=self.breaks.hour,
-                             minutes=self.breaks.minute).seconds / 60.0) / 60.0
+        return self.minutes()[1] / 60.0
 
     def display_as_csv(self):
         '''Returns the tracking entry as a CSV row.'''
@@ -197,14 +313,8 @@ class TrackingEntry(models.Model):
 
     def totalhours(self):
         '''Total hours calculated for this tracking entry'''
-        td = dt.timedelta(hours=self.end_time.hour,
-                          minutes=self.end_time.minute)
-        td -= dt.timedelta(hours=self.start_time.hour,
-                           minutes=self.start_time.minute)
-        td += dt.timedelta(hours=self.breaks.hour,
-                           minutes=self.breaks.minute)
-        debug_log.debug(str((td.seconds / 60.0) / 60.0))
-        return ((td.seconds / 60.0) / 60.0)
+        worked, breaks, _ = self.minutes()
+        return ((worked + 2 * breaks) % MINUTES_IN_DAY) / 60.0
 
     def nearest_half(self):
         '''Rounds the time to the nearest half hour.'''
@@ -228,15 +338,16 @@ class TrackingEntry(models.Model):
             debug_log.debug("Returning actual break.")
             return breaklength
 
+    def normalized_break_minutes(self):
+        '''The break counted towards the working time in minutes, see
+        :meth:`normalized_break`.'''
+        worked, breaks, normalized = self.minutes()
+        return (normalized - worked - breaks) % MINUTES_IN_DAY
+
     def total_working_time(self):
         '''Total working time returns the actual working time of an
         entry, ignoring breaks taken over the regular amount.'''
-        td = dt.timedelta(hours=self.end_time.hour,
-                          minutes=self.end_time.minute)
-        td -= dt.timedelta(hours=self.start_time.hour,
-                           minutes=self.start_time.minute)
-        td += self.normalized_break()
-        return ((td.seconds / 60.0) / 60.0)
+        return self.minutes()[2] / 60.0
 
     def approval_required(self):
         '''Returns whether this entry is needing approval in order to be
@@ -262,14 +373,10 @@ class TrackingEntry(models.Model):
     def overtime_class(self):
         '''Returns a string for the CSS class to use when using this entry in
         the context of over/undertime.'''
-        if self.is_overtime():
-            return 'OVERTIME'
-        elif self.is_undertime():
-            return 'UNDERTIME'
-        elif self.daytype == "ROVER":
-            return "ROVER"
-        else:
-            return 'OK'
+        if self.daytype != "WKDAY":
+            return overtime_code(self.daytype, None, None)
+        return overtime_code(self.daytype, self.time_difference(),
+                             self.threshold())
 
     def time_difference(self):
         '''Calculates the difference between this tracking entry and the user's
@@ -295,15 +402,15 @@ class TrackingEntry(models.Model):
         # to avoid circular import dependencies
         from timetracker.overtime.models  import PendingApproval
 
-        if self.pending():
-            return
         if not self.overtime_notification_check() and \
            not self.undertime_notification_check() and \
            not self.daytype == "PENDI":
             return
+        if self.pending():
+            return
         approval_request = PendingApproval(
             entry=self,
-            approver=self.user.get_administrator()
+            approver_id=self.user.approver_id()
         )
         approval_request.save()
         approval_request.inform_manager()
@@ -347,4 +454,4 @@ class TrackingEntry(models.Model):
         email.to = [self.user.user_id]
         email.cc = self.user.get_manager_email()
         email.subject = "Holiday Request: Approved."
-        email.send()
+        enqueue(email)
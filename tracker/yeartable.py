@@ -0,0 +1,183 @@
+'''The year at a glance tables.
+
+The year view and the overtime view show a user's year as a table of
+twelve rows, one per month, of 31 days. The layout of the table only
+depends on the year, so it is worked out once per process as the year's
+skeleton. A user's year is then a vector with one code per day, their
+daytype or overtime class, which is loaded with a single query for any
+number of users and laid over the skeleton in one pass.
+
+The team year view shows every user in a team in the same way, a row
+per user, streamed as it is rendered.
+
+Days without an entry keep the {function} and {c} placeholders, which
+the views fill in once the whole table has been built.
+'''
+
+import datetime
+
+from django.conf import settings
+
+from django.utils.html import escape
+
+from timetracker.tracker.trackingentry import TrackingEntry, overtime_code
+from timetracker.tracker.ledger import MonthlyBalance
+from timetracker.utils.datemaps import MONTH_MAP, ABSENT_CHOICES, round_down
+
+DAYS_IN_ROW = 31
+
+# the daytypes counted in the team year view.
+TEAM_DAYTYPES = [code for code, _ in ABSENT_CHOICES]
+
+# the skeletons which have been worked out so far, by year.
+SKELETONS = {}
+
+
+def year_skeleton(year):
+    '''The layout of a year's table, worked out once per process.
+
+    :return: A tuple with a (row heading, cells) pair per month. Each cell
+             is the html for the day when it has no entry, whether an
+             entry can be shown on it, weekends are always shown as such,
+             and whether the day exists in the month.
+    '''
+    year = int(year)
+    skeleton = SKELETONS.get(year)
+    if skeleton is not None:
+        return skeleton
+    months = []
+    for month in range(1, 13):
+        heading = "<tr id=\"%d_row\" onclick=%s><th>%s</th>" % (
+            month, '"highlight_row(%d)"' % month, MONTH_MAP[month-1][1]
+        )
+        cells = []
+        for day in range(1, DAYS_IN_ROW + 1):
+            try:
+                weekend = datetime.date(year, month, day).isoweekday() in [6, 7]
+                real_day = True
+            except ValueError:
+                weekend = real_day = False
+            if weekend:
+                cells.append(('<td class="WKEND">%d</td>' % day, False, True))
+            else:
+                cells.append(('<td {function} class={c}>%d</td>' % day, True,
+                              real_day))
+        months.append((heading, tuple(cells)))
+    skeleton = SKELETONS[year] = tuple(months)
+    return skeleton
+
+def year_vectors(users, year, overtime=False):
+    '''Loads the year of several users with one query.
+
+    :param users: An iterable of :class:`Tbluser` instances.
+    :param overtime: Whether the codes are the overtime classes, as in
+                     :meth:`TrackingEntry.overtime_class`, rather than
+                     the daytypes.
+    :return: :class:`dict` of user id to a list with a code for each day
+             of the table, None for the days without an entry.
+    '''
+    users = dict((user.id, user) for user in users)
+    vectors = dict((user_id, [None] * (12 * DAYS_IN_ROW))
+                   for user_id in users)
+    shifts = dict((user_id, user.shiftlength_as_float())
+                  for user_id, user in users.items())
+    thresholds = dict(
+        (user_id, settings.OT_THRESHOLDS.get(user.market,
+                                             settings.DEFAULT_OT_THRESHOLD))
+        for user_id, user in users.items()
+    )
+    for user_id, date, daytype, minutes in TrackingEntry.objects.filter(
+            user_id__in=users.keys(),
+            entry_date__year=year
+        ).values_list("user_id", "entry_date", "daytype",
+                      "normalized_worked_minutes").order_by().iterator():
+        if overtime:
+            code = overtime_code(
+                daytype,
+                round_down(minutes / 60.0) - shifts[user_id],
+                thresholds[user_id]
+            )
+        else:
+            code = daytype
+        vectors[user_id][(date.month - 1) * DAYS_IN_ROW + date.day - 1] = code
+    return vectors
+
+def render_year(year, vector, overtime=False):
+    '''Lays a user's year vector over the year's skeleton.
+
+    :param overtime: Whether the days with an entry call the overtime
+                     view's function with their date.
+    :rtype: :class:`str`
+    '''
+    year = int(year)
+    out = []
+    to_out = out.append
+    for month, (heading, cells) in enumerate(year_skeleton(year)):
+        to_out(heading)
+        codes = vector[month * DAYS_IN_ROW:(month + 1) * DAYS_IN_ROW]
+        for day, ((html, open_day, _), code) in enumerate(zip(cells, codes),
+                                                          1):
+            if code is None or not open_day:
+                to_out(html)
+            elif overtime:
+                to_out("<td entry_date='%04d-%02d-%02d' class=%s>%d</td>"
+                       % (year, month + 1, day, code, day))
+            else:
+                to_out("<td  class=%s>%d</td>" % (code, day))
+        to_out("</tr>")
+    return ''.join(out)
+
+def team_table_heading(year, daytypes=TEAM_DAYTYPES):
+    '''The opening of the team year table, down to the day numbers.
+
+    :rtype: :class:`str`
+    '''
+    skeleton = year_skeleton(year)
+    out = ['<table id="team-year-table"><tr><th rowspan=2>Agent</th>']
+    out.extend('<th rowspan=2>%s</th>' % daytype for daytype in daytypes)
+    for month, (_, cells) in enumerate(skeleton):
+        out.append('<th colspan=%d>%s</th>' % (
+            len([cell for cell in cells if cell[2]]), MONTH_MAP[month][0]
+        ))
+    out.append('</tr><tr>')
+    for _, cells in skeleton:
+        out.extend('<th>%d</th>' % day
+                   for day, cell in enumerate(cells, 1) if cell[2])
+    out.append('</tr>')
+    return ''.join(out)
+
+def team_rows(users, year, daytypes=TEAM_DAYTYPES):
+    '''Generates a row of the team year table for each user.
+
+    The entries of every user are loaded with one query and the daytype
+    counts with one grouped query over the monthly balance ledger before
+    the first row is generated.
+
+    :param users: An iterable of :class:`Tbluser` instances.
+    :rtype: generator of :class:`str`
+    '''
+    users = list(users)
+    vectors = year_vectors(users, year)
+    counts = MonthlyBalance.daytype_totals([user.id for user in users],
+                                           int(year), daytypes)
+    days = [
+        (month * DAYS_IN_ROW + day, open_day)
+        for month, (_, cells) in enumerate(year_skeleton(year))
+        for day, (_, open_day, real_day) in enumerate(cells)
+        if real_day
+    ]
+    for user in users:
+        vector = vectors[user.id]
+        user_counts = counts.get(user.id, {})
+        out = ['<tr id="%d_row"><th class="user-td">%s</th>'
+               % (user.id, escape(user.name()))]
+        out.extend('<td>%d</td>' % user_counts.get(daytype, 0)
+                   for daytype in daytypes)
+        out.extend(
+            '<td class=%s></td>' % (
+                (vector[index] or "EMPTY") if open_day else "WKEND"
+            )
+            for index, open_day in days
+        )
+        out.append('</tr>')
+        yield ''.join(out)
@@ -59,6 +59,9 @@ urlpatterns = patterns('',
     url(r'^yearview/?(?P<who>\d+)?$', views.yearview),
     url(r'^yearview/?(?P<who>\d+)/%s/?$' % YEAR, views.yearview),
 
+    url(r'^team_yearview/?$', views.team_yearview),
+    url(r'^team_yearview/%s/?$' % YEAR, views.team_yearview),
+
     url(r'^overtime/?(?P<who>\d+)?$', views.overtime),
     url(r'^overtime/?(?P<who>\d+)/%s/?$' % YEAR, views.overtime),
 
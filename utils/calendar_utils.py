@@ -13,6 +13,7 @@ Module Functions
 :func:`get_request_data`   :func:`calendar_wrapper`
 :func:`validate_time`      :func:`gen_holiday_list`
 :func:`parse_time`         :func:`ajax_add_entry`
+:func:`ajax_add_entries`   :func:`apply_holiday_grid`
 :func:`ajax_delete_entry`  :func:`ajax_error`
 :func:`ajax_change_entry`  :func:`get_user_data`
 :func:`delete_user`        :func:`useredit`
@@ -32,7 +33,7 @@ from django.template.loader import get_template
 from django.conf import settings
 from django.template import Context
 from django.http import Http404, HttpResponse
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.forms import ValidationError
 from django.core.cache import cache
 
@@ -44,12 +45,16 @@ except ImportError:
 import simplejson
 
 from timetracker.loggers import (debug_log, database_log,
-                                 error_log, suspicious_log)
-from timetracker.tracker.models import TrackingEntry, Tbluser
+                                 error_log, suspicious_log, cache_log)
+from timetracker.tracker.models import (TrackingEntry, Tbluser, MonthlyBalance,
+                                        SickLeave)
 from timetracker.tracker.models import Tblauthorization as Tblauth
+from timetracker.tracker.cachekeys import (user_year_key, user_year_keys,
+                                           invalidate_user_year,
+                                           invalidate_market)
 from timetracker.utils.error_codes import DUPLICATE_ENTRY
 from timetracker.utils.datemaps import (MONTH_MAP, WEEK_MAP_SHORT,
-                                        PROCESS_CHOICES,
+                                        PROCESS_CHOICES, DAYTYPE_CHOICES,
                                         generate_select,
                                         generate_year_box, pad,
                                         round_down)
@@ -57,6 +62,7 @@ from timetracker.utils.decorators import (admin_check, json_response,
                                           request_check)
 from timetracker.utils.error_codes import CONNECTION_REFUSED
 from timetracker.utils.crypto import get_random_string
+from timetracker.vcs.utilization import changes_utilization
 
 
 def get_request_data(form, request):
@@ -166,6 +172,225 @@ def calendar_wrapper(function):
     return inner
 
 
+def holiday_grid(users, year, month):
+    '''Fetches the tracking entries of a whole team for a month in a
+    single query.
+
+    :param users: An iterable of :class:`Tbluser` instances.
+    :rtype: :class:`dict` of user ids to a :class:`list` of their
+            :class:`TrackingEntry` instances.
+    '''
+    grid = {}
+    for entry in TrackingEntry.objects.filter(
+            user_id__in=[user.id for user in users],
+            entry_date__year=year,
+            entry_date__month=month
+        ).select_related("user").order_by("entry_date"):
+        grid.setdefault(entry.user_id, []).append(entry)
+    return grid
+
+def chunked(items, size=500):
+    '''Splits items into lists of at most size items, so that an IN
+    clause stays below the number of parameters a database allows.'''
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def weekend_daytype(daytype, date):
+    '''The daytype an entry is saved with, see :meth:`TrackingEntry.save`.'''
+    if daytype == "WKDAY" and date.isoweekday() in [6, 7]:
+        return "SATUR"
+    return daytype
+
+def bulk_approval_requests(entries):
+    '''Creates the approval requests of bulk inserted entries at once,
+    see :meth:`TrackingEntry.create_approval_request`.
+
+    Bulk inserts don't give us the ids, which the approval requests need,
+    so the entries which need one are fetched back with one query.
+
+    :param entries: The :class:`TrackingEntry` instances which were bulk
+                    inserted, none of which can have a request already.
+    :return: The :class:`PendingApproval` instances which were created.
+    '''
+    # to avoid circular import dependencies
+    from timetracker.overtime.models import PendingApproval, ApprovalQueue
+
+    requests = [entry for entry in entries
+                if entry.daytype == "PENDI"
+                or entry.overtime_notification_check()
+                or entry.undertime_notification_check()]
+    if not requests:
+        return []
+    ids = dict(
+        ((user_id, date), entry_id)
+        for user_id, date, entry_id in TrackingEntry.objects.filter(
+            user_id__in=set(entry.user_id for entry in requests),
+            entry_date__in=set(entry.entry_date for entry in requests)
+        ).values_list("user_id", "entry_date", "id")
+    )
+    approvers = {}
+    for entry in requests:
+        entry.id = ids[(entry.user_id, entry.entry_date)]
+        if entry.user_id not in approvers:
+            approvers[entry.user_id] = entry.user.get_administrator()
+    approvals = [
+        PendingApproval(entry=entry, approver=approvers[entry.user_id])
+        for entry in requests
+    ]
+    PendingApproval.objects.bulk_create(approvals)
+    # bulk inserts don't send the signals which keep the queues counted.
+    ApprovalQueue.refresh(*[approver.id for approver in approvers.values()])
+    for approval in approvals:
+        approval.inform_manager()
+    return approvals
+
+def apply_holiday_grid(grid, year, month):
+    '''Applies the daytypes of a holiday planning grid to a month of
+    tracking entries in bulk.
+
+    The month's entries of every user in the grid are fetched at once and
+    compared with it. New entries are inserted with one bulk insert,
+    changed entries are updated with one statement per daytype and
+    emptied entries are deleted together, along with the link days only
+    they were linked to, all in one transaction. The ledger, the caches,
+    the approval requests and the sickness check are then dealt with
+    once per user rather than once per day.
+
+    :param grid: :class:`dict` of user ids to a :class:`dict` of
+                 :class:`datetime.date` to a daytype code or "empty".
+    :raises: :class:`ValidationError` for an unknown daytype, before
+             anything has been written.
+    :return: The :class:`TrackingEntry` instances which were created.
+    '''
+    daytypes = set(code for code, _ in DAYTYPE_CHOICES)
+    for days in grid.values():
+        for daytype in days.values():
+            if daytype != "empty" and daytype not in daytypes:
+                raise ValidationError("Unknown daytype: %s" % daytype)
+
+    users = Tbluser.objects.in_bulk([int(user_id) for user_id in grid])
+    existing = dict(
+        ((entry.user_id, entry.entry_date), entry)
+        for entry in TrackingEntry.objects.filter(
+            user_id__in=users.keys(),
+            entry_date__year=year,
+            entry_date__month=month
+        ).select_related("link")
+    )
+
+    creates, deletes, updates = [], {}, {}
+    link_days = {}
+    for user_id, days in grid.items():
+        user = users.get(int(user_id))
+        if user is None:
+            continue
+        shift = None
+        for date, daytype in sorted(days.items()):
+            entry = existing.get((user.id, date))
+            if entry is not None:
+                if daytype == "empty":
+                    deletes[entry.id] = entry
+                    if entry.link_id and entry.link.daytype == "LINKD":
+                        link_days[entry.link_id] = entry.link
+                elif daytype != "LINKD":
+                    # we may have unlinked something before, and if
+                    # we're here we don't want to set something to
+                    # linked again.
+                    daytype = weekend_daytype(daytype, date)
+                    if daytype != entry.daytype:
+                        updates.setdefault(daytype, []).append(entry)
+                continue
+            if daytype in ["empty", "LINKD"]:
+                continue
+            if shift is None:
+                shift = user.get_shiftlength_list()
+            entry = TrackingEntry(
+                user=user,
+                entry_date=date,
+                start_time=shift[0],
+                end_time=shift[1],
+                breaks=shift[2],
+                daytype=weekend_daytype(daytype, date)
+            )
+            entry.update_minutes()
+            creates.append(entry)
+
+    # a link day goes when every entry linked to it is being deleted, as
+    # TrackingEntry.unlink does one entry at a time.
+    linked = {}
+    for ids in chunked(link_days):
+        for link_id, entry_id in TrackingEntry.objects.filter(
+                link_id__in=ids).values_list("link_id", "id"):
+            linked.setdefault(link_id, set()).add(entry_id)
+    for link_id, entry_ids in linked.items():
+        if entry_ids <= set(deletes):
+            deletes[link_id] = link_days[link_id]
+
+    # the entries which show the deleted ones as their link day have
+    # their link removed, so their months change too.
+    months = set()
+    for ids in chunked(deletes):
+        months.update(TrackingEntry.objects.filter(
+            link_id__in=ids
+        ).exclude(id__in=ids).values_list("user_id", "entry_date"))
+    months.update((entry.user_id, entry.entry_date)
+                  for entry in deletes.values() + creates)
+    months.update((entry.user_id, entry.entry_date)
+                  for entries in updates.values() for entry in entries)
+    months = set((user_id, date.year, date.month)
+                 for user_id, date in months)
+
+    with transaction.commit_on_success():
+        for ids in chunked(deletes):
+            TrackingEntry.objects.filter(id__in=ids).delete()
+        for daytype, entries in updates.items():
+            for ids in chunked(entry.id for entry in entries
+                               if entry.id not in deletes):
+                TrackingEntry.objects.filter(id__in=ids).update(
+                    daytype=daytype
+                )
+        TrackingEntry.objects.bulk_create(creates)
+        for user_id, year_, month_ in sorted(months):
+            MonthlyBalance.refresh(
+                users.get(user_id) or Tbluser.objects.get(id=user_id),
+                year_, month_
+            )
+
+    for user_id, year_ in set((user_id, year_)
+                              for user_id, year_, _ in months):
+        invalidate_user_year(user_id, year_)
+    # the utilization of a market only counts the absences.
+    changed = set(entry.user_id for entry in creates + deletes.values()
+                  if changes_utilization(entry.daytype))
+    changed.update(entry.user_id
+                   for daytype, entries in updates.items()
+                   for entry in entries
+                   if changes_utilization(daytype, entry.daytype))
+    for market in set(users[user_id].market for user_id in changed):
+        invalidate_market(market)
+
+    bulk_approval_requests(creates)
+
+    # the sick leave counters, once per user whose sick days changed,
+    # and their managers are told if that takes them over the threshold.
+    sick_users = {}
+    for entry in creates + deletes.values():
+        if entry.daytype == "SICKD":
+            sick_users.setdefault(entry.user_id, set()).add(entry.entry_date)
+    for daytype, entries in updates.items():
+        for entry in entries:
+            if "SICKD" in (daytype, entry.daytype):
+                sick_users.setdefault(entry.user_id, set()).add(
+                    entry.entry_date
+                )
+    for user_id, dates in sick_users.items():
+        SickLeave.refresh(user_id, dates)
+    if sick_users:
+        SickLeave.notify(sick_users)
+
+    return creates
+
 def gen_holiday_list(admin_user, year=None, month=None, process=None):
     """
     Outputs a holiday calendar for that month.
@@ -225,8 +450,9 @@ def gen_holiday_list(admin_user, year=None, month=None, process=None):
     [to_out("<td>%s</td>\n" % day) for day in day_names]
     to_out("</tr>")
 
-    user_list = admin_user.get_subordinates().filter(process=process) \
-        if process else admin_user.get_subordinates()
+    user_list = list(admin_user.get_subordinates().filter(process=process)
+                     if process else admin_user.get_subordinates())
+    grid = holiday_grid(user_list, year, month)
 
     isweekend = lambda num: {
         1: 'empty',
@@ -238,6 +464,19 @@ def gen_holiday_list(admin_user, year=None, month=None, process=None):
         7: 'WKEND',
     }[datetime.date(year=year,month=month,day=num).isoweekday()]
 
+    # if we have a cached row for a user and this year, use that,
+    # the balances for the rest are worked out all at once.
+    user_ids = [user.id for user in user_list]
+    row_keys = user_year_keys("holidaytablerow", user_ids, year)
+    field_keys = user_year_keys("holidayfields", user_ids, year, month)
+    cached_rows = cache.get_many(row_keys.values())
+    cached_fields = cache.get_many(field_keys.values())
+    balances = Tbluser.objects.holiday_balances_for(
+        [user for user in user_list if row_keys[user.id] not in cached_rows],
+        year
+    )
+    can_view_jobcodes = admin_user.can_view_jobcodes()
+
     comments_list = []
     js_calendar = ["{\n"]
     to_js = js_calendar.append
@@ -249,7 +488,7 @@ def gen_holiday_list(admin_user, year=None, month=None, process=None):
         # We have a dict with each day as currently
         # empty, we iterate through the tracking
         # entries and apply the daytype from that.
-        for entry in user.tracking_entries(year, month): # pragma: no cover
+        for entry in grid.get(user.id, []): # pragma: no cover
             day_classes[entry.entry_date.day] = entry.daytype
             if entry.comments:
                 comment_string = map(
@@ -258,11 +497,7 @@ def gen_holiday_list(admin_user, year=None, month=None, process=None):
                     )
                 comments_list.append(' '.join(comment_string))
 
-        # if we have a cached row for this user and this year, use that.
-        cached_result = cache.get(
-            "holidaytablerow%s%s" % (user.id,
-                                     year)
-        )
+        cached_result = cached_rows.get(row_keys[user.id])
 
         if cached_result:
             to_out(cached_result)
@@ -270,6 +505,7 @@ def gen_holiday_list(admin_user, year=None, month=None, process=None):
             # output the table row title, which contains:-
             # Full name, Holiday Balance and the User's
             # job code.
+            holiday_balance, dod_balance = balances[user.id]
             row = """
             <tr id="%d_row">
             <th onclick="highlight_row(%d)" class="user-td">%s</th>
@@ -278,12 +514,12 @@ def gen_holiday_list(admin_user, year=None, month=None, process=None):
             <td class="job_code">%s</td>""" % (
                 user.id, user.id,
                 user.name(),
-                user.get_holiday_balance(year),
-                user.get_dod_balance(year),
-                user.get_job_code_display() if admin_user.can_view_jobcodes() else ""
+                holiday_balance,
+                dod_balance,
+                user.get_job_code_display() if can_view_jobcodes else ""
             )
             to_out(row)
-            cache.set("holidaytablerow%s%s" % (user.id, year), row)
+            cache.set(row_keys[user.id], row)
 
         # We've mapped the users' days to the day number,
         # we can write the user_id as an attribute to the
@@ -292,9 +528,7 @@ def gen_holiday_list(admin_user, year=None, month=None, process=None):
         # shows what number we're on.
         to_js('"%s":["empty",' % user.id)
         entries = sorted(day_classes.items())
-        cached_text = cache.get(
-            "holidayfields:%s%s%s" % (user.id, year, month)
-        )
+        cached_text = cached_fields.get(field_keys[user.id])
         if cached_text:
             to_js(cached_text[0])
             to_out(cached_text[1])
@@ -309,10 +543,7 @@ def gen_holiday_list(admin_user, year=None, month=None, process=None):
                 text_out += ('<td usrid=%s class=%s>%s\n' % (user.id, day, klass))
             to_js(text_js)
             to_out(text_out)
-            cache.set(
-                "holidayfields:%s%s%s" % (user.id, year, month),
-                (text_js, text_out),
-            )
+            cache.set(field_keys[user.id], (text_js, text_out))
         # user_id is added as attr to make mass calls
         if admin_user.user_type != "RUSER":
             to_out("""<td>
@@ -460,23 +691,28 @@ def gen_calendar(year=None, month=None, day=None, user=None):
     else:
         previous_url = '"/calendar/%s/%s"' % (year, month - 1)
 
+    # the calendar does not depend on the day, only on the month's
+    # entries, the cache is cleared by TrackingEntry.invalidate_caches
+    cache_key = user_year_key("calendar", user, year, month)
+    cached_result = cache.get(cache_key)
+    if cached_result is not None:
+        cache_log.debug("Returning cache for: %s" % cache_key)
+        return cached_result
+
     # user_id came from sessions or the ajax call
     # so this is pretty safe
     database = Tbluser.objects.get(id__exact=user)
 
-    # pull out the entries for the given month
-    try:
-        database = TrackingEntry.objects.filter(
+    # pull out the entries for the given month in one query, keyed by
+    # the day of the month so that each day cell is a dictionary lookup
+    entries = dict(
+        (entry.entry_date.day, entry)
+        for entry in TrackingEntry.objects.filter(
             user=database.id,
             entry_date__year=year,
             entry_date__month=month
-            )
-
-    except TrackingEntry.DoesNotExist: # pragma: no cover
-        # it seems Django still follows through with the assignment
-        # when it raises an error, this is actually quite good because
-        # we can treat the query set like normal
-        pass
+            ).select_related("link")
+        )
 
     # create a semi-sparsely populated n-dimensional
     # array with the month's days per week
@@ -536,11 +772,10 @@ def gen_calendar(year=None, month=None, day=None, user=None):
             else:
                 emptyclass = 'empty'
 
-            # we've got the month in the query set,
-            # so just query that set for individual days
-            try:
-                # get all the data from our in-memory query-set.
-                data = database.get(entry_date__day=_day)
+            # we've got the month in the dictionary,
+            # so just look up the individual days
+            data = entries.get(_day)
+            if data is not None:
 
                 # Pass these to the page so that the jQuery functions
                 # get the function arguments to edit those elements
@@ -568,7 +803,7 @@ def gen_calendar(year=None, month=None, day=None, user=None):
                            class="day-class {7}">{8}</td>\n""".format(*vals)
                        )
 
-            except TrackingEntry.DoesNotExist:
+            else:
 
                 # For clicking blank days to input the day quickly into the
                 # box. An alternative to the datepicker
@@ -599,7 +834,9 @@ def gen_calendar(year=None, month=None, day=None, user=None):
     to_cal("""\n</table>""")
 
     # join up the html and push it back
-    return ''.join(cal_html)
+    html = ''.join(cal_html)
+    cache.set(cache_key, html)
+    return html
 
 
 @request_check
@@ -785,6 +1022,143 @@ def ajax_add_holiday(form):
 
     return json_data
 
+@request_check
+@json_response
+def ajax_add_entries(request):
+
+    '''Adds several calendar entries asynchronously.
+
+    This method is for RUSERs who back-fill a week or a month at a time,
+    rather than sending one request, and getting one calendar back, for
+    each day. The client-side code POSTs the entries as a json list of
+    maps like the one :func:`ajax_add_entry` takes, for example:
+
+    .. code-block:: javascript
+
+       json_map = {
+           'entries': JSON.stringify([
+               {
+                   'entry_date': "2012-01-02",
+                   'start_time': "09:00",
+                   'end_time': "17:00",
+                   'daytype': "WKDAY",
+                   'breaks': "00:15:00",
+               },
+           ])
+       }
+
+    Every entry is validated, with :func:`validate_time` and the model's
+    field validation, before anything is written, so either all of the
+    entries are added or none of them are. Links can't be made in a batch
+    and vacation is requested as in :func:`ajax_add_holiday`.
+
+    The entries are then inserted with one bulk insert and the ledger is
+    refreshed once per month, in one transaction. The calendar of the
+    month of the first entry is sent back.
+
+    :param request: HttpRequest object.
+    :returns: :class:`HttpResponse` object with the mime/application type as
+              json.
+    :rtype: :class:`HttpResponse`
+    '''
+    json_data = {
+        'success': False,
+        'error': '',
+        'calendar': ''
+    }
+
+    try:
+        items = simplejson.loads(request.POST.get('entries') or "[]")
+    except ValueError:
+        json_data['error'] = "Malformed entries"
+        return json_data
+    if not isinstance(items, list) or not items:
+        json_data['error'] = "No entries"
+        return json_data
+
+    user = Tbluser.objects.get(id=request.session['user_id'])
+    daytypes = set(code for code, _ in DAYTYPE_CHOICES) - set(["LINKD"])
+    shift = None
+    entries = {}
+    for item in items:
+        try:
+            if item.get('daytype') not in daytypes:
+                json_data['error'] = "Invalid daytype: %s" % \
+                                     item.get('daytype')
+                return json_data
+            if item['daytype'] == "HOLIS":
+                if shift is None:
+                    shift = user.get_shiftlength_list()
+                item = dict(item, start_time=shift[0], end_time=shift[1],
+                            breaks=shift[2], daytype="PENDI")
+            # server-side time validation
+            elif not validate_time(item['start_time'], item['end_time']):
+                json_data['error'] = "Start time after end time on %s" % \
+                                     item['entry_date']
+                return json_data
+            entry = TrackingEntry(
+                user=user,
+                entry_date=item['entry_date'],
+                start_time=item['start_time'],
+                end_time=item['end_time'],
+                breaks=item['breaks'],
+                daytype=item['daytype']
+            )
+            entry.update_minutes()
+            entry.clean_fields()
+        except (AttributeError, KeyError, TypeError, ValueError):
+            error_log.warn("Date error got through - %s" % item)
+            json_data['error'] = "Date Error"
+            return json_data
+        except ValidationError as error:
+            json_data['error'] = str(error)
+            return json_data
+        if entry.entry_date in entries:
+            json_data['error'] = "Duplicate entry: %s" % entry.entry_date
+            return json_data
+        entry.daytype = weekend_daytype(entry.daytype, entry.entry_date)
+        entries[entry.entry_date] = entry
+
+    existing = TrackingEntry.objects.filter(
+        user=user,
+        entry_date__in=entries.keys()
+    ).values_list("entry_date", flat=True)
+    if existing:
+        json_data['error'] = "Duplicate entry: %s" % \
+                             ", ".join(map(str, sorted(existing)))
+        return json_data
+
+    entries = sorted(entries.values(), key=lambda entry: entry.entry_date)
+    months = sorted(set((entry.entry_date.year, entry.entry_date.month)
+                        for entry in entries))
+    try:
+        with transaction.commit_on_success():
+            TrackingEntry.objects.bulk_create(entries)
+            for year, month in months:
+                MonthlyBalance.refresh(user, year, month)
+    except IntegrityError as error: # pragma: no cover
+        error_log.error("Error adding new entries for %s: %s" % \
+                        (user.id, str(error)))
+        json_data['error'] = "Duplicate entry"
+        return json_data
+
+    for year in set(year for year, _ in months):
+        invalidate_user_year(user.id, year)
+    if changes_utilization(*[entry.daytype for entry in entries]):
+        invalidate_market(user.market)
+    sick_dates = [entry.entry_date for entry in entries
+                  if entry.daytype == "SICKD"]
+    if sick_dates:
+        SickLeave.refresh(user.id, sick_dates)
+    bulk_approval_requests(entries)
+
+    # the calendar is showing the month the user started entering from
+    first = items[0]['entry_date'].split("-")
+    json_data['success'] = True
+    json_data['calendar'] = gen_calendar(first[0], first[1], first[2],
+                                         user.id)
+    return json_data
+
 @request_check
 @json_response
 def ajax_delete_entry(request):
@@ -1387,6 +1761,10 @@ def mass_holidays(request):
     holiday page only deals with *non-working-days* therefore we can track
     these days with zeroed times.
 
+    The whole grid is applied at once by :func:`apply_holiday_grid`, rather
+    than day by day, so submitting a team's month takes a handful of
+    queries per user.
+
     If all goes well, we mark the return object's success attribute with True
     and return.
 
@@ -1416,60 +1794,27 @@ def mass_holidays(request):
         json_data['error'] = str(err)
         return json_data
 
-    sick_sent = False
-    for entry in holidays.items():
-        for (day, daytype) in enumerate(entry[1]):
+    year, month = int(form_data['year']), int(form_data['month'])
+    grid = {}
+    for user_id, daytypes in holidays.items():
+        days = grid.setdefault(user_id, {})
+        for (day, daytype) in enumerate(daytypes):
             if day == 0:
                 continue
-            # we check if the date is valid by trying to create a dt
+            # we check if the date is valid by trying to create a date
             # object and catching ValueError.
             try:
-                datetime.datetime(
-                    int(form_data['year']), int(form_data['month']), day
-                    )
+                days[datetime.date(year, month, day)] = daytype
             except ValueError:
                 # if it's an invalid date, just ignore it.
                 continue
-            datestr = '-'.join([form_data['year'],
-                                form_data['month'], str(day)])
-            try:
-                current_entry = TrackingEntry.objects.get(
-                    entry_date=datestr,
-                    user_id=entry[0]
-                )
-                if current_entry.is_linked() and daytype == "empty":
-                    current_entry.unlink()
-                    current_entry.delete()
-                elif daytype == "empty":
-                    current_entry.delete()
-                else:
-                    # we may have unlinked something before, and if
-                    # we're here we don't want to set something to
-                    # linked again.
-                    if daytype == "LINKD":
-                        continue
-                    current_entry.daytype = daytype
-                    current_entry.save()
-            except TrackingEntry.DoesNotExist:
-                if daytype in ["empty", "LINKD"]:
-                    continue
-                time_str = Tbluser.objects.get(
-                    id=entry[0]
-                    ).get_shiftlength_list()
-                new_entry = TrackingEntry(
-                        entry_date=datestr,
-                        user_id=entry[0],
-                        start_time=time_str[0],
-                        end_time=time_str[1],
-                        breaks=time_str[2],
-                        daytype=daytype)
-                new_entry.save()
-                new_entry.create_approval_request()
-                if not sick_sent and daytype == "SICKD":
-                    sickuser = Tbluser.objects.get(id=entry[0])
-                    if sickuser.shouldnotifysick(new_entry):
-                        sickuser.sendsicknotification()
-                        sick_sent = True
+
+    try:
+        apply_holiday_grid(grid, year, month)
+    except ValidationError as error:
+        json_data['error'] = str(error)
+        return json_data
+
     json_data['success'] = True
     return json_data
 
@@ -38,6 +38,8 @@ import datetime
 
 from django.core.cache import cache
 
+from timetracker.tracker.cachekeys import make_key
+
 WEEK_MAP_MID = {
     0: 'Mon',
     1: 'Tue',
@@ -196,7 +198,8 @@ def generate_employee_box(admin_user, get_all=False):
     :param get_all: :class:`bool` Used to select or ignore disabled employees.
     '''
     admin_user = admin_user.get_administrator()
-    cached_result = cache.get("employee_box:%s%s" % (admin_user.id, get_all))
+    cache_key = make_key("employee_box", admin_user.id, get_all)
+    cached_result = cache.get(cache_key)
     if cached_result:
         return cached_result
     ees = admin_user.get_subordinates(get_all=get_all)
@@ -206,7 +209,7 @@ def generate_employee_box(admin_user, get_all=False):
         ees_tuple,
         id="user_select"
         )
-    cache.set("employee_box:%s%s" % (admin_user.id, get_all), select)
+    cache.set(cache_key, select)
     return select
 
 def generate_select(data, id=''):
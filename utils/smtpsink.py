@@ -0,0 +1,64 @@
+'''A local stand-in for an SMTP server.
+
+The sink accepts e-mails over SMTP and keeps them in memory instead of
+delivering them, so that the outbox can be sent through the real SMTP
+backend in the tests, and during development::
+
+    python -m timetracker.utils.smtpsink 1025
+
+Recipients in :attr:`SMTPSink.refuse` have their e-mails refused, which
+is how the tests make a message fail.
+'''
+
+import asyncore
+import smtpd
+import sys
+import threading
+
+
+class SMTPSink(smtpd.SMTPServer):
+
+    '''An SMTP server which keeps what it receives in :attr:`messages`.'''
+
+    def __init__(self, host="127.0.0.1", port=0):
+        smtpd.SMTPServer.__init__(self, (host, port), None)
+        self.host, self.port = self.socket.getsockname()
+        self.messages = []
+        self.refuse = set()
+        self.thread = None
+        self.serving = False
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        if self.refuse.intersection(rcpttos):
+            return "550 Refused by the sink"
+        self.messages.append((mailfrom, rcpttos, data))
+
+    def serve(self):
+        '''Serves until :meth:`stop` is called.'''
+        while self.serving:
+            asyncore.loop(timeout=0.05, count=1)
+
+    def start(self):
+        '''Serves in a background thread.'''
+        self.serving = True
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        '''Stops serving and waits for the thread to finish.'''
+        self.serving = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.close()
+
+
+if __name__ == '__main__': # pragma: no cover
+    SINK = SMTPSink(port=int(sys.argv[1]) if len(sys.argv) > 1 else 1025)
+    print "Listening on %s:%d" % (SINK.host, SINK.port)
+    try:
+        asyncore.loop()
+    except KeyboardInterrupt:
+        print "Received %d e-mails." % len(SINK.messages)
@@ -8,6 +8,15 @@ except ImportError:
     from StringIO import StringIO
 
 import csv, codecs
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+
+# the byte order mark which tells Excel that a CSV file is UTF-8.
+BOM = "\xef\xbb\xbf"
+
+# cell types which the csv module formats as unicode() would.
+PASSTHROUGH = frozenset([str, int, long, bool])
 
 class UnicodeWriter(object): # pragma: no cover
     """
@@ -51,3 +60,133 @@ class UnicodeWriter(object): # pragma: no cover
         '''Implements the writerows function as a csv writer would do so.'''
         for row in rows:
             self.writerow(row)
+
+
+class ListStream(object):
+    '''A write-only file which holds on to what is written to it until it
+    is drained.'''
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        '''Keeps hold of the data.'''
+        self.chunks.append(data)
+
+    def drain(self):
+        '''Returns, and forgets, everything written so far.'''
+        data = "".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class BatchUnicodeWriter(object):
+    '''
+    A CSV writer which writes unicode rows to the file "fio" in batches.
+
+    Each cell is encoded once, straight into the target encoding, and
+    the csv module writes the row into a list of pending lines. When
+    batch_rows rows are pending they are written to the target in one
+    block, so the target sees a single write per batch rather than a
+    write, read, decode, encode and truncate per row as with
+    :class:`UnicodeWriter`.
+
+    Remember to call :meth:`flush` once all the rows have been written.
+    '''
+
+    def __init__(self, fio, dialect=csv.excel, encoding="utf-8",
+                 batch_rows=500, bom=False, **kwds):
+        '''
+        :param fio: Anything with a write method.
+        :param dialect: The dialect of the csv file, defaults to excel's.
+        :param encoding: The encoding of the document which you are
+                         creating. It must be a superset of ASCII, so that
+                         the delimiters and quotes are left alone, which
+                         any encoding Excel reads a CSV file in is.
+                         Defaults to UTF-8.
+        :param batch_rows: How many rows are held before being written.
+        :param bom: Whether to start the document with a UTF-8 byte order
+                    mark.
+        '''
+        self.pending = ListStream()
+        self.writer = csv.writer(self.pending, dialect=dialect, **kwds)
+        self.stream = fio
+        self.encoding = encoding
+        self.batch_rows = batch_rows
+        self.rows = 0
+        if bom:
+            self.pending.write(BOM)
+
+    def encode(self, row):
+        '''Encodes the cells of a row.
+
+        Byte strings and integers are left to the csv module, which
+        formats them just as :class:`UnicodeWriter` would. Floats are not,
+        the csv module uses their repr.'''
+        encoding = self.encoding
+        return [cell.encode(encoding) if type(cell) is unicode
+                else cell if type(cell) in PASSTHROUGH
+                else unicode(cell).encode(encoding)
+                for cell in row]
+
+    def writerow(self, row):
+        '''Implements the writerow function as a csv writer would do so.'''
+        self.writer.writerow(self.encode(row))
+        self.rows += 1
+        if self.rows >= self.batch_rows:
+            self.flush()
+
+    def writerows(self, rows):
+        '''Implements the writerows function as a csv writer would do so,
+        handing the csv module a whole batch at a time.'''
+        rows = iter(rows)
+        while True:
+            batch = [self.encode(row)
+                     for row in islice(rows, max(1, self.batch_rows - self.rows))]
+            if not batch:
+                break
+            self.writer.writerows(batch)
+            self.rows += len(batch)
+            if self.rows >= self.batch_rows:
+                self.flush()
+
+    def flush(self):
+        '''Writes the pending rows to the target.'''
+        if self.pending.chunks:
+            self.stream.write(self.pending.drain())
+        self.rows = 0
+
+
+def stream_csv(rows, bom=True, chunk_rows=500, **kwds):
+    '''Generates an encoded CSV file from rows, in chunks of
+    chunk_rows rows, without ever holding the whole file in memory.
+
+    :param rows: An iterable of rows, each an iterable of cells.
+    :param bom: Whether to start the file with a UTF-8 byte order mark.
+    :param chunk_rows: How many rows to put into each chunk.
+    :param kwds: Passed on to the writer, e.g. dialect or delimiter.
+    :rtype: generator of :class:`str`
+    '''
+    stream = ListStream()
+    writer = BatchUnicodeWriter(stream, batch_rows=chunk_rows, bom=bom,
+                                **kwds)
+    for row in rows:
+        writer.writerow(row)
+        if stream.chunks:
+            yield stream.drain()
+    writer.flush()
+    yield stream.drain()
+
+def csv_response(rows, filename, **kwds):
+    '''Returns a response which streams rows to the client as a CSV file
+    attachment, see :func:`stream_csv`.
+
+    :param rows: An iterable of rows, ideally a generator so that the
+                 rows are only built as they are sent.
+    :param filename: The filename the browser should save the file as.
+    :rtype: :class:`StreamingHttpResponse`
+    '''
+    response = StreamingHttpResponse(stream_csv(rows, **kwds),
+                                     mimetype="text/csv")
+    response['Content-Disposition'] = 'attachment;filename=%s' % filename
+    return response
@@ -59,21 +59,22 @@ def listplugins(directory, acc=None): # pragma: no cover
     plugins = {}
     for f in os.listdir(directory):
         # ignore irrelevant files and compiled python modules.
-        if f == "__init__.py" or f == "example.py" or f.endswith(".pyc"):
+        if f == "__init__.py" or f == "example.py" or not f.endswith(".py"):
             continue
-            g = f.replace(".py", "")
-            info = imp.find_module(g, [directory])
-            # dynamically import our module and extract the callback along
-            # with the attributes.
-            m = imp.load_module(g, *info)
-            if acc and acc not in m.ACCOUNTS:
-                continue
-                plugins[m.PLUGIN_NAME] = {
-                    "name": m.PLUGIN_NAME,
-                    "accounts": m.ACCOUNTS,
-                    "callback": getattr(m, m.CALLBACK),
-                    "module": m,
-                }
+        g = f.replace(".py", "")
+        info = imp.find_module(g, [directory])
+        # dynamically import our module and extract the callback along
+        # with the attributes.
+        m = imp.load_module(g, *info)
+        if acc and acc not in m.ACCOUNTS:
+            continue
+        plugins[m.PLUGIN_NAME] = {
+            "name": m.PLUGIN_NAME,
+            "accounts": m.ACCOUNTS,
+            "callback": getattr(m, m.CALLBACK),
+            "version": getattr(m, "API_VERSION", 1),
+            "module": m,
+        }
     return plugins
 
 def createuseractivities():
@@ -49,7 +49,17 @@ class ActivityOffsetAdmin(admin.ModelAdmin):
 class OffsetAdmin(admin.ModelAdmin):
     pass
 
+class UploadJobAdmin(admin.ModelAdmin):
+    """Gives access to the report upload jobs, mostly to look at the ones
+    which have failed. Setting the status of one of them back to Queued
+    runs it again, carrying on after the rows it had inserted.
+    """
+    list_display = ["user", "processor", "status", "rows", "inserted",
+                    "created_on"]
+    list_filter = ["status"]
+
 admin.site.register(models.Activity, ActivityAdmin)
 admin.site.register(models.ActivityEntry, ActivityEntryAdmin)
 admin.site.register(models.ActivityOffset, ActivityOffsetAdmin)
 admin.site.register(models.Offset, OffsetAdmin)
+admin.site.register(models.UploadJob, UploadJobAdmin)
@@ -0,0 +1,91 @@
+'''Cost bucket analytics.
+
+Every activity falls in a cost bucket. An activity can also be given
+offsets through :class:`ActivityOffset`, each of which moves a
+percentage of the activity's time to another cost bucket. Processing
+work with a 20% offset to Quality Internal Failure, for instance, has a
+fifth of its minutes counted as rework.
+
+:func:`costbucket_totals` totals the activity of a team selection for
+a month by cost bucket with one query grouped by activity, and looks up
+the offsets of those activities with another. It gives the number of
+entries, their minutes and the minutes with the offsets applied. An
+offset which is attached to an activity more than once is applied once,
+and offsets which add up to more than 100% are scaled down to share the
+activity's minutes between them. The activity tracked on a day the
+agent was absent is left out, as it is for the utilization.
+'''
+
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from timetracker.vcs.models import ActivityEntry, ActivityOffset, COSTBUCKETS
+from timetracker.vcs.utilization import not_absent
+
+
+def empty_totals():
+    '''The totals of every cost bucket, before anything is counted.
+
+    Cost buckets which aren't one of :data:`COSTBUCKETS` are added as
+    they are found.
+    '''
+    totals = defaultdict(
+        lambda: {"count": 0, "minutes": Decimal(0), "adjusted": Decimal(0)}
+    )
+    for bucket, _ in COSTBUCKETS:
+        totals[bucket]
+    return totals
+
+def costbucket_totals(teams, year=None, month=None):
+    '''Totals the activity of the teams in a month by cost bucket.
+
+    :param teams: A list of market codes.
+    :return: A :class:`dict` of each cost bucket to a :class:`dict` with
+             the number of entries under `count`, their minutes under
+             `minutes` and the minutes with the offsets applied under
+             `adjusted`.
+    '''
+    today = date.today()
+    year = year or today.year
+    month = month or today.month
+
+    where, params = not_absent()
+    rows = list(ActivityEntry.objects.filter(
+        user__market__in=teams,
+        creation_date__year=year,
+        creation_date__month=month
+    ).extra(
+        where=[where],
+        params=params
+    ).values(
+        "activity", "activity__costbucket", "activity__time"
+    ).annotate(count=Count("id"), amount=Sum("amount")).order_by())
+
+    # keyed on the offset, so that one which is attached to an activity
+    # through more than one ActivityOffset is only applied once.
+    offsets = defaultdict(dict)
+    if rows:
+        for activity, offset, percent, bucket in \
+                ActivityOffset.offset.through.objects.filter(
+                    activityoffset__activity__in=[row["activity"]
+                                                  for row in rows]
+                ).values_list("activityoffset__activity", "offset",
+                              "offset__amount", "offset__costbucket"):
+            offsets[activity][offset] = (Decimal(percent), bucket)
+
+    totals = empty_totals()
+    for row in rows:
+        minutes = row["amount"] * row["activity__time"]
+        own = totals[row["activity__costbucket"]]
+        own["count"] += row["count"]
+        own["minutes"] += minutes
+        percents = offsets[row["activity"]].values()
+        offset = sum(percent for percent, _ in percents)
+        scale = Decimal(100) / offset if offset > 100 else 1
+        for percent, bucket in percents:
+            totals[bucket]["adjusted"] += minutes * percent * scale / 100
+        own["adjusted"] += minutes * (100 - min(offset, 100)) / 100
+    return totals
@@ -1,11 +1,11 @@
-from collections import defaultdict, OrderedDict
+from collections import defaultdict
 from datetime import datetime
-from decimal import Decimal
 
 from django.db import models
-from django.core.cache import cache
 
-from timetracker.utils.datemaps import ABSENT_CHOICES, group_for_team
+from timetracker.utils.datemaps import ABSENT_CHOICES
+from timetracker.tracker.cachekeys import invalidate_market
+from timetracker.vcs.uploads import UploadJob
 
 
 COSTBUCKETS = (
@@ -27,6 +27,9 @@ COSTBUCKETS = (
     ('COUAL', 'Cost of Under Utilization Avoidable Loss'),
 )
 
+# the daytypes on which any activity tracked isn't counted.
+ABSENT_DAYTYPES = ["PUABS", "DAYOD"]
+
 
 class Activity(models.Model):
     """Activity encapsulates the idea of a single task for Industrial
@@ -102,36 +105,14 @@ class ActivityEntry(models.Model):
     def __unicode__(self): # pragma: no cover
         return u'%s - %s - %d' % (self.user, self.activity, self.time())
 
-    @staticmethod
-    def filterforyearmonth(teams, year=None, month=None):
-        # to prevent circular imports
-        from timetracker.tracker.models import TrackingEntry
-        if year is None: # pragma: no cover
-            year = datetime.today().year
-        if month is None: # pragma: no cover
-            month = datetime.today().month
-
-        invalidset = defaultdict(list)
-        [invalidset[entry.user.id].append(entry.id)
-         for entry in TrackingEntry.objects.filter(
-                daytype__in=["PUABS", "DAYOD"]
-         ).select_related("user")]
-
-        def invalid(entry): # pragma: no cover
-            return entry.id in invalidset[entry.user.id]
-
-        return ActivityEntry.objects.filter(
-            user__market__in=teams,
-            creation_date__year=year,
-            creation_date__month=month
-        ).select_related("activity", "user"), invalid
-
     @staticmethod
     def costbucket_count(teams, year=None, month=None):
-        entries, _ = ActivityEntry.filterforyearmonth(teams, year, month)
+        # prevent circular imports
+        from timetracker.vcs.costbuckets import costbucket_totals
+
         costbuckets = defaultdict(int)
-        for entry in entries:
-            costbuckets[entry.activity.costbucket] += 1
+        for bucket, totals in costbucket_totals(teams, year, month).items():
+            costbuckets[bucket] = totals["count"]
         return costbuckets
 
     @staticmethod
@@ -141,80 +122,16 @@ class ActivityEntry(models.Model):
         if month is None: # pragma: no cover
             month = datetime.today().month
 
-        cached_result = cache.get("utilization:%s%s%s" % (''.join(teams), year, month))
-        if cached_result: # pragma: no cover
-            return cached_result
-
         # prevent circular imports
-        from timetracker.utils.calendar_utils import working_days
-        from timetracker.tracker.models import Tbluser, TrackingEntry
-
-        entries, invalid = ActivityEntry.filterforyearmonth(teams, year, month)
-        if len(entries) == 0:
-            return {
-                "util": {
-                    "percent": 0,
-                    "target": 65
-                },
-                "effi": {
-                    "percent": 0,
-                    "target": 85
-                },
-                "avai": {
-                    "percent": 0,
-                    "target": 80
-                },
-                "FTE": 0
-            }
-
-        effi, util = (0, 0)
-        users = set()
-        losses = TrackingEntry.objects.filter(user__market__in=teams,
-                                              daytype=["PUABS", "DAYOD", "HOLIS"],
-                                              entry_date__year=year,
-                                              # 460 is a single
-                                              # industrial engineering
-                                              # FTE in Minutes.
-                                              entry_date__month=month).count() * 460
-        for entry in entries:
-            if invalid(entry): # pragma: no cover
-                continue
-            time = entry.amount * entry.activity.time
-            if entry.activity.group != "ALL":
-                util += time
-            else: # pragma: no cover
-                losses += time
-            effi += time
-
-            # so we can see how many FTE's we had during this month.
-            users.add(entry.user)
-
-        available_time = (Tbluser.available_minutes(teams) * len(working_days(year, month)))
-        utilization_percent = (100 * (Decimal(util) / Decimal(available_time)))
-        efficiency_percent = (100 * (Decimal(util) / (Decimal(available_time) - Decimal(losses))))
-        availability_percent = (100 * (Decimal(available_time) - Decimal(losses)) / Decimal(available_time))
-
-        res = {
-            "util": {
-                "percent": utilization_percent,
-                "target": 65
-            },
-            "effi": {
-                "percent": efficiency_percent,
-                "target": 85
-            },
-            "avai": {
-                "percent": availability_percent,
-                "target": 80
-            },
-            "FTE": len(users)
-        }
-        cache.set("utilization:%s%s%s" % (''.join(teams), year, month), res)
-        return res
+        from timetracker.vcs.utilization import utilization
+
+        date = datetime(year=year, month=month, day=1)
+        return utilization(teams, [date])[date]
 
     @staticmethod
     def utilization_last_12_months(teams, year=None, month=None):
         from timetracker.utils.calendar_utils import last12months
+        from timetracker.vcs.utilization import utilization
 
         if year is None: # pragma: no cover
             year = datetime.today().year
@@ -222,12 +139,7 @@ class ActivityEntry(models.Model):
             month = datetime.today().month
 
         dates = last12months(year, month)
-        utilization = OrderedDict()
-        for date in dates:
-            utilization[date] = ActivityEntry.utilization_calculation(
-                teams, date.year, date.month
-            )
-        return utilization, dates
+        return utilization(teams, dates), dates
 
     @staticmethod
     def activity_volumes(teams, year=None, month=None, activity=None):
@@ -236,22 +148,16 @@ class ActivityEntry(models.Model):
         if month is None: # pragma: no cover
             month = datetime.today().month
 
-        cached_result = cache.get("activity_volumes:%s%s%s%s" % (''.join(teams), year, month, activity))
-        if cached_result: # pragma: no cover
-            return int(cached_result)
+        # prevent circular imports
+        from timetracker.vcs.volumes import volume_series
 
-        res = sum(map(lambda e: e.amount, ActivityEntry.objects.filter(
-            user__market__in=teams,
-            activity=activity,
-            creation_date__year=year,
-            creation_date__month=month
-        )))
-        cache.set("activity_volumes:%s%s%s%s" % (''.join(teams), year, month, activity), str(res))
-        return res
+        _, series = volume_series(teams, [activity],
+                                  datetime(year=year, month=month, day=1), 1)
+        return series[int(activity)][0]
 
     @staticmethod
     def activity_volumes_last_12_months(teams, year=None, month=None, activity=None):
-        from timetracker.utils.calendar_utils import last12months
+        from timetracker.vcs.volumes import volume_series
         if activity is None:
             return [0 for _ in range(12)]
 
@@ -260,27 +166,23 @@ class ActivityEntry(models.Model):
         if month is None: # pragma: no cover
             month = datetime.today().month
 
-        dates = last12months(year, month)
-        return (
-            ActivityEntry.activity_volumes(teams, date.year, date.month, activity) \
-            for date in dates
-        )
+        _, series = volume_series(teams, [activity],
+                                  datetime(year=year, month=month, day=1), 12)
+        return series[int(activity)]
+
+    def invalidate_caches(self):
+        '''Clears what is cached from the activity of the market.'''
+        invalidate_market(self.user.market)
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        cache.delete(
-            "activity_volumes:%s%s%s%s" % (''.join(group_for_team(self.user.market)),
-                                           self.creation_date.year,
-                                           self.creation_date.month,
-                                           self.activity.id)
-        )
-        cache.delete(
-            "utilization:%s%s%s" % (''.join(group_for_team(self.user.market)),
-                                    self.creation_date.year,
-                                    self.creation_date.month)
-        )
+        self.invalidate_caches()
         super(ActivityEntry, self).save(*args, **kwargs)
 
+    def delete(self, *args, **kwargs):
+        self.invalidate_caches()
+        super(ActivityEntry, self).delete(*args, **kwargs)
+
     class Meta:
         verbose_name_plural = "Activity Entries"
 
@@ -24,6 +24,17 @@ The name of the function which provides this plugin's functionality.
 
 The pretty-printed name of this plugin, this will be displayed to the
 user so ensure that it is understandable what this report is and does.
+
+It MAY contain:
+
+* API_VERSION
+
+The version of the interface the callback follows. Version 1, the
+default, returns a dictionary with `success` and either `data` or
+`error` for the whole report. Version 2 yields the activity entries of
+the report a row at a time, as dictionaries of the fields of an
+ActivityEntry, which are inserted in batches as they come. See
+timetracker.vcs.uploads.
 '''
 
 ACCOUNTS = ["PW", "QR", "TT"]
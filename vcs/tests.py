@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import datetime
 import simplejson
 from decimal import Decimal
@@ -6,15 +9,27 @@ from django.http import Http404, HttpResponseRedirect
 from django.test import TestCase
 from django.test.client import Client
 from django.core.urlresolvers import reverse
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import Sum
+from django.test.utils import override_settings
+from django.utils import timezone
 
 from timetracker.utils.datemaps import MARKET_CHOICES_LIST
 
 from timetracker.tests.basetests import create_users, delete_users, login
-from timetracker.vcs.models import Activity, ActivityEntry
+from timetracker.vcs.models import (Activity, ActivityEntry, Offset,
+                                     ActivityOffset)
+from timetracker.vcs.costbuckets import costbucket_totals
 from timetracker.vcs.activities import createuseractivities
-from timetracker.vcs.views import vcs_add, update
+from timetracker.vcs.views import vcs_add, update, upload_status
+from timetracker.vcs.uploads import (UploadJob, queue_upload, run_job,
+                                     run_upload_jobs, claim_jobs, JOB_TIMEOUT)
+from timetracker.vcs.volumes import volume_series
+from timetracker.vcs.utilization import empty_result, not_absent
 
-from timetracker.tracker.models import Tbluser
+from timetracker.tracker.models import Tbluser, TrackingEntry
+from timetracker.tracker.cachekeys import market_generation_key, generations
 
 
 class BaseVCS(TestCase):
@@ -142,66 +157,50 @@ class VCSUpdateTestCase(BaseVCS):
 
 class VCSActivityEntryTestCase(BaseVCS):
 
-    def test_filterforyearmonth(self):
-        td = datetime.timedelta(days=999)
-        ActivityEntry.objects.create(
-            user=self.linked_user,
-            activity=Activity.objects.all()[0],
-            amount=1,
-            creation_date=datetime.datetime.today() + td
-        ).save()
-        ActivityEntry.objects.create(
-            user=self.linked_user,
-            activity=Activity.objects.all()[0],
-            amount=1,
-            creation_date=datetime.datetime.today() + td
-        ).save()
-        ActivityEntry.objects.create(
-            user=self.linked_user,
-            activity=Activity.objects.all()[0],
-            amount=1,
-            creation_date=datetime.datetime.today() + td
-        ).save()
-        ActivityEntry.objects.create(
-            user=self.linked_user,
-            activity=Activity.objects.all()[0],
-            amount=1,
-            creation_date=datetime.datetime.today() + td
-        ).save()
-        entries, _ = ActivityEntry.filterforyearmonth(
-            [self.linked_user.market],
-            year=(datetime.datetime.today() + td).year,
-            month=(datetime.datetime.today() + td).month
-        )
-        self.assertEqual(4, entries.count())
+    def test_not_absent(self):
+        activity = Activity.objects.all()[0]
+        for user in (self.linked_user, self.linked_manager):
+            for day in (9, 10, 11):
+                ActivityEntry.objects.create(
+                    user=user,
+                    activity=activity,
+                    amount=1,
+                    creation_date=datetime.date(2032, 2, day)
+                )
+        for daytype, date in (("DAYOD", "2032-02-10"),
+                              ("PUABS", "2032-02-11"),
+                              # a holiday isn't a day off, nor is a day
+                              # off in another month.
+                              ("HOLIS", "2032-02-09"),
+                              ("DAYOD", "2032-03-09")):
+            TrackingEntry(
+                entry_date=date,
+                user_id=self.linked_user.id,
+                start_time="00:00:00",
+                end_time="00:00:00",
+                breaks="00:00:00",
+                daytype=daytype,
+            ).save()
 
-    def test_filternoyearmonth(self):
-        ActivityEntry.objects.create(
-            user=self.linked_user,
-            activity=Activity.objects.all()[0],
-            amount=1,
-            creation_date=datetime.datetime.today()
-        ).save()
-        ActivityEntry.objects.create(
-            user=self.linked_user,
-            activity=Activity.objects.all()[0],
-            amount=1,
-            creation_date=datetime.datetime.today()
-        ).save()
-        ActivityEntry.objects.create(
-            user=self.linked_user,
-            activity=Activity.objects.all()[0],
-            amount=1,
-            creation_date=datetime.datetime.today()
-        ).save()
-        ActivityEntry.objects.create(
-            user=self.linked_user,
-            activity=Activity.objects.all()[0],
-            amount=1,
-            creation_date=datetime.datetime.today()
-        ).save()
-        entries, _ = ActivityEntry.filterforyearmonth([self.linked_user.market])
-        self.assertEqual(4, entries.count())
+        where, params = not_absent()
+        valid = ActivityEntry.objects.filter(
+            creation_date__year=2032,
+            creation_date__month=2
+        ).extra(where=[where], params=params).values_list(
+            "user_id", "creation_date"
+        )
+        self.assertEqual(sorted(valid), sorted([
+            (self.linked_user.id, datetime.date(2032, 2, 9)),
+            (self.linked_manager.id, datetime.date(2032, 2, 9)),
+            (self.linked_manager.id, datetime.date(2032, 2, 10)),
+            (self.linked_manager.id, datetime.date(2032, 2, 11)),
+        ]))
+        self.assertEqual(
+            costbucket_totals([self.linked_user.market], 2032, 2)[
+                activity.costbucket
+            ]["count"],
+            4
+        )
 
     def test_costbucket_count(self):
         ActivityEntry.objects.create(
@@ -230,6 +229,88 @@ class VCSActivityEntryTestCase(BaseVCS):
         ).save()
         self.assertEquals(ActivityEntry.costbucket_count(MARKET_CHOICES_LIST)[''], 4)
 
+    def test_costbucket_totals(self):
+        processing = Activity.objects.create(
+            group="TEST", grouptype="test", groupdetail="processing",
+            details="test", disabled=False, time=Decimal("2.00"),
+            costbucket="PVA"
+        )
+        rework = Activity.objects.create(
+            group="TEST", grouptype="test", groupdetail="rework",
+            details="test", disabled=False, time=Decimal("1.50"),
+            costbucket="QIFRC"
+        )
+        offsets = ActivityOffset.objects.create(activity=processing)
+        offsets.offset.add(Offset.objects.create(amount=20, costbucket="QIFRC"),
+                           Offset.objects.create(amount=10, costbucket="PVE"))
+        for activity, amount, day in ((processing, 10, 3), (processing, 20, 4),
+                                      (rework, 4, 3), (rework, 6, 5)):
+            ActivityEntry.objects.create(
+                user=self.linked_user,
+                activity=activity,
+                amount=amount,
+                creation_date=datetime.date(2034, 5, day)
+            )
+        # the activity of a day off isn't counted.
+        TrackingEntry(
+            entry_date="2034-05-05",
+            user_id=self.linked_user.id,
+            start_time="00:00:00",
+            end_time="00:00:00",
+            breaks="00:00:00",
+            daytype="DAYOD",
+        ).save()
+
+        with self.assertNumQueries(2):
+            totals = costbucket_totals(["BG"], 2034, 5)
+        self.assertEqual(totals["PVA"], {
+            "count": 2, "minutes": Decimal(60), "adjusted": Decimal(42)
+        })
+        self.assertEqual(totals["QIFRC"], {
+            "count": 1, "minutes": Decimal(6), "adjusted": Decimal(18)
+        })
+        self.assertEqual(totals["PVE"], {
+            "count": 0, "minutes": Decimal(0), "adjusted": Decimal(6)
+        })
+        self.assertEqual(totals["COUAL"]["count"], 0)
+        self.assertEqual(
+            ActivityEntry.costbucket_count(["BG"], 2034, 5)["PVA"], 2
+        )
+
+    def test_costbucket_totals_offsets(self):
+        processing = Activity.objects.create(
+            group="TEST", grouptype="test", groupdetail="processing",
+            details="test", disabled=False, time=Decimal("2.00"),
+            costbucket="PVA"
+        )
+        rework = Offset.objects.create(amount=20, costbucket="QIFRC")
+        # the same offset through two ActivityOffsets is applied once.
+        for _ in range(2):
+            ActivityOffset.objects.create(
+                activity=processing
+            ).offset.add(rework)
+        for amount, day in ((10, 3), (20, 4)):
+            ActivityEntry.objects.create(
+                user=self.linked_user,
+                activity=processing,
+                amount=amount,
+                creation_date=datetime.date(2034, 6, day)
+            )
+        totals = costbucket_totals(["BG"], 2034, 6)
+        self.assertEqual(totals["PVA"], {
+            "count": 2, "minutes": Decimal(60), "adjusted": Decimal(48)
+        })
+        self.assertEqual(totals["QIFRC"]["adjusted"], Decimal(12))
+
+        # offsets over 100% share the minutes rather than going negative.
+        ActivityOffset.objects.create(activity=processing).offset.add(
+            Offset.objects.create(amount=180, costbucket="PVE")
+        )
+        totals = costbucket_totals(["BG"], 2034, 6)
+        self.assertEqual(totals["PVA"]["adjusted"], 0)
+        self.assertEqual(totals["QIFRC"]["adjusted"], Decimal(6))
+        self.assertEqual(totals["PVE"]["adjusted"], Decimal(54))
+
     def test_utilization(self):
         ActivityEntry.objects.create(
             user=self.linked_user,
@@ -272,6 +353,333 @@ class VCSActivityEntryTestCase(BaseVCS):
                               'FTE': 1
                           })
 
+    def test_utilization_last_12_months(self):
+        cache.clear()
+        activity = Activity.objects.all()[0]
+        for day in (2, 3, 4):
+            ActivityEntry.objects.create(
+                user=self.linked_user,
+                activity=activity,
+                amount=10,
+                creation_date=datetime.date(2031, 1, day)
+            )
+        ActivityEntry.objects.create(
+            user=self.linked_manager,
+            activity=activity,
+            amount=5,
+            creation_date=datetime.date(2031, 3, 3)
+        )
+        with self.assertNumQueries(4):
+            utilization, dates = ActivityEntry.utilization_last_12_months(
+                ["BG"], 2031, 3
+            )
+        self.assertEqual(len(utilization), 12)
+        self.assertEqual(utilization.keys(), dates)
+        self.assertEqual(utilization[datetime.datetime(2031, 1, 1)]["FTE"], 1)
+        self.assertEqual(utilization[datetime.datetime(2031, 2, 1)]["FTE"], 0)
+        self.assertEqual(utilization[datetime.datetime(2031, 3, 1)]["FTE"], 1)
+
+        # each month is the same as when it is calculated on its own.
+        cache.clear()
+        for date in dates:
+            self.assertEqual(
+                utilization[date],
+                ActivityEntry.utilization_calculation(
+                    ["BG"], date.year, date.month
+                )
+            )
+        # and is then returned from the cache, the months without any
+        # activity are looked for again.
+        with self.assertNumQueries(2):
+            ActivityEntry.utilization_last_12_months(["BG"], 2031, 3)
+
+    def test_utilization_absences(self):
+        cache.clear()
+        activity = Activity.objects.all()[0]
+        for day in (6, 7):
+            ActivityEntry.objects.create(
+                user=self.linked_user,
+                activity=activity,
+                amount=10,
+                creation_date=datetime.date(2031, 1, day)
+            )
+        before = ActivityEntry.utilization_calculation(["BG"], 2031, 1)
+
+        # a day off is a loss of available time and the activity tracked
+        # on it isn't counted.
+        TrackingEntry(
+            entry_date="2031-01-07",
+            user_id=self.linked_user.id,
+            start_time="00:00:00",
+            end_time="00:00:00",
+            breaks="00:00:00",
+            daytype="DAYOD",
+        ).save()
+        after = ActivityEntry.utilization_calculation(["BG"], 2031, 1)
+        self.assertEqual(after["util"]["percent"],
+                         before["util"]["percent"] / 2)
+        self.assertTrue(after["avai"]["percent"] < 100)
+        self.assertEqual(after["FTE"], 1)
+
+    def test_utilization_invalidated(self):
+        cache.clear()
+        activity = Activity.objects.all()[0]
+        entry = ActivityEntry.objects.create(
+            user=self.linked_user,
+            activity=activity,
+            amount=10,
+            creation_date=datetime.date(2031, 5, 6)
+        )
+        before = ActivityEntry.utilization_calculation(
+            MARKET_CHOICES_LIST, 2031, 5
+        )
+        # every selection the market is in is recalculated, not only
+        # the market's own team.
+        second = ActivityEntry.objects.create(
+            user=self.linked_user,
+            activity=activity,
+            amount=10,
+            creation_date=datetime.date(2031, 5, 7)
+        )
+        self.assertAlmostEqual(
+            ActivityEntry.utilization_calculation(
+                MARKET_CHOICES_LIST, 2031, 5
+            )["util"]["percent"],
+            before["util"]["percent"] * 2
+        )
+        second.delete()
+        self.assertEqual(
+            ActivityEntry.utilization_calculation(MARKET_CHOICES_LIST, 2031, 5),
+            before
+        )
+        tracking = TrackingEntry(
+            entry_date="2031-05-06",
+            user_id=self.linked_user.id,
+            start_time="00:00:00",
+            end_time="00:00:00",
+            breaks="00:00:00",
+            daytype="DAYOD",
+        )
+        tracking.save()
+        self.assertEqual(
+            ActivityEntry.utilization_calculation(
+                MARKET_CHOICES_LIST, 2031, 5
+            ),
+            empty_result()
+        )
+        tracking.delete()
+        self.assertEqual(
+            ActivityEntry.utilization_calculation(MARKET_CHOICES_LIST, 2031, 5),
+            before
+        )
+
+        # a working day doesn't change the utilization, the market's
+        # caches are kept.
+        key = market_generation_key(self.linked_user.market)
+        generation = generations([key])[key]
+        TrackingEntry(
+            entry_date="2031-05-07",
+            user_id=self.linked_user.id,
+            start_time="09:00:00",
+            end_time="17:00:00",
+            breaks="00:15:00",
+            daytype="WKDAY",
+        ).save()
+        self.assertEqual(generations([key])[key], generation)
+
+    def test_volume_series(self):
+        first, second = Activity.objects.all()[:2]
+        for activity, amount, day in ((first, 3, datetime.date(2033, 3, 1)),
+                                      (first, 4, datetime.date(2033, 3, 2)),
+                                      (first, 5, datetime.date(2033, 3, 8)),
+                                      (second, 7, datetime.date(2033, 1, 31)),
+                                      # outside of the windows.
+                                      (first, 9, datetime.date(2032, 3, 31))):
+            ActivityEntry.objects.create(
+                user=self.linked_user,
+                activity=activity,
+                amount=amount,
+                creation_date=day
+            )
+        end = datetime.date(2033, 3, 10)
+        with self.assertNumQueries(1):
+            dates, series = volume_series(["BG"], [first, second.id], end)
+        self.assertEqual(dates[0], datetime.date(2032, 4, 1))
+        self.assertEqual(dates[-1], datetime.date(2033, 3, 1))
+        self.assertEqual(series[first.id], [0] * 11 + [12])
+        self.assertEqual(series[second.id], [0] * 9 + [7, 0, 0])
+        # the window is cached as a whole.
+        with self.assertNumQueries(0):
+            volume_series(["BG"], [first, second.id], end)
+
+        dates, series = volume_series(["BG"], [first], end, 3, "weeks")
+        self.assertEqual(dates, [datetime.date(2033, 2, 21),
+                                 datetime.date(2033, 2, 28),
+                                 datetime.date(2033, 3, 7)])
+        self.assertEqual(series[first.id], [0, 7, 5])
+        dates, series = volume_series(["BG"], [first], end, 10, "days")
+        self.assertEqual(series[first.id], [3, 4, 0, 0, 0, 0, 0, 5, 0, 0])
+        self.assertEqual(volume_series(["CZ"], [first], end)[1][first.id],
+                         [0] * 12)
+
+        # a new entry moves the windows of its market on.
+        ActivityEntry.objects.create(
+            user=self.linked_user,
+            activity=first,
+            amount=1,
+            creation_date=datetime.date(2033, 3, 3)
+        )
+        self.assertEqual(
+            ActivityEntry.activity_volumes_last_12_months(
+                MARKET_CHOICES_LIST, 2033, 3, activity=str(first.id)
+            ),
+            [0] * 11 + [13]
+        )
+        self.assertEqual(
+            ActivityEntry.activity_volumes(["BG"], 2033, 3, first.id), 13
+        )
+
+ROWS_PLUGIN = """
+ACCOUNTS = ["BG"]
+CALLBACK = "main"
+PLUGIN_NAME = "Rows test plugin"
+API_VERSION = 2
+
+def main(f):
+    for line in f:
+        user_id, activity_id, amount, date = line.strip().split(",")
+        yield {"user_id": int(user_id), "activity_id": int(activity_id),
+               "amount": amount, "creation_date": date}
+"""
+
+DICT_PLUGIN = """
+ACCOUNTS = ["BG"]
+CALLBACK = "main"
+PLUGIN_NAME = "Dict test plugin"
+
+def main(f):
+    return {"success": True, "data": len(f.read())}
+"""
+
+class VCSUploadTestCase(BaseVCS):
+
+    def setUp(self):
+        super(VCSUploadTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        for name, source in (("rows_test_plugin", ROWS_PLUGIN),
+                             ("dict_test_plugin", DICT_PLUGIN)):
+            with open(os.path.join(self.directory, name + ".py"), "w") as f:
+                f.write(source)
+        self.settings = override_settings(PLUGIN_DIRECTORY=self.directory)
+        self.settings.enable()
+        self.activity = Activity.objects.all()[0]
+
+    def tearDown(self):
+        self.settings.disable()
+        for job in UploadJob.objects.exclude(upload=""):
+            job.upload.delete(save=False)
+        UploadJob.objects.all().delete()
+        shutil.rmtree(self.directory)
+
+    def queue(self, processor, lines):
+        return queue_upload(self.linked_user, processor, SimpleUploadedFile(
+            "volumes.csv", "".join(
+                "%s,%s,%s,2035-06-%02d\n" % line for line in lines
+            )
+        ))
+
+    def test_upload_rows(self):
+        job = self.queue("Rows test plugin", [
+            (self.linked_user.id, self.activity.id, day, day)
+            for day in range(1, 6)
+        ])
+        self.req.GET = {"id": str(job.id)}
+        self.assertEqual(simplejson.loads(upload_status(self.req).content)
+                         ["status"], "QUEUED")
+
+        jobs = run_upload_jobs(threads=1)
+        self.assertEqual([job.id for job in jobs], [job.id])
+        self.assertEqual(simplejson.loads(upload_status(self.req).content), {
+            "id": job.id,
+            "status": "DONE",
+            "rows": 5,
+            "inserted": 5,
+            "message": "Inserted 5 activity entries",
+        })
+        self.assertEqual(ActivityEntry.objects.filter(
+            creation_date__year=2035
+        ).aggregate(amount=Sum("amount"))["amount"], 15)
+        # the upload is removed once it has been processed.
+        self.assertEqual(UploadJob.objects.get(id=job.id).upload.name, "")
+        # and the job isn't run again.
+        self.assertEqual(run_upload_jobs(threads=1), [])
+
+    def test_upload_rows_failure(self):
+        job = self.queue("Rows test plugin", [
+            (self.linked_user.id, self.activity.id, 1, 1),
+            (self.linked_user.id, self.activity.id, 2, 2),
+            (self.linked_user.id, -1, 3, 3),
+            (self.linked_user.id, self.activity.id, 4, 4),
+        ])
+        job = run_job(job, batch_size=2)
+        self.assertEqual(job.status, "FAILED")
+        self.assertEqual(
+            job.message,
+            "Row 3: Unknown activity_id -1 (2 entries had been inserted)"
+        )
+        self.assertEqual(UploadJob.objects.get(id=job.id).inserted, 2)
+        self.assertEqual(ActivityEntry.objects.filter(
+            creation_date__year=2035
+        ).count(), 2)
+
+    def test_upload_rows_rerun(self):
+        job = self.queue("Rows test plugin", [
+            (self.linked_user.id, self.activity.id, 1, 1),
+            (self.linked_user.id, self.activity.id, 2, 2),
+            (self.linked_user.id, 9999, 3, 3),
+            (self.linked_user.id, self.activity.id, 4, 4),
+        ])
+        self.assertEqual(run_job(job, batch_size=2).status, "FAILED")
+        Activity.objects.create(
+            id=9999, group="TEST", grouptype="test", groupdetail="rerun",
+            details="test", disabled=False, time=Decimal("1.00"),
+            costbucket="PVA"
+        )
+        # queued again from the admin, the rows already inserted are
+        # skipped.
+        UploadJob.objects.filter(id=job.id).update(status="QUEUED")
+        job = run_job(UploadJob.objects.get(id=job.id), batch_size=2)
+        self.assertEqual((job.status, job.rows, job.inserted),
+                         ("DONE", 4, 4))
+        self.assertEqual(sorted(ActivityEntry.objects.filter(
+            creation_date__year=2035
+        ).values_list("amount", flat=True)), [1, 2, 3, 4])
+
+    def test_stalled_jobs(self):
+        job = self.queue("Rows test plugin", [
+            (self.linked_user.id, self.activity.id, 1, 1),
+        ])
+        now = timezone.now()
+        self.assertEqual([job.id for job in claim_jobs(10, now)], [job.id])
+        self.assertEqual(UploadJob.objects.get(id=job.id).started_on, now)
+        # the worker died, the job is left running until it times out.
+        self.assertEqual(claim_jobs(10, now + JOB_TIMEOUT), [])
+        self.assertEqual(
+            [job.id for job in claim_jobs(10, now + JOB_TIMEOUT
+                                          + datetime.timedelta(seconds=1))],
+            [job.id]
+        )
+
+    def test_upload_dict(self):
+        job = run_job(self.queue("Dict test plugin", [(1, 2, 3, 4)]))
+        self.assertEqual(job.status, "DONE")
+        self.assertEqual(job.message, "Done! 17")
+
+    def test_upload_unknown_processor(self):
+        job = run_job(self.queue("Missing plugin", []))
+        self.assertEqual(job.status, "FAILED")
+        self.assertEqual(job.message, "Unknown processor: Missing plugin")
+
 class VCSFrontEndTestCase(BaseVCS):
       def test_activityfailure_noid(self):
           user = Tbluser.objects.all()[0]
@@ -0,0 +1,286 @@
+'''The report upload jobs.
+
+A volume report used to be handed to its report processor plugin while
+the upload request was being handled, which kept the request waiting
+for the whole report to be parsed and timed out on large reports. The
+upload is now stored with an :class:`UploadJob` and the request returns
+straight away. The run_upload_jobs management command runs the queued
+jobs with a pool of worker threads, and the progress of a job can be
+polled from the upload_status view.
+
+Plugins which set ``API_VERSION = 2`` have a callback which yields the
+activity entries of the report a row at a time, each as a :class:`dict`
+of the fields of an :class:`ActivityEntry`::
+
+    {"user_id": 12, "activity_id": 3, "amount": 20,
+     "creation_date": datetime.date(2013, 11, 4)}
+
+The rows are checked and inserted in batches of
+:data:`BATCH_SIZE`, so that a report is never held in memory as a
+whole. Each batch is committed on its own and the job counts the rows
+it has been through, so a job which failed part way, and is queued
+again, carries on after the rows whose entries were already inserted.
+The callbacks of older plugins return one :class:`dict` for the
+whole report, with `success` and either `data` or `error`, and are
+still run in the same way, only in a worker.
+'''
+
+import os
+import datetime
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+from django.db import models, transaction, connection
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+from timetracker.loggers import error_log
+from timetracker.tracker.cachekeys import invalidate_market
+
+# the plugins which yield rows rather than returning a dict.
+ROWS_API_VERSION = 2
+# how many activity entries are inserted at once.
+BATCH_SIZE = getattr(settings, "VCS_UPLOAD_BATCH_SIZE", 500)
+# how long a job may run before it is taken to have died with its worker.
+JOB_TIMEOUT = datetime.timedelta(
+    seconds=getattr(settings, "VCS_UPLOAD_TIMEOUT", 60 * 60)
+)
+
+UPLOAD_STORAGE = FileSystemStorage(location=getattr(
+    settings, "VCS_UPLOAD_DIRECTORY",
+    os.path.join(tempfile.gettempdir(), "timetracker_uploads")
+))
+
+JOB_STATUS = (
+    ("QUEUED", "Queued"),
+    ("RUNNING", "Running"),
+    ("DONE", "Done"),
+    ("FAILED", "Failed"),
+)
+
+
+class UploadJob(models.Model):
+
+    '''A volume report waiting to be, or being, processed by a plugin.'''
+
+    user = models.ForeignKey('tracker.Tbluser', related_name="upload_jobs")
+    processor = models.CharField(max_length=255)
+    upload = models.FileField(upload_to="reports", storage=UPLOAD_STORAGE)
+    status = models.CharField(max_length=7, choices=JOB_STATUS,
+                              default="QUEUED", db_index=True)
+    # the rows the plugin has produced and the entries inserted from them.
+    rows = models.IntegerField(default=0)
+    inserted = models.IntegerField(default=0)
+    message = models.TextField(blank=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+    started_on = models.DateTimeField(null=True, blank=True)
+    finished_on = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        '''
+        Metaclass gives access to additional options
+        '''
+        verbose_name = 'Upload Job'
+        verbose_name_plural = 'Upload Jobs'
+        ordering = ['id']
+
+    def __unicode__(self): # pragma: no cover
+        return u'%s - %s - %s' % (self.user, self.processor, self.status)
+
+    def progress(self):
+        '''The status of the job, as the upload_status view returns it.'''
+        return {
+            "id": self.id,
+            "status": self.status,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "message": self.message,
+        }
+
+    def update(self, **kwargs):
+        '''Sets fields on the job and writes only those to the database,
+        so that the progress can be polled while the job runs.'''
+        for field, value in kwargs.items():
+            setattr(self, field, value)
+        UploadJob.objects.filter(id=self.id).update(**kwargs)
+
+
+def queue_upload(user, processor, upload):
+    '''Stores an uploaded report and queues it to be processed.
+
+    :param upload: The :class:`UploadedFile` of the report.
+    :rtype: :class:`UploadJob`
+    '''
+    job = UploadJob(user=user, processor=processor)
+    job.upload.save(os.path.basename(upload.name), upload, save=False)
+    job.save()
+    return job
+
+def check_rows(rows, known):
+    '''Builds the activity entries of a batch of rows.
+
+    The users and activities are looked up a batch at a time, those
+    which have been found are remembered in known.
+
+    :raises: :class:`ValidationError` naming the first bad row.
+    '''
+    # to avoid circular import dependencies
+    from timetracker.tracker.models import Tbluser
+    from timetracker.vcs.models import ActivityEntry, Activity
+
+    entries = []
+    for number, row in rows:
+        try:
+            entry = ActivityEntry(**row)
+            entry.clean_fields(exclude=["user", "activity"])
+        except (TypeError, ValueError, ValidationError) as error:
+            raise ValidationError("Row %d: %s" % (
+                number, "; ".join(getattr(error, "messages", [str(error)]))
+            ))
+        entries.append((number, entry))
+
+    for field, model in (("user_id", Tbluser), ("activity_id", Activity)):
+        wanted = set(getattr(entry, field) for _, entry in entries)
+        wanted -= known[field]
+        known[field].update(
+            model.objects.filter(id__in=wanted).values_list("id", flat=True)
+        )
+        for number, entry in entries:
+            if getattr(entry, field) not in known[field]:
+                raise ValidationError("Row %d: Unknown %s %s" % (
+                    number, field, getattr(entry, field)
+                ))
+    return [entry for _, entry in entries]
+
+def insert_batch(job, rows, known):
+    '''Inserts a batch of rows and clears the caches of what they
+    change.'''
+    # to avoid circular import dependencies
+    from timetracker.tracker.models import Tbluser
+    from timetracker.vcs.models import ActivityEntry
+
+    entries = check_rows(rows, known)
+    with transaction.commit_on_success():
+        ActivityEntry.objects.bulk_create(entries)
+    markets = dict(Tbluser.objects.filter(
+        id__in=set(entry.user_id for entry in entries)
+    ).values_list("id", "market"))
+    for market in set(markets.values()):
+        invalidate_market(market)
+    job.update(rows=rows[-1][0], inserted=job.inserted + len(entries))
+
+def run_rows(job, callback, fd, batch_size):
+    '''Runs a plugin which yields rows, inserting them in batches.
+
+    The rows which an earlier run of the job went through are skipped.
+    '''
+    known = {"user_id": set(), "activity_id": set()}
+    batch = []
+    number = done = job.rows
+    for number, row in enumerate(callback(fd), 1):
+        if number <= done:
+            continue
+        batch.append((number, row))
+        if len(batch) == batch_size:
+            insert_batch(job, batch, known)
+            batch = []
+    if batch:
+        insert_batch(job, batch, known)
+    job.update(rows=number)
+    return "Inserted %d activity entries" % job.inserted
+
+def run_job(job, batch_size=BATCH_SIZE):
+    '''Runs the plugin of a job over its upload.
+
+    A job which fails is kept with the error, along with its upload. The
+    batches inserted before the error are kept, the message says how
+    many entries that was.
+
+    :rtype: :class:`UploadJob`
+    '''
+    # to avoid circular import dependencies
+    from timetracker.vcs.activities import pluginbyname
+
+    job.update(status="RUNNING", started_on=timezone.now())
+    processor = pluginbyname(job.processor, acc=job.user.market)
+    try:
+        if not processor:
+            raise ValidationError("Unknown processor: %s" % job.processor)
+        job.upload.open("rb")
+        try:
+            if processor["version"] >= ROWS_API_VERSION:
+                message = run_rows(job, processor["callback"], job.upload,
+                                   batch_size)
+            else:
+                result = processor["callback"](job.upload)
+                if not result["success"]:
+                    raise ValidationError(result["error"])
+                message = "Done! %s" % result["data"]
+        finally:
+            job.upload.close()
+    except Exception as error:
+        if not isinstance(error, ValidationError):
+            error_log.error("Upload job %d failed: %r" % (job.id, error))
+        message = "; ".join(getattr(error, "messages", [repr(error)]))
+        if job.inserted:
+            message += " (%d entries had been inserted)" % job.inserted
+        job.update(status="FAILED", message=message,
+                   finished_on=timezone.now())
+        return job
+    job.upload.delete(save=False)
+    job.update(status="DONE", message=message, upload="",
+               finished_on=timezone.now())
+    return job
+
+def requeue_stalled(now):
+    '''Queues the jobs which have been running for longer than
+    :data:`JOB_TIMEOUT` again, their worker is taken to have died.
+
+    :return: The number of jobs queued again.
+    '''
+    return UploadJob.objects.filter(
+        models.Q(started_on__lt=now - JOB_TIMEOUT) |
+        models.Q(started_on__isnull=True),
+        status="RUNNING"
+    ).update(status="QUEUED")
+
+def claim_jobs(limit, now=None):
+    '''Marks up to limit queued jobs as running for this worker.
+
+    A job which another worker claims in the meantime is skipped. The
+    jobs whose worker has died are queued again first.
+    '''
+    now = now or timezone.now()
+    requeue_stalled(now)
+    claimed = []
+    for job in UploadJob.objects.filter(status="QUEUED")[:limit]:
+        if UploadJob.objects.filter(id=job.id, status="QUEUED").update(
+                status="RUNNING", started_on=now):
+            job.status = "RUNNING"
+            job.started_on = now
+            claimed.append(job)
+    return claimed
+
+def run_in_thread(job):
+    '''Runs a job in a worker thread, which has its own connection.'''
+    try:
+        return run_job(job)
+    finally:
+        connection.close()
+
+def run_upload_jobs(limit=10, threads=4):
+    '''Runs the queued jobs, each in a thread of a pool.
+
+    :return: The jobs which were run.
+    '''
+    jobs = claim_jobs(limit)
+    if threads > 1 and len(jobs) > 1:
+        pool = ThreadPool(min(threads, len(jobs)))
+        try:
+            return pool.map(run_in_thread, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    return map(run_job, jobs)
@@ -11,4 +11,5 @@ urlpatterns = patterns('',
                        (r'entries', views.entries),
                        (r'update', views.update),
                        (r'report_upload', views.report_upload),
+                       (r'upload_status', views.upload_status),
 )
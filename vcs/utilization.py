@@ -0,0 +1,237 @@
+'''The utilization engine.
+
+The utilization of a team selection used to be calculated a month at a
+time, walking every activity entry of the month in Python, so the last
+12 months on the utilization report took a dozen full scans of the
+activity entries and the users. :func:`monthly_utilization` works out
+any number of months together with one grouped query per source table:
+
+* the activity minutes by month and activity group, and the agents who
+  were active in each month, from the activity entries,
+* the absences by month, from the tracking entries,
+* the FTE of the team selection, from the users.
+
+Activity tracked by an agent on a day they were absent is left out by
+the database, see :func:`not_absent`. The results are the
+same `util`, `effi`, `avai` and `FTE` dictionaries as before and are
+cached a month at a time. The keys carry the generation of each of the
+markets, see :mod:`timetracker.tracker.cachekeys`, which the activity
+entries and the tracking entries move on as they are saved or deleted.
+'''
+
+import calendar
+from collections import defaultdict, OrderedDict
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Count, Sum
+from django.core.cache import cache
+
+from timetracker.loggers import cache_log
+from timetracker.tracker.cachekeys import make_key, market_key
+from timetracker.vcs.models import ActivityEntry, ABSENT_DAYTYPES
+
+# a single industrial engineering FTE in minutes.
+FTE_MINUTES = 460
+# the daytypes which are counted as a loss of available time.
+LOSS_DAYTYPES = ["PUABS", "DAYOD", "HOLIS"]
+
+TARGETS = {
+    "util": 65,
+    "effi": 85,
+    "avai": 80,
+}
+
+
+def changes_utilization(*daytypes):
+    '''Whether tracking a day with one of the daytypes, or no longer
+    tracking it, changes the utilization of the agent's market.'''
+    return not set(daytypes).isdisjoint(LOSS_DAYTYPES + ABSENT_DAYTYPES)
+
+def empty_result():
+    '''The utilization of a month without any activity.'''
+    res = dict((key, {"percent": 0, "target": target})
+               for key, target in TARGETS.items())
+    res["FTE"] = 0
+    return res
+
+def calculate(util, losses, available_time, fte):
+    '''Builds the utilization of a month from its totals.
+
+    :param util: The minutes of productive activity.
+    :param losses: The minutes lost to absences and to non-productive
+                   activity.
+    :param available_time: The minutes the team selection had available.
+    :param fte: The number of agents who tracked activity.
+    '''
+    available_time = Decimal(available_time)
+    losses = Decimal(losses)
+    return {
+        "util": {
+            "percent": (100 * (Decimal(util) / available_time)),
+            "target": TARGETS["util"]
+        },
+        "effi": {
+            "percent": (100 * (Decimal(util) / (available_time - losses))),
+            "target": TARGETS["effi"]
+        },
+        "avai": {
+            "percent": (100 * (available_time - losses) / available_time),
+            "target": TARGETS["avai"]
+        },
+        "FTE": fte
+    }
+
+def month_columns(model, field):
+    '''The extra select which splits a date column into its year and
+    month, so that the rows can be grouped by month in the database.'''
+    qn = connection.ops.quote_name
+    column = "%s.%s" % (qn(model._meta.db_table),
+                        qn(model._meta.get_field(field).column))
+    return {
+        "year": connection.ops.date_extract_sql("year", column),
+        "month": connection.ops.date_extract_sql("month", column),
+    }
+
+def not_absent():
+    '''The extra where clause which leaves out the activity entries
+    tracked on a day the agent was absent.'''
+    # to avoid circular import dependencies
+    from timetracker.tracker.models import TrackingEntry
+
+    qn = connection.ops.quote_name
+    tracking = TrackingEntry._meta
+    activity = ActivityEntry._meta
+    return (
+        "NOT EXISTS (SELECT 1 FROM %(tracking)s WHERE "
+        "%(tracking)s.%(user)s = %(activity)s.%(activity_user)s AND "
+        "%(tracking)s.%(entry_date)s = %(activity)s.%(creation_date)s AND "
+        "%(tracking)s.%(daytype)s IN (%(absent)s))" % {
+            "tracking": qn(tracking.db_table),
+            "activity": qn(activity.db_table),
+            "user": qn(tracking.get_field("user").column),
+            "activity_user": qn(activity.get_field("user").column),
+            "entry_date": qn(tracking.get_field("entry_date").column),
+            "creation_date": qn(activity.get_field("creation_date").column),
+            "daytype": qn(tracking.get_field("daytype").column),
+            "absent": ", ".join(["%s"] * len(ABSENT_DAYTYPES)),
+        },
+        ABSENT_DAYTYPES
+    )
+
+def monthly_utilization(teams, months):
+    '''Calculates the utilization of a team selection for several months
+    at once.
+
+    :param teams: A list of market codes.
+    :param months: A list of :class:`datetime.datetime` or
+                   :class:`datetime.date` instances, one for each month.
+    :return: A :class:`dict` of (year, month) to the utilization of the
+             month, as :meth:`ActivityEntry.utilization_calculation`
+             returns it.
+    '''
+    # to avoid circular import dependencies
+    from timetracker.utils.calendar_utils import working_days
+    from timetracker.tracker.models import Tbluser, TrackingEntry
+
+    wanted = set((month.year, month.month) for month in months)
+    if not wanted:
+        return {}
+    first, last = min(wanted), max(wanted)
+    from_ = date(first[0], first[1], 1)
+    to_ = date(last[0], last[1], calendar.monthrange(*last)[1])
+
+    where, params = not_absent()
+    activity = ActivityEntry.objects.filter(
+        user__market__in=teams,
+        creation_date__range=[from_, to_]
+    ).extra(
+        select=month_columns(ActivityEntry, "creation_date"),
+        where=[where],
+        params=params
+    )
+
+    util = defaultdict(int)
+    losses = defaultdict(int)
+    for row in activity.values(
+            "year", "month", "activity__group", "activity__time"
+    ).annotate(amount=Sum("amount")).order_by():
+        key = (int(row["year"]), int(row["month"]))
+        time = row["amount"] * row["activity__time"]
+        if row["activity__group"] != "ALL":
+            util[key] += time
+        else:
+            losses[key] += time
+
+    # so we can see how many FTE's we had during each month.
+    active = dict(
+        ((int(row["year"]), int(row["month"])), row["users"])
+        for row in activity.values("year", "month").annotate(
+            users=Count("user", distinct=True)
+        ).order_by()
+    )
+
+    results = dict((key, empty_result()) for key in wanted)
+    if not wanted.intersection(active):
+        return results
+
+    for row in TrackingEntry.objects.filter(
+            user__market__in=teams,
+            daytype__in=LOSS_DAYTYPES,
+            entry_date__range=[from_, to_]
+    ).extra(
+        select=month_columns(TrackingEntry, "entry_date")
+    ).values("year", "month").annotate(days=Count("id")).order_by():
+        key = (int(row["year"]), int(row["month"]))
+        losses[key] += row["days"] * FTE_MINUTES
+
+    available_minutes = Tbluser.available_minutes(teams)
+    for key in wanted.intersection(active):
+        results[key] = calculate(
+            util[key], losses[key],
+            available_minutes * len(working_days(*key)),
+            active[key]
+        )
+    return results
+
+def utilization_keys(teams, months):
+    '''The cache keys of the utilization of each of the months, with
+    one round trip to the cache for the generations of the markets.
+
+    :rtype: :class:`OrderedDict` of each month to its key
+    '''
+    prefix = market_key("utilization", teams)
+    return OrderedDict(
+        (month, make_key(prefix, month.year, month.month))
+        for month in months
+    )
+
+def utilization(teams, months):
+    '''The utilization of a team selection for each of the months, from
+    the cache where it can be.
+
+    Only the months which aren't cached are calculated, together, with
+    :func:`monthly_utilization`. Months without any activity aren't
+    cached, as before.
+
+    :rtype: :class:`OrderedDict` of each month to its utilization.
+    '''
+    keys = utilization_keys(teams, months)
+    cached = cache.get_many(keys.values())
+    missing = [month for month, key in keys.items() if key not in cached]
+    calculated = monthly_utilization(teams, missing)
+
+    res = OrderedDict()
+    to_cache = {}
+    for month, key in keys.items():
+        if key in cached:
+            cache_log.debug("Returning cache for: %s" % key)
+            res[month] = cached[key]
+            continue
+        res[month] = calculated[(month.year, month.month)]
+        if res[month]["FTE"]:
+            to_cache[key] = res[month]
+    if to_cache:
+        cache.set_many(to_cache)
+    return res
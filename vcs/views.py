@@ -2,7 +2,7 @@ import datetime
 import os
 import imp
 
-from django.http import HttpResponse, Http404, HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import render_to_response
 from django.template import RequestContext
 from django.conf import settings
@@ -11,6 +11,7 @@ from django.core.exceptions import ValidationError
 
 from timetracker.utils.decorators import loggedin, json_response
 from timetracker.vcs.models import ActivityEntry, Activity
+from timetracker.vcs.uploads import UploadJob, queue_upload
 from timetracker.vcs.activities import (defaultplugins,
                                         listplugins,
                                         pluginbyname,
@@ -94,19 +95,32 @@ def report_upload(request): # pragma: no cover
     '''report_upload is the handler for when a report is requested to be
     processed. It will extract the processor name from the POST body
     along with the file. We then look for the associated report
-    processor and pass the file upload to that processor for
-    miscellanious processing.
+    processor and queue the file upload for that processor, see
+    :mod:`timetracker.vcs.uploads`. The user is sent on to the status
+    of the job.
     '''
 
-    # Get a fd on the in-memory uploaded file.
     fd = request.FILES.get("uploaded_file")
     user_id = request.session.get("user_id")
     user = Tbluser.objects.get(id=user_id)
     processor = pluginbyname(request.POST.get("processor"), acc=user.market)
-    if not processor:
+    if not processor or not fd:
         raise Http404
-    # call the dynamically loaded plugin with the fd.
-    success = processor["callback"](fd)
-    if success["success"]:
-        return HttpResponse("Done! %s" % success["data"])
-    return HttpResponse("Error processing report: %s" % success["error"])
+    job = queue_upload(user, processor["name"], fd)
+    return HttpResponseRedirect(
+        reverse("timetracker.vcs.views.upload_status") + "?id=%d" % job.id
+    )
+
+@loggedin
+@json_response
+def upload_status(request):
+    '''Returns the progress of one of the user's upload jobs, for the
+    page to poll.'''
+    try:
+        job = UploadJob.objects.get(
+            id=request.GET.get("id"),
+            user_id=request.session.get("user_id")
+        )
+    except (UploadJob.DoesNotExist, ValueError):
+        raise Http404
+    return job.progress()
@@ -0,0 +1,120 @@
+'''Activity volume time series.
+
+The volume charts on the utilization report used to run a query for
+each month of each activity and add the amounts up in Python.
+:func:`volume_series` totals any window of months, weeks or days for
+any number of activities with one query grouped by the truncated date,
+and caches the whole window under one key. The key carries the
+generation of each of the markets, see
+:mod:`timetracker.tracker.cachekeys`, which :meth:`ActivityEntry.save`
+and :meth:`ActivityEntry.delete` move on.
+'''
+
+import calendar
+import datetime
+from collections import defaultdict
+
+from django.db.models import Sum
+from django.core.cache import cache
+
+from timetracker.loggers import cache_log
+from timetracker.tracker.cachekeys import market_key
+from timetracker.vcs.models import ActivityEntry
+from timetracker.vcs.utilization import month_columns
+
+UNITS = ("months", "weeks", "days")
+
+
+def period_start(day, unit):
+    '''The first day of the period which day falls in.'''
+    if unit == "months":
+        return day.replace(day=1)
+    if unit == "weeks":
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+def period_end(day, unit):
+    '''The last day of the period which day falls in.'''
+    if unit == "months":
+        return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+    if unit == "weeks":
+        return period_start(day, unit) + datetime.timedelta(days=6)
+    return day
+
+def periods_until(end, periods, unit):
+    '''The first days of the periods of a window, oldest first, the last
+    of which holds end.
+
+    :rtype: :class:`list` of :class:`datetime.date`
+    '''
+    start = period_start(end, unit)
+    dates = [start]
+    for _ in range(periods - 1):
+        dates.append(period_start(dates[-1] - datetime.timedelta(days=1),
+                                  unit))
+    return list(reversed(dates))
+
+def volume_series(teams, activities, end=None, periods=12, unit="months"):
+    '''Totals the volumes of activities over a window of periods.
+
+    :param teams: A list of market codes.
+    :param activities: A list of :class:`Activity` instances or ids.
+    :param end: A day in the last period of the window, today when it is
+                not given.
+    :param periods: The number of periods in the window.
+    :param unit: One of :data:`UNITS`.
+    :return: The first day of each period and a :class:`dict` of each
+             activity id to its volume in each period.
+    '''
+    if unit not in UNITS:
+        raise ValueError("Unknown unit: %s" % unit)
+    end = end or datetime.date.today()
+    if isinstance(end, datetime.datetime):
+        end = end.date()
+    activities = sorted(set(int(getattr(activity, "id", activity))
+                            for activity in activities))
+    dates = periods_until(end, periods, unit)
+
+    cache_key = market_key("activity_volumes", teams, unit, dates[0],
+                           periods, ",".join(map(str, activities)))
+    series = cache.get(cache_key)
+    if series is not None:
+        cache_log.debug("Returning cache for: %s" % cache_key)
+        return dates, series
+
+    entries = ActivityEntry.objects.filter(
+        user__market__in=teams,
+        activity__in=activities,
+        creation_date__range=[dates[0], period_end(end, unit)]
+    )
+    if unit == "months":
+        rows = (
+            (row["activity"], datetime.date(int(row["year"]),
+                                            int(row["month"]), 1),
+             row["volume"])
+            for row in entries.extra(
+                select=month_columns(ActivityEntry, "creation_date")
+            ).values("activity", "year", "month").annotate(
+                volume=Sum("amount")
+            ).order_by()
+        )
+    else:
+        # weeks are made up of the days, there are at most 7 of them
+        # for each week.
+        rows = (
+            (row["activity"], period_start(row["creation_date"], unit),
+             row["volume"])
+            for row in entries.values("activity", "creation_date").annotate(
+                volume=Sum("amount")
+            ).order_by()
+        )
+
+    totals = defaultdict(int)
+    for activity, date, volume in rows:
+        totals[(activity, date)] += volume
+    series = dict(
+        (activity, [int(totals[(activity, date)]) for date in dates])
+        for activity in activities
+    )
+    cache.set(cache_key, series)
+    return dates, series
@@ -7,12 +7,14 @@
 '''
 
 import datetime
+from itertools import chain
 
-from django.http import HttpResponse, Http404, HttpResponseRedirect
+from django.http import (HttpResponse, Http404, HttpResponseRedirect,
+                         StreamingHttpResponse)
 from django.shortcuts import render_to_response
 from django.template import RequestContext
 from django.core.mail import send_mail
-from django.template.loader import get_template
+from django.template.loader import get_template, render_to_string
 from django.template import Context
 from django.conf import settings
 from django.views.decorators.csrf import csrf_protect
@@ -22,9 +24,10 @@ from django.core.urlresolvers import reverse
 from timetracker.tracker.models import Tbluser, UserForm, TrackingEntry
 from timetracker.tracker.models import Tblauthorization as tblauth
 from timetracker.tracker.forms import EntryForm, AddForm, Login
+from timetracker.tracker.yeartable import team_table_heading, team_rows
 
 from timetracker.utils.calendar_utils import (gen_calendar, gen_holiday_list,
-                                              ajax_add_entry,
+                                              ajax_add_entry, ajax_add_entries,
                                               ajax_change_entry,
                                               ajax_delete_entry, ajax_error,
                                               get_user_data, delete_user,
@@ -283,6 +286,7 @@ def ajax(request):
     # decorator or something
     ajax_funcs = {
         'add': ajax_add_entry,
+        'add_batch': ajax_add_entries,
         'change': ajax_change_entry,
         'delete': ajax_delete_entry,
         'admin_get': gen_calendar,
@@ -422,6 +426,38 @@ def yearview(request, who=None, year=None): # pragma: no cover
                                "eeid": who,
                                }, RequestContext(request))
 
+# where the rows of the team year table go in the rendered page.
+TEAM_ROWS_MARKER = "<!-- team rows -->"
+
+@admin_check
+def team_yearview(request, year=None):
+    '''Generates the 'year at a glance' for every agent in the team of
+    the administrator at once.
+
+    The page around the table is rendered first and the table is then
+    streamed a row per agent.'''
+    auth_user = Tbluser.objects.get(
+        id=request.session.get('user_id')
+        )
+    if not year:
+        year = str(datetime.datetime.now().year)
+    try:
+        users = auth_user.get_subordinates().order_by("lastname", "firstname")
+    except tblauth.DoesNotExist:
+        return HttpResponseRedirect("/user_edit/")
+
+    page = render_to_string("team_yearview.html",
+                            {"team_table": TEAM_ROWS_MARKER,
+                             "year": int(year),
+                             },
+                            RequestContext(request))
+    head, tail = page.split(TEAM_ROWS_MARKER)
+    return StreamingHttpResponse(chain(
+        [head, team_table_heading(year)],
+        team_rows(users, year),
+        ["</table>", tail]
+    ))
+
 @admin_check
 def overtime(request, who=None, year=None):
     auth_user = Tbluser.objects.get(